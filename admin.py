@@ -1,6 +1,12 @@
-from django.contrib import admin
+import datetime
 
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, dedup, wishes
 from .models import Book, Author, Genre, Status
+from .pagination import EstimatedCountPaginator
 
 """Minimal registration of Models:
 admin.site.register(Book)
@@ -13,34 +19,105 @@ admin.site.register(Status)
 #    model = Book
 #    extra = 0
     
+#Big changelists: an estimated total instead of COUNT(*), and no second
+#COUNT(*) of the whole table next to the filtered one
+class CatalogAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    #a merge changes the survivor and deletes the duplicates
+    def has_merge_permission(self, request):
+        return self.has_change_permission(request) and self.has_delete_permission(request)
+
+
+#the rows selected are one and the same: keep one, move everything to it (see books.dedup)
+def merge_selected(merge):
+    def action(modeladmin, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        if len(pks) < 2:
+            modeladmin.message_user(request, 'Select at least two rows to merge.', level=messages.WARNING)
+            return
+        survivor = queryset.model.objects.get(pk=merge(pks))
+        modeladmin.message_user(request, f'{len(pks)} merged into {survivor}.')
+    action.short_description = 'Merge the selected duplicates'
+    action.__name__ = 'merge_selected'
+    action.allowed_permissions = ('merge',)
+    return action
+
+
 @admin.register(Author)   
-class AuthorAdmin(admin.ModelAdmin):
+class AuthorAdmin(CatalogAdmin):
     list_display = ('last_name', 'first_name')
+    search_fields = ('last_name', 'first_name')
+    actions = [merge_selected(dedup.merge_authors)]
 #    inlines = [BooksInline]
 
 class StatusInline(admin.TabularInline):
     model = Status
     extra = 0
+    autocomplete_fields = ['wisher']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('book', 'wisher')
     
   
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(CatalogAdmin):
     list_display = ('title', 'author', 'owner', 'display_genre')
+    list_select_related = ('author', 'owner')
+    search_fields = ('title',)
+    autocomplete_fields = ['author', 'owner', 'genre']
     inlines = [StatusInline]
+    actions = [merge_selected(dedup.merge_books)]
+    
+    def get_queryset(self, request):
+        #display_genre slices genre.all(), which the prefetch answers for the whole page
+        return super().get_queryset(request).prefetch_related('genre')
 
     
 admin.site.register(Book, BookAdmin) 
 
 @admin.register(Status)
-class StatusAdmin(admin.ModelAdmin):
+class StatusAdmin(CatalogAdmin):
     list_display = ('book', 'status', 'wisher', 'due_back')
     list_filter = ('status', 'due_back')
+    list_select_related = ('book', 'wisher')
+    autocomplete_fields = ['book', 'wisher']
+    actions = ['mark_gone', 'mark_available', 'renew']
 
     fieldsets = (
             (None, {'fields': ('book',)}),
             ('Availability', {'fields': ('status', 'due_back', 'wisher')
             }),
            )
+    
+    #the actions are one UPDATE over the selection; update() sends no signals,
+    #so the available counter and the books' current_* fields are updated here
+    def update_statuses(self, queryset, **values):
+        with transaction.atomic():
+            books = set(queryset.values_list('book_id', flat=True))
+            available = queryset.filter(status__exact='av').count()
+            updated = queryset.update(updated_at=timezone.now(), **values)
+            Book.objects.filter(pk__in=books).refresh_availability()
+        if 'status' in values:
+            counters.incr('available', (updated if values['status'] == 'av' else 0) - available)
+        return updated
+    
+    def mark_gone(self, request, queryset):
+        updated = self.update_statuses(queryset, status='gone', wisher=None, due_back=None)
+        self.message_user(request, f'{updated} marked as gone.')
+    mark_gone.short_description = 'Mark as gone'
+    
+    def mark_available(self, request, queryset):
+        updated = self.update_statuses(queryset, status='av', wisher=None, due_back=None)
+        self.message_user(request, f'{updated} marked as available.')
+    mark_available.short_description = 'Mark as available'
+    
+    def renew(self, request, queryset):
+        due_back = datetime.date.today() + datetime.timedelta(days=wishes.WISH_DAYS)
+        updated = self.update_statuses(queryset.filter(status__exact='wished'), due_back=due_back)
+        self.message_user(request, f'{updated} wishes renewed until {due_back}.')
+    renew.short_description = f'Renew wishes for {wishes.WISH_DAYS} days'
       
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
-    pass
+    search_fields = ('name',)
@@ -0,0 +1,155 @@
+"""Read-only JSON API for books, authors, genres and statuses.
+
+GET /api/<resource>/ pages through a resource in pk order with an opaque
+cursor (?cursor=, ?limit=), ?ids=1,2,3 fetches up to MAX_IDS objects in one
+request and ?fields=id,title picks the columns. Rows are built straight from
+.values() querysets: no model instances are created, and only the requested
+columns (and the joins they need) are read."""
+
+from django.core.paginator import InvalidPage
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .models import Book, Author, Genre, Status
+from .pagination import KeysetPaginator
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_IDS = 200
+
+
+def book_genres(pks):
+    genres = {}
+    for book_id, name in (Book.genre.through.objects.filter(book_id__in=pks)
+                          .order_by('genre__name').values_list('book_id', 'genre__name')):
+        genres.setdefault(book_id, []).append(name)
+    return genres
+
+
+class Resource:
+    """A model seen through the API.
+
+    fields maps each API field to the lookup passed to .values(); many maps
+    the list-valued fields to a function returning {pk: list} for a page of pks."""
+
+    def __init__(self, model, fields, many=None):
+        self.model = model
+        self.fields = fields
+        self.many = many or {}
+
+    @property
+    def names(self):
+        return list(self.fields) + list(self.many)
+
+    def values(self, names):
+        lookups = {self.fields[name] for name in names if name in self.fields} - {'id'}
+        #the pk is always read: it is the cursor and the key of the many fields
+        return self.model.objects.order_by('pk').values('id', *lookups)
+
+    def serialize(self, rows, names):
+        many = {name: self.many[name]([row['id'] for row in rows])
+                for name in names if name in self.many}
+        return [{name: many[name].get(row['id'], []) if name in many else row[self.fields[name]]
+                 for name in names} for row in rows]
+
+
+RESOURCES = {
+    'books': Resource(Book, {
+        'id': 'id',
+        'title': 'title',
+        'summary': 'summary',
+        'pub_house': 'pub_house',
+        'pub_date': 'pub_date',
+        'category': 'category',
+        'author': 'author_id',
+        'owner': 'owner__username',
+        'status': 'current_status',
+        'wisher': 'current_wisher__username',
+        'due_back': 'current_due_back',
+    }, many={'genres': book_genres}),
+    'authors': Resource(Author, {
+        'id': 'id',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+    }),
+    'genres': Resource(Genre, {
+        'id': 'id',
+        'name': 'name',
+    }),
+    'statuses': Resource(Status, {
+        'id': 'id',
+        'book': 'book_id',
+        'status': 'status',
+        'wisher': 'wisher__username',
+        'due_back': 'due_back',
+    }),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_fields(resource, value):
+    if not value:
+        return resource.names
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in resource.names]
+    if unknown:
+        raise BadRequest(f'Unknown fields: {", ".join(unknown)}')
+    return names
+
+
+def parse_ids(value):
+    try:
+        ids = [int(pk) for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        raise BadRequest('ids must be a comma separated list of integers')
+    if len(ids) > MAX_IDS:
+        raise BadRequest(f'At most {MAX_IDS} ids per request')
+    return ids
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+@require_GET
+def resource_list(request, resource):
+    if resource not in RESOURCES:
+        raise Http404(f'Unknown resource {resource}')
+    resource = RESOURCES[resource]
+    try:
+        names = parse_fields(resource, request.GET.get('fields'))
+        if 'ids' in request.GET:
+            ids = parse_ids(request.GET['ids'])
+            rows = {row['id']: row for row in resource.values(names).filter(pk__in=ids)}
+            #in the order asked for; the missing ones are left out
+            rows = [rows[pk] for pk in dict.fromkeys(ids) if pk in rows]
+            return JsonResponse({'results': resource.serialize(rows, names)})
+
+        paginator = KeysetPaginator(resource.values(names), parse_limit(request.GET.get('limit')))
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise BadRequest(f'Invalid cursor: {e}')
+    except BadRequest as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'results': resource.serialize(page.object_list, names),
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
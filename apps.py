@@ -1,5 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class BooksConfig(AppConfig):
     name = 'books'
+
+    def ready(self):
+        #connect the signal receivers
+        from . import signals
+
+        #optional in-process scheduler for the expired wishes, off by default
+        interval = getattr(settings, 'BOOKS_SWEEP_INTERVAL', None)
+        if interval:
+            from .sweeper import Sweeper
+            Sweeper(interval).start()
+
+        #optional in-process sender for the notification outbox, off by default
+        interval = getattr(settings, 'BOOKS_MAIL_INTERVAL', None)
+        if interval:
+            from .notifications import Mailer
+            Mailer(interval).start()
+
+        #the autocomplete indexes are built on first use, or right away in the background
+        if getattr(settings, 'BOOKS_AUTOCOMPLETE_PRELOAD', False):
+            import threading
+            from . import autocomplete
+            threading.Thread(target=autocomplete.preload, name='books-autocomplete', daemon=True).start()
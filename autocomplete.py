@@ -0,0 +1,267 @@
+"""Title and author suggestions from an in-process prefix index.
+
+Each PrefixIndex holds its rows in a compact Segment: the folded texts
+(lower case, Romanian diacritics and other accents removed, so 'stiin' finds
+'Știință') and the labels as two UTF-8 blobs, and one array of the positions
+where a word starts, sorted by the text that follows. A prefix is found by
+binary search over that array: 'emin' finds 'Mihai Eminescu' as well as
+'Eminescu'. A million titles take about 70 MB, in a few large objects
+instead of millions of small ones, and are searched in under 0.1 ms.
+
+The segment is immutable. Saves and deletes (the receivers in books.signals)
+go to a small sorted delta and a set of tombstoned pks, which the lookups
+merge in; past DELTA_LIMIT changes everything is compacted into a new
+segment. Writes by other processes, and the bulk ones that send no signals,
+are pulled every BOOKS_AUTOCOMPLETE_SYNC seconds with one query on the
+updated_at index. Deletions by other processes wait for a restart.
+
+The indexes are built on first use, or at startup in a thread when
+BOOKS_AUTOCOMPLETE_PRELOAD is set."""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+
+from django.conf import settings
+from django.db.models import F, Max, Value
+from django.db.models.functions import Concat
+
+from .models import Book, Author
+
+
+#word starts indexed per row: bounds the index whatever the titles
+MAX_WORDS = 8
+DELTA_LIMIT = 20000
+
+_words = re.compile(r'\w+')
+
+
+def fold(text):
+    """Lower case without diacritics, single spaced: 'Știință  și Tehnică' -> 'stiinta si tehnica'"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(text.split())
+
+
+def _encode(label):
+    """The folded label, UTF-8 encoded, and the byte offsets of its first MAX_WORDS words"""
+    folded = fold(label)
+    starts = [len(folded[:match.start()].encode()) for match in _words.finditer(folded)]
+    return folded.encode(), starts[:MAX_WORDS]
+
+
+class Segment:
+    """Immutable, compact prefix index over (pk, label) rows, in pk order"""
+
+    def __init__(self, rows, chunk_size=100000):
+        texts, labels = bytearray(), bytearray()
+        self.pks = array('q')
+        self.starts = array('I')
+        self.label_starts = array('I')
+        positions = []
+        for pk, label in rows:
+            folded, starts = _encode(label)
+            self.pks.append(pk)
+            self.starts.append(len(texts))
+            self.label_starts.append(len(labels))
+            positions.extend(len(texts) + start for start in starts)
+            texts += folded + b'\0'
+            labels += label.encode() + b'\0'
+        self.text = bytes(texts)
+        self.labels = bytes(labels)
+        del texts, labels
+
+        #sorted by the text after each word start; in chunks, so the sort keys
+        #of only one chunk are alive at a time
+        def key(position):
+            return self.text[position:self.text.index(b'\0', position)]
+
+        chunks = [sorted(positions[i:i + chunk_size], key=key) for i in range(0, len(positions), chunk_size)]
+        del positions
+        self.positions = array('I', heapq.merge(*chunks, key=key))
+
+    def __len__(self):
+        return len(self.pks)
+
+    def find(self, pk):
+        """The row of pk, or None; the rows are in pk order"""
+        row = bisect.bisect_left(self.pks, pk)
+        return row if row < len(self.pks) and self.pks[row] == pk else None
+
+    def _row(self, position):
+        return bisect.bisect_right(self.starts, position) - 1
+
+    def label(self, row):
+        start = self.label_starts[row]
+        return self.labels[start:self.labels.index(b'\0', start)].decode()
+
+    def lookup(self, prefix):
+        """Yields (matched text, pk, row) for the word starts matching the folded, encoded prefix, in order"""
+        text, positions, size = self.text, self.positions, len(prefix)
+        low, high = 0, len(positions)
+        while low < high:
+            middle = (low + high) // 2
+            if text[positions[middle]:positions[middle] + size] < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        for index in range(low, len(positions)):
+            position = positions[index]
+            if text[position:position + size] != prefix:
+                return
+            row = self._row(position)
+            yield text[position:text.index(b'\0', position)], self.pks[row], row
+
+    def rows(self):
+        for row, pk in enumerate(self.pks):
+            yield pk, self.label(row)
+
+
+class PrefixIndex:
+    """A Segment plus the changes made since it was built"""
+
+    def __init__(self, rows=()):
+        self._lock = threading.RLock()
+        self.load(rows)
+
+    def load(self, rows):
+        segment = Segment(rows)
+        with self._lock:
+            self.segment = segment
+            #pk: label of the rows saved since, and their (text, pk) word starts, sorted
+            self.changed = {}
+            self.delta = []
+            #pks whose segment row is outdated
+            self.tombstones = set()
+
+    def _drop(self, pk):
+        label = self.changed.pop(pk, None)
+        if label is not None:
+            folded, starts = _encode(label)
+            for start in starts:
+                del self.delta[bisect.bisect_left(self.delta, (folded[start:], pk))]
+        if self.segment.find(pk) is not None:
+            self.tombstones.add(pk)
+
+    def current(self, pk):
+        """The label of pk as indexed, or None"""
+        if pk in self.changed:
+            return self.changed[pk]
+        row = self.segment.find(pk)
+        return None if row is None or pk in self.tombstones else self.segment.label(row)
+
+    def update(self, pk, label):
+        with self._lock:
+            #availability changes touch updated_at too, most updates change nothing here
+            if self.current(pk) == label:
+                return
+            self._drop(pk)
+            self.changed[pk] = label
+            folded, starts = _encode(label)
+            for start in starts:
+                bisect.insort(self.delta, (folded[start:], pk))
+            if len(self.changed) > DELTA_LIMIT:
+                self.compact()
+
+    def delete(self, pk):
+        with self._lock:
+            self._drop(pk)
+
+    def compact(self):
+        with self._lock:
+            rows = [(pk, label) for pk, label in self.segment.rows() if pk not in self.tombstones]
+            rows += self.changed.items()
+            self.load(sorted(rows))
+
+    def _delta_lookup(self, prefix):
+        for index in range(bisect.bisect_left(self.delta, (prefix,)), len(self.delta)):
+            text, pk = self.delta[index]
+            if not text.startswith(prefix):
+                return
+            yield text, pk, None
+
+    def suggest(self, query, limit=10):
+        """[(pk, label)] of the rows with a word starting with query, ordered by the text from there"""
+        prefix = fold(query).encode()
+        if not prefix:
+            return []
+        with self._lock:
+            segment, tombstones, changed = self.segment, self.tombstones, self.changed
+            matches = heapq.merge(segment.lookup(prefix), self._delta_lookup(prefix), key=lambda match: match[0])
+            suggestions, seen = [], set()
+            for text, pk, row in matches:
+                if pk in seen or (row is not None and pk in tombstones):
+                    continue
+                seen.add(pk)
+                suggestions.append((pk, segment.label(row) if row is not None else changed[pk]))
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+class ModelIndex(PrefixIndex):
+    """PrefixIndex over a model, loaded from .values_list() and kept in sync through updated_at"""
+
+    def __init__(self, model, label, label_of):
+        self.model = model
+        #the label as an expression for .values_list(), and of an instance
+        self.label = label
+        self.label_of = label_of
+        self.built = False
+        self.synced_at = 0
+        super().__init__()
+
+    def build(self):
+        with self._lock:
+            self.watermark = self.model.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+            self.load(self.model.objects.order_by('pk').values_list('pk', self.label).iterator(chunk_size=10000))
+            self.built = True
+            self.synced_at = time.monotonic()
+
+    def sync(self):
+        """Builds the index on first use, then pulls the rows changed since, at most every BOOKS_AUTOCOMPLETE_SYNC seconds"""
+        with self._lock:
+            if not self.built:
+                self.build()
+                return
+            if time.monotonic() - self.synced_at < getattr(settings, 'BOOKS_AUTOCOMPLETE_SYNC', 60):
+                return
+            self.synced_at = time.monotonic()
+            rows = self.model.objects.order_by('updated_at')
+            if self.watermark is not None:
+                rows = rows.filter(updated_at__gt=self.watermark)
+            for pk, label, updated_at in rows.values_list('pk', self.label, 'updated_at'):
+                self.update(pk, label)
+                self.watermark = updated_at
+
+    def reset(self):
+        """Forgets everything: the next lookup builds the index again"""
+        with self._lock:
+            self.load([])
+            self.built = False
+
+    def saved(self, instance):
+        if self.built:
+            self.update(instance.pk, self.label_of(instance))
+
+    def deleted(self, instance):
+        if self.built:
+            self.delete(instance.pk)
+
+    def suggest(self, query, limit=10):
+        self.sync()
+        return super().suggest(query, limit)
+
+
+books = ModelIndex(Book, 'title', lambda book: book.title)
+authors = ModelIndex(Author, Concat(F('first_name'), Value(' '), F('last_name')),
+                     lambda author: f'{author.first_name} {author.last_name}')
+
+
+def preload():
+    books.build()
+    authors.build()
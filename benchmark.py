@@ -0,0 +1,266 @@
+"""Synthetic catalogs and a latency benchmark of every page.
+
+seed() fills the database with a catalog of any size: users, authors, genres,
+books with one to three genres and one or two copies each, a share of them
+wished (some overdue) or gone. Everything is written with bulk INSERTs in
+chunks, so a million books take minutes and flat memory. bulk_create sends
+no signals, so the derived data is filled in directly (Book.current_*) or
+rebuilt once at the end (facet counts, counters, search index).
+
+run() requests every named url of books/urls.py through the test client, as
+a logged in librarian, and reports the p50/p95/p99 latency, the number of
+queries and the peak memory of each; compare() sets two runs side by side.
+Both are used by manage.py seed_benchmark and manage.py bench_urls."""
+
+import datetime
+import json
+import math
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import counters, covers, facets, search
+from .models import Book, Author, Genre, Status
+from .urls import urlpatterns
+
+
+FIRST_NAMES = ('Mihai', 'Ion', 'Ana', 'Maria', 'George', 'Elena', 'Mircea', 'Ioana', 'Liviu', 'Marin',
+               'Nichita', 'Gabriela', 'Camil', 'Hortensia', 'Panait', 'Max', 'Mateiu', 'Ileana')
+LAST_NAMES = ('Eminescu', 'Creangă', 'Caragiale', 'Sadoveanu', 'Rebreanu', 'Blaga', 'Preda', 'Stănescu',
+              'Cărtărescu', 'Petrescu', 'Istrati', 'Blecher', 'Eliade', 'Papadat-Bengescu', 'Arghezi')
+TITLE_WORDS = ('noaptea', 'pădurea', 'drumul', 'țara', 'moara', 'cartea', 'ultima', 'dragoste', 'război',
+               'întâmplare', 'umbra', 'lumina', 'casa', 'orașul', 'iarna', 'vara', 'râul', 'fântâna',
+               'mireasa', 'ceasul', 'cerul', 'tăcerea', 'oglinda', 'strada', 'povestea', 'amintiri')
+GENRE_NAMES = ('Poezie', 'Proză scurtă', 'Roman istoric', 'Science fiction', 'Fantasy', 'Polițist',
+               'Memorialistică', 'Eseistică', 'Teatru', 'Filozofie', 'Istorie', 'Biografie',
+               'Călătorii', 'Literatură pentru copii', 'Umor', 'Critică literară')
+PUB_HOUSES = ('Polirom', 'Humanitas', 'Nemira', 'Cartea Românească', 'Litera', 'Art', 'Curtea Veche')
+CATEGORIES = [category for category, label in Book.CATEGORY]
+
+#share of the books per current status; some books get a second, available copy
+STATUS_WEIGHTS = (('av', 60), ('wished', 30), ('gone', 10))
+SECOND_COPY = 0.15
+
+
+def _create(model, objects):
+    """bulk_create returning the new primary keys, also where the backend does not set them"""
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    model.objects.bulk_create(objects)
+    return list(model.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+
+
+def _chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def seed(books, authors=None, genres=30, users=None, chunk_size=5000, seed=0, prefix='bench',
+         log=lambda message: None):
+    """Adds a synthetic catalog of books books and returns the number of rows created per model"""
+    rnd = random.Random(seed)
+    authors = authors or max(1, books // 10)
+    users = users or max(1, books // 20)
+    today = datetime.date.today()
+    created = {}
+    started = time.perf_counter()
+
+    def done(name, pks):
+        created[name] = created.get(name, 0) + len(pks)
+        return pks
+
+    #everybody shares the password 'bench', hashed once
+    password = make_password('bench')
+    user_pks = []
+    for start, size in _chunks(users, chunk_size):
+        user_pks += done('users', _create(User, [
+                User(username=f'{prefix}_user_{start + i}', password=password,
+                     email=f'{prefix}_user_{start + i}@example.com') for i in range(size)]))
+    owner_pks = user_pks[:max(1, len(user_pks) // 50)]
+
+    genre_pks = done('genres', _create(Genre, [
+            Genre(name=f'{GENRE_NAMES[i % len(GENRE_NAMES)]} {i // len(GENRE_NAMES) or ""}'.strip())
+            for i in range(genres)]))
+
+    author_pks = []
+    for start, size in _chunks(authors, chunk_size):
+        author_pks += done('authors', _create(Author, [
+                Author(first_name=rnd.choice(FIRST_NAMES), last_name=rnd.choice(LAST_NAMES))
+                for i in range(size)]))
+    log(f'{len(user_pks)} users, {len(genre_pks)} genres, {len(author_pks)} authors')
+
+    statuses, weights = zip(*STATUS_WEIGHTS)
+    for start, size in _chunks(books, chunk_size):
+        with transaction.atomic():
+            copies = []
+            rows = []
+            for i in range(size):
+                status = rnd.choices(statuses, weights)[0]
+                wisher = rnd.choice(user_pks) if status == 'wished' else None
+                due_back = today + datetime.timedelta(days=rnd.randint(-5, 10)) if wisher else None
+                book_copies = [(status, wisher, due_back)]
+                if rnd.random() < SECOND_COPY:
+                    book_copies.append(('av', None, None))
+                copies.append(book_copies)
+                #what BookQuerySet.refresh_availability would compute: an available copy first
+                current = min(book_copies, key=lambda copy: copy[0] != 'av')
+                words = rnd.sample(TITLE_WORDS, rnd.randint(1, 4))
+                rows.append(Book(
+                        title=' '.join(words).capitalize(),
+                        author_id=rnd.choice(author_pks),
+                        summary=' '.join(rnd.choices(TITLE_WORDS, k=rnd.randint(10, 60))).capitalize() + '.',
+                        pub_house=rnd.choice(PUB_HOUSES),
+                        pub_date=str(rnd.randint(1880, today.year)),
+                        owner_id=rnd.choice(owner_pks),
+                        category=rnd.choice(CATEGORIES),
+                        current_status=current[0], current_wisher_id=current[1], current_due_back=current[2]))
+            book_pks = done('books', _create(Book, rows))
+            Book.genre.through.objects.bulk_create([
+                    Book.genre.through(book_id=pk, genre_id=genre)
+                    for pk in book_pks for genre in rnd.sample(genre_pks, min(len(genre_pks), rnd.randint(1, 3)))])
+            done('statuses', _create(Status, [
+                    Status(book_id=pk, status=status, wisher_id=wisher, due_back=due_back)
+                    for pk, book_copies in zip(book_pks, copies) for status, wisher, due_back in book_copies]))
+        log(f'{start + size} books ({time.perf_counter() - started:.1f} s)')
+
+    #what the signals would have maintained one row at a time
+    facets.rebuild()
+    counters.reconcile()
+    search.rebuild()
+    log(f'facet counts, counters and search index rebuilt ({time.perf_counter() - started:.1f} s)')
+    return created
+
+
+#arguments of the urls that take some, from the sample rows picked by samples()
+ROUTE_KWARGS = {
+    'book_detail': {'pk': 'book'},
+    'author_detail': {'pk': 'author'},
+    'author_update': {'pk': 'author'},
+    'author_delete': {'pk': 'author'},
+    'renew_book_librarian': {'pk': 'wish'},
+    'status': {'pk': 'copy'},
+    'owner_books': {'username': 'owner'},
+    'owner_dashboard': {'username': 'owner'},
+    'export': {'format': 'csv'},
+    'api': {'resource': 'books'},
+    'cover': {'key': 'cover', 'name': covers.thumbnail_file('list', 'webp')},
+}
+
+ROUTE_QUERIES = {
+    'search': {'q': 'drumul'},
+}
+
+
+def samples():
+    """A book, an author, a wished and an available copy, an owner and a cover, from the middle of the catalog"""
+    def middle(queryset):
+        count = queryset.count()
+        return queryset.order_by('pk')[count // 2] if count else None
+
+    book = middle(Book.objects.exclude(author=None).exclude(owner=None))
+    return {
+        'book': book.pk if book else None,
+        'author': book.author_id if book else None,
+        'owner': book.owner.get_username() if book else None,
+        'wish': getattr(middle(Status.objects.filter(status='wished')), 'pk', None),
+        'copy': getattr(middle(Status.objects.filter(status='av')), 'pk', None),
+        'cover': getattr(middle(Book.objects.exclude(cover_key='')), 'cover_key', None),
+    }
+
+
+def routes(sample):
+    """Yields (name, url) for every named url of books/urls.py, skipping the ones without a sample"""
+    for pattern in urlpatterns:
+        if not pattern.name:
+            continue
+        kwargs = {key: sample.get(value, value) for key, value in ROUTE_KWARGS.get(pattern.name, {}).items()}
+        if None in kwargs.values():
+            continue
+        yield pattern.name, reverse(f'books:{pattern.name}', kwargs=kwargs or None)
+
+
+def percentile(values, p):
+    """Nearest rank percentile of the values"""
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _get(client, url, data):
+    response = client.get(url, data)
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+    return response
+
+
+def measure(client, url, data=None, repeat=20):
+    """The numbers of one url: status, queries, p50/p95/p99 latency in ms and peak memory in KiB"""
+    #warm up: the first request fills the caches, as a live site has them filled
+    response = _get(client, url, data)
+    #a full query log (DEBUG = True) would hide the new queries
+    connection.queries_log.clear()
+    with CaptureQueriesContext(connection) as captured:
+        _get(client, url, data)
+    tracemalloc.start()
+    try:
+        _get(client, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        _get(client, url, data)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': len(captured),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(user=None, repeat=20, only=None, log=lambda name, result: None):
+    """Measures every named url, as user (None: anonymous). Returns a dict ready for json.dump"""
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    sample = samples()
+    results = {}
+    for name, url in routes(sample):
+        if only and name not in only:
+            continue
+        results[name] = measure(client, url, ROUTE_QUERIES.get(name), repeat)
+        log(name, results[name])
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'vendor': connection.vendor,
+        'books': Book.objects.count(),
+        'user': user.get_username() if user else None,
+        'repeat': repeat,
+        'routes': results,
+    }
+
+
+def compare(before, after):
+    """Yields (route, metric, before, after) for the metrics of the routes in both runs"""
+    for name, result in after['routes'].items():
+        old = before['routes'].get(name)
+        if old is None:
+            continue
+        for metric in ('queries', 'p50_ms', 'p95_ms', 'p99_ms', 'peak_kib'):
+            yield name, metric, old[metric], result[metric]
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
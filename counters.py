@@ -0,0 +1,72 @@
+"""Catalog totals shown on the index page, kept in the cache.
+
+The totals are adjusted incrementally by the model signals in books.signals.
+Code that bypasses signals (bulk_create, QuerySet.update) must call incr()
+itself. reconcile() recounts everything from the database and is meant to
+be run periodically (manage.py reconcile_counters) to correct any drift.
+
+The cache must be shared by the worker processes: with a per-process one
+(LocMemCache) a write only adjusts the totals of the process that made it,
+and reconcile_counters cannot reach the others. The totals expire after
+BOOKS_COUNTERS_TIMEOUT seconds, so a stale one lasts that long at most."""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Book, Author, Status
+
+
+COUNTERS = {
+    'books': lambda: Book.objects.count(),
+    'authors': lambda: Author.objects.count(),
+    'available': lambda: Status.objects.filter(status__exact='av').count(),
+}
+
+
+def _key(name):
+    return f'books:counter:{name}'
+
+
+def _timeout():
+    return getattr(settings, 'BOOKS_COUNTERS_TIMEOUT', 300)
+
+
+def get_counts():
+    """Returns all the totals, counting in the database only the ones missing from the cache"""
+    keys = {_key(name): name for name in COUNTERS}
+    cached = cache.get_many(keys)
+    counts = {keys[key]: value for key, value in cached.items()}
+    for name in COUNTERS:
+        if name not in counts:
+            counts[name] = COUNTERS[name]()
+            cache.add(_key(name), counts[name], _timeout())
+    return counts
+
+
+def _incr(name, delta):
+    try:
+        cache.incr(_key(name), delta)
+    except ValueError:
+        #not cached yet: the next get_counts() counts it from the database
+        pass
+
+
+def incr(name, delta=1):
+    """Adjusts a total by delta once the current transaction commits"""
+    if name not in COUNTERS:
+        raise KeyError(name)
+    if delta:
+        transaction.on_commit(lambda: _incr(name, delta))
+
+
+def reconcile():
+    """Recounts every total from the database and returns {name: (cached, actual)} for the ones that drifted"""
+    drift = {}
+    for name, count in COUNTERS.items():
+        actual = count()
+        cached = cache.get(_key(name))
+        if cached is not None and cached != actual:
+            drift[name] = (cached, actual)
+        cache.set(_key(name), actual, _timeout())
+    return drift
@@ -0,0 +1,278 @@
+"""Book covers and their thumbnails, made ahead of time, never on the fly.
+
+A cover is stored as covers/<key>/original.<ext>, key being the hash of its
+content, and its thumbnails next to it, one per size of SIZES and format of
+FORMATS: covers/<key>/list-80x120.webp, ... A new cover is a new key and new
+sizes are new names, so every file is immutable: serve() answers with a
+cache lifetime of a year, and the pages link the thumbnails only, with their
+width and height. The files are never deleted, other books may share them.
+
+The thumbnails are made in a process pool (BOOKS_COVER_WORKERS processes,
+one per CPU by default; 0 makes them in the calling thread) once the
+transaction saving the book commits: after an upload, and after each chunk
+of a bulk import. Book.cover_key is set when they are ready; until then the
+pages show no cover. backfill() (manage.py generate_covers) makes the
+missing ones over the whole catalog in parallel, and attaches the covers of
+a directory of files named after the books' pks."""
+
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Book
+
+
+logger = logging.getLogger(__name__)
+
+#name: (width, height), cropped to fill
+SIZES = {
+    'list': (80, 120),
+    'detail': (240, 360),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+CONTENT_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+CACHE_SECONDS = 365 * 24 * 3600
+
+_key = re.compile(r'[0-9a-f]{32}')
+
+
+def content_key(file):
+    """The hash of a file's content, read in chunks from the start"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:32]
+
+
+def original_name(file, filename):
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    return f'covers/{content_key(file)}/original{extension}'
+
+
+def key_of(name):
+    """The key of a stored cover's name, '' for any other name"""
+    parts = (name or '').split('/')
+    return parts[1] if len(parts) == 3 and parts[0] == 'covers' and _key.fullmatch(parts[1]) else ''
+
+
+def thumbnail_file(size, format):
+    width, height = SIZES[size]
+    return f'{size}-{width}x{height}.{format}'
+
+
+def thumbnail_url(key, size, format):
+    return reverse('books:cover', kwargs={'key': key, 'name': thumbnail_file(size, format)})
+
+
+def render(file):
+    """{(size, format): bytes} of the thumbnails of an image file"""
+    thumbnails = {}
+    with Image.open(file) as image:
+        #a JPEG is decoded at a fraction of its size (1/2 to 1/8), as little as the largest thumbnail allows
+        image.draft('RGB', max(SIZES.values()))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGBA', image.size, 'white')
+            image = Image.alpha_composite(background, image)
+        image = image.convert('RGB')
+        #each size from the one before, the largest first
+        for size, box in sorted(SIZES.items(), key=lambda item: item[1], reverse=True):
+            image = thumbnail = ImageOps.fit(image, box, Image.LANCZOS)
+            for format, (pil_format, options) in FORMATS.items():
+                data = io.BytesIO()
+                thumbnail.save(data, pil_format, **options)
+                thumbnails[size, format] = data.getvalue()
+    return thumbnails
+
+
+def store(path):
+    """Copies an image file into the storage under its content hash. Returns its name."""
+    with open(path, 'rb') as f:
+        name = original_name(f, path)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, File(f))
+    return name
+
+
+def _generate(name):
+    """Makes the thumbnails of the cover stored as name. Returns its key."""
+    key = key_of(name)
+    if not key:
+        raise ValueError(f'not a stored cover: {name}')
+    with default_storage.open(name) as f:
+        thumbnails = render(f)
+    for (size, format), data in thumbnails.items():
+        thumbnail = f'covers/{key}/{thumbnail_file(size, format)}'
+        if default_storage.exists(thumbnail):
+            default_storage.delete(thumbnail)
+        default_storage.save(thumbnail, ContentFile(data))
+    return key
+
+
+def _work(task):
+    """(pk, name, path) -> (pk, name, key, error): the thumbnails of the cover stored as name,
+    or of the file at path, stored first. Runs in the worker processes."""
+    pk, name, path = task
+    try:
+        if path:
+            name = store(path)
+        return pk, name, _generate(name), None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return pk, name, None, f'{type(e).__name__}: {e}'
+
+
+def _save(results):
+    """Marks the covers of the results ready. Returns the errors, [(pk, error)]."""
+    errors = []
+    now = timezone.now()
+    with transaction.atomic():
+        for pk, name, key, error in results:
+            if error:
+                errors.append((pk, error))
+                logger.warning('No thumbnails for the cover of book %s: %s', pk, error)
+                continue
+            #unless another cover was uploaded in the meantime
+            Book.objects.filter(pk=pk, cover__in=(name, '')).update(cover=name, cover_key=key, updated_at=now)
+    return errors
+
+
+def _workers():
+    workers = getattr(settings, 'BOOKS_COVER_WORKERS', None)
+    return os.cpu_count() if workers is None else workers
+
+
+def _init_worker():
+    #a spawned worker starts without Django; a forked one has it already
+    import django
+    django.setup()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(_workers(), initializer=_init_worker)
+        return _pool
+
+
+def _done(future):
+    try:
+        _save([future.result()])
+    except Exception:
+        logger.exception('Cover thumbnails failed')
+    finally:
+        #the pool's thread, not a request's: nobody else closes its connection
+        connection.close()
+
+
+def _submit(tasks):
+    if not _workers():
+        _save(map(_work, tasks))
+        return
+    pool = _get_pool()
+    for task in tasks:
+        pool.submit(_work, task).add_done_callback(_done)
+
+
+def schedule(covers):
+    """Makes the thumbnails of the covers, [(book pk, stored name)], once the current transaction commits"""
+    tasks = [(pk, name, None) for pk, name in covers]
+    if tasks:
+        transaction.on_commit(lambda: _submit(tasks))
+
+
+def wait():
+    """Waits for the thumbnails scheduled so far"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def pending(everything=False):
+    """(pk, name, None) tasks of the covers without thumbnails, or of every cover"""
+    books = Book.objects.exclude(cover='')
+    if not everything:
+        books = books.filter(cover_key='')
+    return ((pk, name, None) for pk, name in books.order_by('pk').values_list('pk', 'cover').iterator())
+
+
+def from_directory(directory):
+    """(pk, None, path) tasks of the image files of a directory named after the pk of a book
+    without a cover: 123.jpg"""
+    paths = {}
+    for entry in os.scandir(directory):
+        stem = os.path.splitext(entry.name)[0]
+        if entry.is_file() and stem.isdigit():
+            paths[int(stem)] = entry.path
+    pks = sorted(paths)
+    for start in range(0, len(pks), 500):
+        books = Book.objects.filter(pk__in=pks[start:start + 500], cover='').order_by('pk')
+        for pk in books.values_list('pk', flat=True):
+            yield pk, None, paths[pk]
+
+
+def backfill(tasks, workers=None, batch_size=200, progress=lambda done, errors: None):
+    """Makes the thumbnails of the tasks (from pending() or from_directory()) with workers processes,
+    marking them ready batch by batch. Returns (done, errors)."""
+    workers = _workers() if workers is None else workers
+    done, errors, batch = 0, [], []
+
+    def flush():
+        nonlocal done
+        errors.extend(_save(batch))
+        done += len(batch)
+        batch.clear()
+        progress(done, errors)
+
+    if workers:
+        with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+            for result in pool.map(_work, tasks, chunksize=8):
+                batch.append(result)
+                if len(batch) == batch_size:
+                    flush()
+    else:
+        for result in map(_work, tasks):
+            batch.append(result)
+            if len(batch) == batch_size:
+                flush()
+    if batch:
+        flush()
+    return done, errors
+
+
+def serve(request, key, name):
+    """A thumbnail, cached for a year: its name changes with its content"""
+    if not _key.fullmatch(key) or name not in {thumbnail_file(size, format) for size in SIZES for format in FORMATS}:
+        raise Http404('Unknown cover')
+    try:
+        f = default_storage.open(f'covers/{key}/{name}')
+    except FileNotFoundError:
+        raise Http404('Unknown cover')
+    response = FileResponse(f, content_type=CONTENT_TYPES[name.rsplit('.', 1)[1]])
+    response['Cache-Control'] = f'public, max-age={CACHE_SECONDS}, immutable'
+    return response
@@ -0,0 +1,58 @@
+"""Per-owner dashboards: how one owner's shelf is doing.
+
+stats() counts the owner's available, wished and gone books in one aggregate
+query that the (owner, current_status, current_due_back) index answers
+alone, the overdue wishes (copies, not books) over the wished statuses of
+the owner's books, and reads the top genres from the facet counts of
+books.facets. The result is cached per owner, under a key
+carrying the version of the shelf (the latest updated_at and the number of
+books, from the (owner, updated_at) index): a change shows up at once, and
+one owner's writes never touch another owner's cache."""
+
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q, Sum
+
+from .models import Book, Genre, FacetCount, Status
+
+
+TOP_GENRES = 5
+
+
+def _timeout():
+    return getattr(settings, 'BOOKS_DASHBOARD_TIMEOUT', 3600)
+
+
+def shelf_version(owner):
+    version = Book.objects.filter(owner=owner).aggregate(updated_at=Max('updated_at'), books=Count('id'))
+    return f'{version["books"]}:{version["updated_at"].timestamp() if version["updated_at"] else 0}'
+
+
+def compute_stats(owner, today):
+    stats = Book.objects.filter(owner=owner).aggregate(
+            books=Count('id'),
+            available=Count('id', filter=Q(current_status='av')),
+            wished=Count('id', filter=Q(current_status='wished')),
+            gone=Count('id', filter=Q(current_status='gone')))
+    #a book shows one status, its overdue wishes are its copies': read the statuses
+    stats['overdue'] = Status.objects.filter(book__owner=owner, status='wished', due_back__lt=today).count()
+    genres = list(FacetCount.objects.filter(owner=owner.pk, genre__gt=0)
+                  .values_list('genre').annotate(count=Sum('count')).filter(count__gt=0)
+                  .order_by('-count', 'genre')[:TOP_GENRES])
+    names = dict(Genre.objects.filter(pk__in=[genre for genre, count in genres]).values_list('pk', 'name'))
+    stats['top_genres'] = [(names.get(genre, genre), count) for genre, count in genres]
+    return stats
+
+
+def stats(owner, today=None):
+    """The dashboard numbers of owner (a User), from the cache when the shelf has not changed"""
+    today = today or datetime.date.today()
+    #the date is in the key too: yesterday's wishes may be overdue today
+    key = f'books:dashboard:{owner.pk}:{today.isoformat()}:{shelf_version(owner)}'
+    result = cache.get(key)
+    if result is None:
+        result = compute_stats(owner, today)
+        cache.set(key, result, _timeout())
+    return result
@@ -0,0 +1,191 @@
+"""Finding and merging duplicate authors and books.
+
+Comparing every pair is quadratic. Rows with the same normalized value are
+duplicates outright ('Eminescu, Mihai' and 'mihai eminescu': folded name
+tokens in any order), and the distinct values are put in blocks by keys so
+that only the pairs within a block are scored:
+
+- authors by each longer name token, which brings 'M. Eminescu' next to
+  'Mihai Eminescu';
+- books by owner, author (the duplicate authors counting as one), publisher
+  and the start of the title: the same title on two shelves, or from two
+  publishers, is two books.
+
+Blocks over max_block rows (a common first name) are skipped: the other
+keys of their rows still pair them up. The pairs scoring at least the
+threshold are joined into groups, which merge_authors() and merge_books()
+fold into one row each, moving the books, statuses and genres in bulk."""
+
+import collections
+import difflib
+import time
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import search
+from .autocomplete import fold
+from .models import Book, Author, Genre, Status
+
+
+THRESHOLD = 0.85
+MAX_BLOCK = 200
+
+Result = collections.namedtuple('Result', 'groups rows blocks comparisons seconds')
+
+
+def name_tokens(*parts):
+    """Sorted folded tokens of a name, initials without their dot"""
+    return tuple(sorted(fold(' '.join(parts)).replace('.', ' ').replace(',', ' ').replace('-', ' ').split()))
+
+
+def _token_score(a, b):
+    if a == b:
+        return 1.0
+    #an initial stands for any name with that first letter
+    if (len(a) == 1 or len(b) == 1) and a[0] == b[0]:
+        return 0.9
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def name_similarity(a, b):
+    """0 to 1, for two name_tokens(): the worst of the best matches of the tokens of the
+    shorter name, less for the tokens it lacks ('Marin Preda' is not 'Maria Preda', nor
+    'Preda' 'Marin Preda')"""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return min(max(_token_score(token, other) for other in b) for token in a) * len(a) / len(b)
+
+
+def title_similarity(a, b):
+    return 1.0 if a == b else difflib.SequenceMatcher(None, a, b).ratio()
+
+
+class _Groups:
+    """Union-find over pks"""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, pk):
+        root = pk
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while pk != root:
+            self.parent[pk], pk = root, self.parent.get(pk, pk)
+        return root
+
+    def union(self, a, b):
+        self.parent.setdefault(a, a)
+        self.parent.setdefault(b, b)
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+    def groups(self):
+        members = collections.defaultdict(list)
+        for pk in list(self.parent):
+            members[self.find(pk)].append(pk)
+        return sorted(sorted(group) for group in members.values() if len(group) > 1)
+
+
+def _dedup(rows, blocks_of, similarity, threshold, max_block, start):
+    """Groups the rows {pk: value} whose blocks pair them up and whose similarity reaches the threshold"""
+    groups = _Groups()
+    #equal values are duplicates without scoring: one of them stands for all
+    first = {}
+    for pk, value in rows.items():
+        if value in first:
+            groups.union(first[value], pk)
+        else:
+            first[value] = pk
+
+    blocks = collections.defaultdict(list)
+    for value, pk in first.items():
+        for key in blocks_of(value):
+            blocks[key].append(pk)
+
+    compared = set()
+    comparisons = 0
+    for pks in blocks.values():
+        if not 1 < len(pks) <= max_block:
+            continue
+        for i, a in enumerate(pks):
+            for b in pks[i + 1:]:
+                if (a, b) in compared or groups.find(a) == groups.find(b):
+                    continue
+                compared.add((a, b))
+                comparisons += 1
+                if similarity(rows[a], rows[b]) >= threshold:
+                    groups.union(a, b)
+    return Result(groups.groups(), len(rows), len(blocks), comparisons, time.perf_counter() - start)
+
+
+def find_duplicate_authors(threshold=THRESHOLD, max_block=MAX_BLOCK):
+    start = time.perf_counter()
+    rows = {pk: name_tokens(first_name, last_name) for pk, first_name, last_name in
+            Author.objects.values_list('pk', 'first_name', 'last_name').iterator(chunk_size=10000)}
+
+    def blocks_of(tokens):
+        return [token for token in tokens if len(token) > 3]
+
+    return _dedup(rows, blocks_of, name_similarity, threshold, max_block, start)
+
+
+def find_duplicate_books(threshold=0.9, max_block=MAX_BLOCK, authors=None):
+    """authors is the Result of find_duplicate_authors(), when its groups are not merged yet"""
+    start = time.perf_counter()
+    same_author = {}
+    for group in (authors.groups if authors else []):
+        for pk in group:
+            same_author[pk] = group[0]
+    rows = {}
+    for pk, owner, author, title, pub_house in (Book.objects.values_list('pk', 'owner', 'author', 'title', 'pub_house')
+                                                .iterator(chunk_size=10000)):
+        rows[pk] = (owner, same_author.get(author, author), fold(title), fold(pub_house))
+
+    def blocks_of(book):
+        owner, author, title, pub_house = book
+        return [(owner, author, pub_house, title[:4])]
+
+    def similarity(a, b):
+        return title_similarity(a[2], b[2])
+
+    return _dedup(rows, blocks_of, similarity, threshold, max_block, start)
+
+
+def merge_authors(pks):
+    """Merges the authors into the one with the most books, the oldest on a tie. Returns its pk."""
+    books = dict(Book.objects.filter(author__in=pks).values_list('author').annotate(count=Count('pk')))
+    survivor = min(pks, key=lambda pk: (-books.get(pk, 0), pk))
+    others = [pk for pk in pks if pk != survivor]
+    with transaction.atomic():
+        Book.objects.filter(author__in=others).update(author=survivor, updated_at=timezone.now())
+        #one by one, for the signals: counters, search and autocomplete indexes
+        Author.objects.filter(pk__in=others).delete()
+        Author.objects.filter(pk=survivor).update(updated_at=timezone.now())
+        #the moved books carry the survivor's name in the search index now
+        search.index_books(Book.objects.filter(author=survivor).select_related('author'))
+    return survivor
+
+
+def merge_books(pks):
+    """Merges the books into the one with the most copies, the oldest on a tie. Returns its pk.
+
+    The copies (Status rows) move to it and it gets the genres of all."""
+    copies = dict(Status.objects.filter(book__in=pks).values_list('book').annotate(count=Count('pk')))
+    survivor = min(pks, key=lambda pk: (-copies.get(pk, 0), pk))
+    others = [pk for pk in pks if pk != survivor]
+    with transaction.atomic():
+        Status.objects.filter(book__in=others).update(book=survivor, updated_at=timezone.now())
+        book = Book.objects.get(pk=survivor)
+        #one INSERT of the missing rows; m2m_changed keeps the facet counts
+        book.genre.add(*Genre.objects.filter(book__in=others).exclude(book=survivor).distinct())
+        Book.objects.filter(pk__in=others).delete()
+        Book.objects.filter(pk=survivor).refresh_availability()
+    return survivor
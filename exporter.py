@@ -0,0 +1,94 @@
+"""Streaming catalog export, used by the export view and manage.py export_books.
+
+Books are read with .values() and iterator(chunk_size=...), their status,
+wisher and due date from the current_* columns the list and the API show,
+and each chunk gets its genres in one extra query, so memory stays flat
+whatever the size of the catalog. The columns are the ones import_books
+reads, plus the book id, wisher and due date."""
+
+import csv
+import json
+
+from django.db.models import F
+
+from .models import Book
+
+
+COLUMNS = ('id', 'title', 'author_first_name', 'author_last_name', 'summary', 'pub_house',
+           'pub_date', 'category', 'genres', 'owner', 'status', 'wisher', 'due_back')
+
+BOOK_VALUES = {
+    'author_first_name': F('author__first_name'),
+    'author_last_name': F('author__last_name'),
+    'owner_name': F('owner__username'),
+    'wisher_name': F('current_wisher__username'),
+}
+
+
+def export_rows(chunk_size=2000):
+    """Yields one dict per book, genres as a list"""
+    books = (Book.objects.order_by('pk')
+             .values('id', 'title', 'summary', 'pub_house', 'pub_date', 'category', 'current_status',
+                     'current_due_back', **BOOK_VALUES)
+             .iterator(chunk_size=chunk_size))
+    chunk = []
+    for book in books:
+        chunk.append(book)
+        if len(chunk) == chunk_size:
+            yield from _complete(chunk)
+            chunk = []
+    yield from _complete(chunk)
+
+
+def _complete(chunk):
+    if not chunk:
+        return
+    pks = [book['id'] for book in chunk]
+    genres = {}
+    for book_id, name in (Book.genre.through.objects.filter(book_id__in=pks)
+                          .order_by('genre__name').values_list('book_id', 'genre__name')):
+        genres.setdefault(book_id, []).append(name)
+
+    for book in chunk:
+        yield {
+            'id': book['id'],
+            'title': book['title'],
+            'author_first_name': book['author_first_name'] or '',
+            'author_last_name': book['author_last_name'] or '',
+            'summary': book['summary'],
+            'pub_house': book['pub_house'],
+            'pub_date': book['pub_date'],
+            'category': book['category'],
+            'genres': genres.get(book['id'], []),
+            'owner': book['owner_name'] or '',
+            'status': book['current_status'],
+            'wisher': book['wisher_name'] or '',
+            'due_back': book['current_due_back'].isoformat() if book['current_due_back'] else '',
+        }
+
+
+class _Echo:
+    """File-like object that hands back what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    """Yields the rows as CSV lines, header first"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        row = dict(row, genres=';'.join(row['genres']))
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def export_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+FORMATS = {
+    'csv': (export_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (export_jsonl, 'application/x-ndjson; charset=utf-8'),
+}
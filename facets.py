@@ -0,0 +1,185 @@
+"""Faceted browsing of the catalog by genre, category, owner and availability.
+
+The facet counts are read from FacetCount, which has one row per combination
+of facet values present in the catalog, instead of running one GROUP BY over
+the books per facet. Its size follows the number of genres, categories,
+owners and statuses, not the number of books. The rows with genre 0 count
+every book once; a genre filter reads the rows of that genre instead.
+
+The counts are adjusted on every write: by the receivers in books.signals for
+saved and deleted books and changed genres, by track() around the update of
+current_status in BookQuerySet.refresh_availability, and by the importer.
+rebuild() (manage.py rebuild_facets) recounts everything."""
+
+import collections
+import contextlib
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Book, Genre, FacetCount, GIVEAWAY_STATUS
+
+
+FACETS = ('genre', 'category', 'owner', 'status')
+#values shown per facet, the most frequent first
+FACET_LIMIT = 20
+
+BOOK_LOOKUPS = {
+    'genre': 'genre',
+    'category': 'category',
+    'owner': 'owner_id',
+    'status': 'current_status',
+}
+
+
+def book_facets(book):
+    """(category, owner, status) of a book, the FacetCount key without the genre"""
+    return (book.category, book.owner_id or 0, book.current_status)
+
+
+def _add(deltas, facets, genres, sign):
+    category, owner, status = facets
+    deltas[0, category, owner, status] += sign
+    for genre in genres:
+        deltas[genre, category, owner, status] += sign
+
+
+def apply(deltas):
+    """Adds {(genre, category, owner, status): delta} to the counts"""
+    #always in the same order, so that two writers cannot deadlock on the rows
+    for key in sorted(key for key, delta in deltas.items() if delta):
+        genre, category, owner, status = key
+        rows = FacetCount.objects.filter(genre=genre, category=category, owner=owner, status=status)
+        if rows.update(count=F('count') + deltas[key]):
+            continue
+        try:
+            with transaction.atomic():
+                FacetCount.objects.create(genre=genre, category=category, owner=owner, status=status,
+                                          count=deltas[key])
+        except IntegrityError:
+            #created by another writer in the meantime
+            rows.update(count=F('count') + deltas[key])
+
+
+def count_books(books, sign=1):
+    """Counts books given as (facets, genre pks) pairs; sign=-1 uncounts them"""
+    deltas = collections.Counter()
+    for facets, genres in books:
+        _add(deltas, facets, genres, sign)
+    apply(deltas)
+
+
+def count_genres(genres, books, sign=1):
+    """Counts the books ({pk: facets}) in the genres, or uncounts them with sign=-1"""
+    deltas = collections.Counter()
+    for facets in books.values():
+        category, owner, status = facets
+        for genre in genres:
+            deltas[genre, category, owner, status] += sign
+    apply(deltas)
+
+
+def snapshot(books):
+    """{pk: facets} for a Book queryset"""
+    return {pk: (category, owner or 0, status) for pk, category, owner, status in
+            books.values_list('pk', 'category', 'owner_id', 'current_status')}
+
+
+def genres_of(pks):
+    genres = collections.defaultdict(list)
+    for book_id, genre_id in Book.genre.through.objects.filter(book_id__in=pks).values_list('book_id', 'genre_id'):
+        genres[book_id].append(genre_id)
+    return genres
+
+
+def count_changes(before, after):
+    """Moves the books whose facets went from before to after ({pk: facets} each)"""
+    changed = [pk for pk, facets in after.items() if pk in before and facets != before[pk]]
+    if not changed:
+        return
+    genres = genres_of(changed)
+    deltas = collections.Counter()
+    for pk in changed:
+        _add(deltas, before[pk], genres[pk], -1)
+        _add(deltas, after[pk], genres[pk], 1)
+    apply(deltas)
+
+
+@contextlib.contextmanager
+def track(books):
+    """Adjusts the counts for what the block changes in the facets of books, a
+    Book queryset, typically with update(). Costs a query before and after."""
+    before = snapshot(books)
+    yield
+    if before:
+        count_changes(before, snapshot(Book.objects.filter(pk__in=list(before))))
+
+
+def rebuild():
+    """Recounts every facet from the books and returns the number of FacetCount rows"""
+    books = (Book.objects.order_by().values_list('category', 'owner_id', 'current_status')
+             .annotate(count=Count('id')))
+    genres = (Book.genre.through.objects.order_by()
+              .values_list('genre_id', 'book__category', 'book__owner_id', 'book__current_status')
+              .annotate(count=Count('id')))
+    rows = [FacetCount(genre=0, category=category, owner=owner or 0, status=status, count=count)
+            for category, owner, status, count in books]
+    rows += [FacetCount(genre=genre, category=category, owner=owner or 0, status=status, count=count)
+             for genre, category, owner, status, count in genres]
+    with transaction.atomic():
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(rows)
+    return len(rows)
+
+
+def parse_filters(params):
+    """The valid facet filters in params (a QueryDict), unknown values left out"""
+    filters = {}
+    for name in ('genre', 'owner'):
+        try:
+            filters[name] = int(params[name])
+        except (KeyError, ValueError):
+            pass
+    choices = {'category': dict(Book.CATEGORY), 'status': dict(GIVEAWAY_STATUS)}
+    for name, values in choices.items():
+        if params.get(name) in values:
+            filters[name] = params[name]
+    return filters
+
+
+def filter_books(queryset, filters):
+    #owner 0 stands for the books without an owner
+    return queryset.filter(**{BOOK_LOOKUPS[name]: (value or None) if name == 'owner' else value
+                              for name, value in filters.items()})
+
+
+def counts(filters):
+    """Returns ({facet: [(value, label, count)]}, total) for the books matching filters.
+
+    The counts of a facet leave its own filter out, so that they show the
+    choices next to the current one."""
+    result = {}
+    for facet in FACETS:
+        rows = FacetCount.objects.filter(**{name: value for name, value in filters.items() if name != facet})
+        if facet == 'genre':
+            rows = rows.filter(genre__gt=0)
+        elif 'genre' not in filters:
+            rows = rows.filter(genre=0)
+        result[facet] = list(rows.order_by().values_list(facet).annotate(count=Sum('count'))
+                             .filter(count__gt=0).order_by('-count', facet)[:FACET_LIMIT])
+    total = sum(count for value, count in result['status'] if filters.get('status', value) == value)
+
+    labels = {
+        'genre': dict(Genre.objects.filter(pk__in=[value for value, count in result['genre']])
+                      .values_list('pk', 'name')),
+        'owner': dict(User.objects.filter(pk__in=[value for value, count in result['owner']])
+                      .values_list('pk', 'username')),
+        'category': dict(Book.CATEGORY),
+        'status': dict(GIVEAWAY_STATUS),
+    }
+    labels['owner'][0] = '-'
+    labels['category'][''] = '-'
+    labels['status'][''] = '-'
+    return {facet: [(value, labels[facet].get(value, value), count) for value, count in values]
+            for facet, values in result.items()}, total
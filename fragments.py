@@ -0,0 +1,70 @@
+"""Cache of the rendered parts of the catalog pages that are the same for every visitor.
+
+A fragment is keyed by the version of the data on its page, the one the
+conditional GETs of books.versions read anyway (the latest updated_at of the
+models shown, and the totals), plus the path and page: every write path sets
+updated_at, so a change of a book, author, genre or status moves only the
+versions of the pages showing it, a stale fragment is never served and
+nothing is ever flushed. The parts that differ per user (the wish form, the
+staff links, the greeting) stay outside the fragments.
+
+Fragments go to the cache named by BOOKS_FRAGMENT_CACHE ('default'), which
+can be a books.lrucache.LRUCache bounded in bytes. The hits and misses are
+counted per fragment, see stats() and the metrics view."""
+
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'BOOKS_FRAGMENT_CACHE', 'default')]
+
+
+def _timeout():
+    #the keys are versioned, the timeout only frees the old ones
+    return getattr(settings, 'BOOKS_FRAGMENT_TIMEOUT', 24 * 3600)
+
+
+def _count(name, result):
+    with _stats_lock:
+        _stats[name, result] += 1
+
+
+def key(name, version, vary=()):
+    digest = hashlib.md5(':'.join(map(str, (version,) + tuple(vary))).encode()).hexdigest()
+    return f'books:fragment:{name}:{digest}'
+
+
+def get_or_render(name, version, vary, render):
+    """The cached fragment, or render() cached; rendered every time if the version is unknown"""
+    if version is None:
+        _count(name, 'uncached')
+        return render()
+    cache_key = key(name, version, vary)
+    html = _cache().get(cache_key)
+    if html is None:
+        _count(name, 'miss')
+        html = render()
+        _cache().set(cache_key, html, _timeout())
+    else:
+        _count(name, 'hit')
+    return html
+
+
+def stats():
+    """{(fragment, 'hit' | 'miss' | 'uncached'): count} of this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
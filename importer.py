@@ -0,0 +1,287 @@
+"""Bulk catalog import, used by manage.py import_books.
+
+Records are read one at a time from a CSV or JSON lines file and written in
+chunks: each chunk resolves its authors, genres and owners through in-memory
+caches (creating the missing authors and genres), then inserts the books,
+their genre rows and one Status per book with bulk_create, all in one
+transaction. After each chunk the number of records done is saved to a
+checkpoint file, so an interrupted import can resume where it stopped.
+
+Record fields: title (required), author_first_name, author_last_name, summary,
+pub_house, pub_date, category (code or name), genres (';' separated in CSV,
+a list in JSON), owner (username), status (av, wished or gone; av by
+default) and cover (the path of an image, relative to cover_root). The covers
+are copied into the storage as the chunk is written, and their thumbnails
+made by books.covers once it commits. A record that is not an object or has
+a value longer than its field is skipped and reported, like any invalid one."""
+
+import csv
+import json
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import counters, covers, facets, search
+from .models import Book, Author, Genre, Status
+
+
+CATEGORIES = dict(Book.CATEGORY)
+CATEGORY_CODES = {name: code for code, name in Book.CATEGORY}
+STATUSES = dict(Status.GIVEAWAY_STATUS)
+#the longest value of each text field: a longer one would fail the whole chunk's INSERT
+#on the backends that enforce it
+MAX_LENGTHS = {
+    'title': Book._meta.get_field('title').max_length,
+    'summary': Book._meta.get_field('summary').max_length,
+    'pub_house': Book._meta.get_field('pub_house').max_length,
+    'pub_date': Book._meta.get_field('pub_date').max_length,
+    'author_first_name': Author._meta.get_field('first_name').max_length,
+    'author_last_name': Author._meta.get_field('last_name').max_length,
+    'genres': Genre._meta.get_field('name').max_length,
+}
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+class RecordError(ValueError):
+    pass
+
+
+def read_records(path, format=None):
+    """Yields the records of a .csv or .jsonl file, one at a time"""
+    if format is None:
+        format = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            for record in csv.DictReader(f):
+                yield record
+        elif format == 'jsonl':
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise CatalogImportError(f'Unknown format {format!r}')
+
+
+class Checkpoint:
+    """Number of records already imported from a file, kept next to it"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def save(self, done):
+        #write then rename, so an interruption never leaves a half written checkpoint
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(done))
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class CatalogImporter:
+
+    def __init__(self, chunk_size=500, checkpoint=None, progress=None, cover_root=''):
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.cover_root = cover_root
+        self.authors = {}
+        self.genres = {}
+        self.owners = {}
+        self.imported = 0
+        self.errors = []
+
+    def run(self, records):
+        """Imports the records, skipping the ones a previous run already did"""
+        start = self.checkpoint.load() if self.checkpoint else 0
+        done = start
+        started = time.monotonic()
+        chunk = []
+        for number, record in enumerate(records, 1):
+            if number <= start:
+                continue
+            chunk.append((number, record))
+            if len(chunk) == self.chunk_size:
+                done = self.import_chunk(chunk)
+                chunk = []
+                self.report(started)
+        if chunk:
+            done = self.import_chunk(chunk)
+            self.report(started)
+        if self.checkpoint:
+            self.checkpoint.clear()
+        return done - start
+
+    def report(self, started):
+        if self.progress:
+            elapsed = time.monotonic() - started
+            self.progress(self.imported, elapsed)
+
+    def clean(self, record):
+        if not isinstance(record, dict):
+            raise RecordError(f'not a record: {type(record).__name__}')
+        title = (record.get('title') or '').strip()
+        if not title:
+            raise RecordError('title is required')
+        category = (record.get('category') or '').strip()
+        if category and category not in CATEGORIES:
+            if category not in CATEGORY_CODES:
+                raise RecordError(f'unknown category {category!r}')
+            category = CATEGORY_CODES[category]
+        status = (record.get('status') or 'av').strip()
+        if status not in STATUSES:
+            raise RecordError(f'unknown status {status!r}')
+        genres = record.get('genres') or []
+        if isinstance(genres, str):
+            genres = genres.split(';')
+        cleaned = {
+            'title': title,
+            'author': ((record.get('author_first_name') or '').strip(),
+                       (record.get('author_last_name') or '').strip()),
+            'summary': record.get('summary') or '',
+            'pub_house': record.get('pub_house') or '',
+            'pub_date': record.get('pub_date') or '',
+            'category': category,
+            'genres': [name.strip() for name in genres if name.strip()],
+            'owner': (record.get('owner') or '').strip(),
+            'status': status,
+            'cover': (record.get('cover') or '').strip(),
+        }
+        first_name, last_name = cleaned['author']
+        values = [('author_first_name', first_name), ('author_last_name', last_name)]
+        values += [(name, cleaned[name]) for name in ('title', 'summary', 'pub_house', 'pub_date')]
+        values += [('genres', name) for name in cleaned['genres']]
+        for name, value in values:
+            if len(value) > MAX_LENGTHS[name]:
+                raise RecordError(f'{name} longer than {MAX_LENGTHS[name]} characters')
+        return cleaned
+
+    def import_chunk(self, chunk):
+        rows = []
+        for number, record in chunk:
+            try:
+                rows.append(dict(self.clean(record), number=number))
+            except RecordError as e:
+                self.errors.append((number, str(e)))
+
+        with transaction.atomic():
+            new_authors = self.resolve_authors({row['author'] for row in rows if any(row['author'])})
+            self.resolve_genres({name for row in rows for name in row['genres']})
+            self.resolve_owners({row['owner'] for row in rows if row['owner']})
+
+            books = []
+            for row in rows:
+                if row['owner'] and row['owner'] not in self.owners:
+                    self.errors.append((row['number'], f'unknown owner {row["owner"]!r}'))
+                    continue
+                cover = ''
+                if row['cover']:
+                    try:
+                        cover = covers.store(os.path.join(self.cover_root, row['cover']))
+                    except OSError as e:
+                        self.errors.append((row['number'], f'cover: {e}'))
+                        continue
+                books.append((row, Book(
+                        title=row['title'],
+                        author_id=self.authors.get(row['author']),
+                        summary=row['summary'],
+                        pub_house=row['pub_house'],
+                        pub_date=row['pub_date'],
+                        category=row['category'],
+                        owner_id=self.owners.get(row['owner']),
+                        cover=cover,
+                        #the book's single Status below
+                        current_status=row['status'])))
+            self.create_books([book for row, book in books])
+
+            Through = Book.genre.through
+            Through.objects.bulk_create(
+                    [Through(book_id=book.pk, genre_id=self.genres[name])
+                     for row, book in books for name in set(row['genres'])])
+            Status.objects.bulk_create(
+                    [Status(book_id=book.pk, status=row['status']) for row, book in books])
+
+            #bulk_create sends no signals: keep the counters, facets and search index up to date
+            counters.incr('books', len(books))
+            counters.incr('authors', len(new_authors))
+            counters.incr('available', sum(row['status'] == 'av' for row, book in books))
+            facets.count_books([((row['category'], book.owner_id or 0, row['status']),
+                                 {self.genres[name] for name in row['genres']}) for row, book in books])
+            search.index_authors(Author.objects.filter(pk__in=new_authors))
+            search.index_books(Book.objects.filter(pk__in=[book.pk for row, book in books])
+                               .select_related('author'))
+            covers.schedule([(book.pk, book.cover.name) for row, book in books if book.cover])
+
+            done = chunk[-1][0]
+            if self.checkpoint:
+                transaction.on_commit(lambda: self.checkpoint.save(done))
+        self.imported += len(books)
+        return done
+
+    def create_books(self, books):
+        if not books:
+            return
+        #bulk_create only sets the primary keys on backends that can return them;
+        #elsewhere the new rows are the ones above the highest pk before the insert
+        last = Book.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Book.objects.bulk_create(books)
+        if books[0].pk is None:
+            pks = list(Book.objects.filter(pk__gt=last).order_by('pk').values_list('pk', flat=True))
+            if len(pks) != len(books):
+                raise CatalogImportError('Books were inserted concurrently, cannot match the new rows')
+            for book, pk in zip(books, pks):
+                book.pk = pk
+
+    def resolve_authors(self, names):
+        """Fills the author cache for names ((first, last) pairs). Returns the pks of the new authors."""
+        missing = names - self.authors.keys()
+        if not missing:
+            return []
+        self.load_authors(missing)
+        created = missing - self.authors.keys()
+        if not created:
+            return []
+        Author.objects.bulk_create(
+                [Author(first_name=first_name, last_name=last_name) for first_name, last_name in created])
+        self.load_authors(created)
+        return [self.authors[name] for name in created]
+
+    def load_authors(self, names):
+        #one IN on the last names, the exact pairs are matched here
+        authors = (Author.objects.filter(last_name__in={last_name for first_name, last_name in names})
+                   .order_by('pk').values_list('pk', 'first_name', 'last_name'))
+        for pk, first_name, last_name in authors:
+            if (first_name, last_name) in names:
+                self.authors.setdefault((first_name, last_name), pk)
+
+    def resolve_genres(self, names):
+        missing = names - self.genres.keys()
+        if not missing:
+            return
+        self.genres.update(
+                (name, pk) for pk, name in Genre.objects.filter(name__in=missing).values_list('pk', 'name'))
+        created = missing - self.genres.keys()
+        if created:
+            Genre.objects.bulk_create([Genre(name=name) for name in created])
+            self.resolve_genres(created)
+
+    def resolve_owners(self, usernames):
+        missing = usernames - self.owners.keys()
+        if missing:
+            self.owners.update(
+                    (username, pk) for pk, username
+                    in User.objects.filter(username__in=missing).values_list('pk', 'username'))
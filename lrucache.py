@@ -0,0 +1,116 @@
+"""In-process cache backend bounded by size, evicting the least recently used entries.
+
+Django's locmem backend bounds the number of entries, and a few large
+rendered pages can hold as much memory as thousands of small fragments. This
+one bounds the bytes of the pickled values instead:
+
+    CACHES = {
+        'fragments': {
+            'BACKEND': 'books.lrucache.LRUCache',
+            'OPTIONS': {'MAX_BYTES': 32 * 1024 * 1024},
+        },
+    }
+
+Every process has its own copy, like locmem."""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class LRUCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.max_bytes = int(options.get('MAX_BYTES', 16 * 1024 * 1024))
+        #key: (expiry, pickled value), least recently used first
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def _get_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            self._delete(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _set(self, key, pickled, timeout):
+        self._delete(key)
+        if len(pickled) > self.max_bytes:
+            return
+        self._entries[key] = (self.get_backend_timeout(timeout), pickled)
+        self.bytes += len(pickled)
+        while self.bytes > self.max_bytes:
+            oldest, (expiry, value) = self._entries.popitem(last=False)
+            self.bytes -= len(value)
+
+    def _delete(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= len(entry[1])
+        return True
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        #an absolute time, or None for never
+        timeout = super().get_backend_timeout(timeout)
+        return timeout if timeout is None else max(timeout, 0)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            if self._get_entry(key) is not None:
+                return False
+            self._set(key, pickled, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            entry = self._get_entry(key)
+        return default if entry is None else pickle.loads(entry[1])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._set(key, pickled, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                return False
+            self._entries[key] = (self.get_backend_timeout(timeout), entry[1])
+            return True
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self._get_entry(key) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from books.models import Book, Author, Genre, Status
+
+
+class Command(BaseCommand):
+    help = ('Compares the JSON API with the HTML pages it replaces for scrapers: a page of the '
+            'book list, and a batch of books fetched by id. Writes nothing: the sample books '
+            'are rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=20, help='Books per page and per batch')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        count = options['books']
+        with transaction.atomic():
+            pks = self.create_books(count)
+            ids = ','.join(map(str, pks))
+            api = reverse('books:api', args=['books'])
+            cases = [
+                ('list page, html', [reverse('books:books')]),
+                ('list page, api', [f'{api}?limit={count}']),
+                ('list page, api, 2 fields', [f'{api}?limit={count}&fields=id,title']),
+                (f'{count} books by id, html', [reverse('books:book_detail', args=[pk]) for pk in pks]),
+                (f'{count} books by id, api', [f'{api}?ids={ids}']),
+            ]
+            for name, urls in cases:
+                queries, size, latencies = self.measure(urls, options['repeat'])
+                self.stdout.write(
+                        f'{name:>28}: {len(urls):3d} requests, {queries:4d} queries, {size:7d} bytes, '
+                        f'median {statistics.median(latencies) * 1000:.2f} ms')
+            transaction.set_rollback(True)
+
+    def create_books(self, count):
+        owner = User.objects.create(username='bench_owner')
+        author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        genres = [Genre.objects.create(name=f'Bench genre {i}') for i in range(3)]
+        pks = []
+        for i in range(count):
+            book = Book.objects.create(title=f'Poezii {i}', author=author, owner=owner,
+                                       pub_house='Humanitas', summary='Lorem ipsum ' * 20)
+            book.genre.set(genres)
+            Status.objects.create(book=book, status='av')
+            pks.append(book.pk)
+        return pks
+
+    def get(self, url):
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        match = resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def measure(self, urls, repeat):
+        #a full query log (DEBUG = True) would hide the new queries
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            size = sum(len(self.get(url).content) for url in urls)
+        latencies = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            for url in urls:
+                self.get(url)
+            latencies.append(time.perf_counter() - start)
+        return len(captured), size, latencies
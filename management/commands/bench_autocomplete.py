@@ -0,0 +1,62 @@
+import random
+import statistics
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from books import autocomplete
+from books.benchmark import TITLE_WORDS, percentile
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = ('Builds the autocomplete prefix index over synthetic titles and measures its size, '
+            'build time and lookup latency; with --database, compares with LIKE queries on the '
+            'books of the database. Writes nothing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=1000000)
+        parser.add_argument('--queries', type=int, default=10000)
+        parser.add_argument('--database', action='store_true',
+                            help='Also time title__istartswith on the books table')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        #diacritics in the titles, none in most queries
+        words = TITLE_WORDS + ('știință', 'țară', 'învățătură', 'pâine', 'măr', 'Ştefan')
+        titles = [(pk, ' '.join(rnd.sample(words, rnd.randint(1, 5))).capitalize())
+                  for pk in range(1, options['titles'] + 1)]
+
+        start = time.perf_counter()
+        index = autocomplete.PrefixIndex(titles)
+        built = time.perf_counter() - start
+        segment = index.segment
+        size = sum(sys.getsizeof(part) for part in (segment.text, segment.labels, segment.pks,
+                                                     segment.starts, segment.label_starts, segment.positions))
+        self.stdout.write(f'{len(titles)} titles, {len(segment.positions)} word starts: '
+                          f'built in {built:.1f} s, {size / 2 ** 20:.1f} MiB')
+
+        queries = [autocomplete.fold(rnd.choice(words))[:rnd.randint(1, 6)] for i in range(options['queries'])]
+        self.report('index', index.suggest, queries)
+
+        #and a few changes on top of the segment
+        for pk in range(1, 1001):
+            index.update(pk, f'Ediție nouă {pk}')
+        self.report('index + 1000 changes', index.suggest, queries)
+
+        if options['database']:
+            def like(query, limit=10):
+                return list(Book.objects.filter(title__istartswith=query)
+                            .order_by('title').values_list('pk', 'title')[:limit])
+            self.report(f'database, {Book.objects.count()} books', like, queries[:1000])
+
+    def report(self, name, suggest, queries):
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            suggest(query)
+            latencies.append((time.perf_counter() - start) * 1e6)
+        self.stdout.write(f'{name:>28}: p50 {percentile(latencies, 50):8.1f} us, '
+                          f'p99 {percentile(latencies, 99):8.1f} us, mean {statistics.mean(latencies):8.1f} us')
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books.models import Book, Author, Genre, Status
+from books.views import BookDisplay, BookDetail
+
+
+class LazyBookDisplay(BookDisplay):
+    """The book detail view as it was: every relation loaded lazily by the template"""
+    queryset = Book.objects.all()
+
+
+def lazy_book_detail(request, *args, **kwargs):
+    #and the view callable rebuilt on every request
+    return LazyBookDisplay.as_view()(request, *args, **kwargs)
+
+
+class Command(BaseCommand):
+    help = ('Measures queries and latency of the book detail page for a book with many genres '
+            'and statuses, before and after loading it in a single pass. Writes nothing: the '
+            'sample book is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--genres', type=int, default=30)
+        parser.add_argument('--statuses', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            book = self.create_book(options['genres'], options['statuses'])
+            request = RequestFactory().get(reverse('books:book_detail', args=[book.pk]))
+            request.user = AnonymousUser()
+            for name, view in (('before', lazy_book_detail), ('after', BookDetail.as_view())):
+                queries, latencies = self.measure(view, request, book.pk, options['repeat'])
+                self.stdout.write(
+                        f'{name:>6}: {queries:4d} queries, '
+                        f'median {statistics.median(latencies) * 1000:.2f} ms, '
+                        f'max {max(latencies) * 1000:.2f} ms')
+            transaction.set_rollback(True)
+
+    def create_book(self, genres, statuses):
+        owner = User.objects.create(username='bench_owner')
+        author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        book = Book.objects.create(title='Poezii', author=author, owner=owner, pub_house='Humanitas')
+        #bulk_create does not set the primary keys on every backend: read them back
+        Genre.objects.bulk_create([Genre(name=f'Bench genre {i}') for i in range(genres)])
+        book.genre.set(Genre.objects.filter(name__startswith='Bench genre '))
+        User.objects.bulk_create([User(username=f'bench_wisher_{i}') for i in range(statuses)])
+        wishers = User.objects.filter(username__startswith='bench_wisher_')
+        Status.objects.bulk_create(
+                [Status(book=book, wisher=wisher, status='wished') for wisher in wishers])
+        return book
+
+    def measure(self, view, request, pk, repeat):
+        #a full query log (DEBUG = True) would hide the new queries
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            view(request, pk=pk).render()
+        latencies = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            view(request, pk=pk).render()
+            latencies.append(time.perf_counter() - start)
+        return len(captured), latencies
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from books import wishes
+from books.models import Book, Status
+
+
+class Command(BaseCommand):
+    help = ('Fires simultaneous claims at one copy of a throwaway book and reports the number of '
+            'winners (it must be one) and the throughput. The sample data is deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claims', type=int, default=300)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        claims = options['claims']
+        User.objects.bulk_create([User(username=f'bench_claimer_{i}') for i in range(claims)])
+        users = list(User.objects.filter(username__startswith='bench_claimer_'))
+        book = Book.objects.create(title='Bench book', pub_house='Bench')
+        try:
+            for round in range(options['rounds']):
+                status = Status.objects.create(book=book, status='av')
+                winners, elapsed = self.fire(status.pk, users)
+                self.stdout.write(f'round {round + 1}: {claims} claims, {winners} winner(s), '
+                                  f'{elapsed * 1000:.0f} ms, {claims / elapsed:.0f} claims/s')
+        finally:
+            Status.objects.filter(book=book).delete()
+            book.delete()
+            User.objects.filter(username__startswith='bench_claimer_').delete()
+
+    def fire(self, status_pk, users):
+        start = threading.Barrier(len(users) + 1)
+        results = []
+
+        def claim(user):
+            try:
+                start.wait()
+                results.append(wishes.claim(status_pk, user))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=[user]) for user in users]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return sum(results), time.perf_counter() - started
@@ -0,0 +1,50 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from books import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Requests every named url of the books app and reports the p50/p95/p99 latency, '
+            'queries and peak memory of each, optionally saved as JSON and compared with a '
+            'previous run. Run it against a seeded copy of the database (see seed_benchmark): '
+            'the pages are only read, but logging in writes a session.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to log in as (default: the first superuser)')
+        parser.add_argument('--anonymous', action='store_true', help='Do not log in')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per url')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Only these url names')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user {options["user"]}.')
+        elif not options['anonymous']:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+
+        self.stdout.write(f'{"url name":>22} {"status":>6} {"queries":>7} {"p50 ms":>9} '
+                          f'{"p95 ms":>9} {"p99 ms":>9} {"peak KiB":>9}')
+        results = benchmark.run(user=user, repeat=options['repeat'], only=options['only'],
+                                log=self.report)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}.'))
+
+        if options['compare']:
+            self.stdout.write(f'\n{"url name":>22} {"metric":>9} {"before":>10} {"after":>10} {"change":>8}')
+            for name, metric, before, after in benchmark.compare(benchmark.load(options['compare']), results):
+                change = f'{(after - before) / before * 100:+.0f}%' if before else ''
+                self.stdout.write(f'{name:>22} {metric:>9} {before:>10} {after:>10} {change:>8}')
+
+    def report(self, name, result):
+        self.stdout.write(f'{name:>22} {result["status"]:>6} {result["queries"]:>7} {result["p50_ms"]:>9.2f} '
+                          f'{result["p95_ms"]:>9.2f} {result["p99_ms"]:>9.2f} {result["peak_kib"]:>9.1f}')
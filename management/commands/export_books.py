@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from books import exporter
+
+
+class Command(BaseCommand):
+    help = 'Streams the whole catalog (books with author, genres, owner and current status) as CSV or JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exporter.FORMATS), default='csv')
+        parser.add_argument('--output', help='Output file, default: standard output')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Books read from the database at a time')
+
+    def handle(self, *args, **options):
+        export, content_type = exporter.FORMATS[options['format']]
+        rows = exporter.export_rows(chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(export(rows))
+        else:
+            for line in export(rows):
+                self.stdout.write(line, ending='')
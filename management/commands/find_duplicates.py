@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from books import dedup
+from books.models import Book, Author
+
+
+class Command(BaseCommand):
+    help = ('Finds duplicate authors and books by blocking and similarity scoring, reports the '
+            'groups and the throughput, and merges them with --merge')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threshold', type=float, default=dedup.THRESHOLD,
+                            help='Similarity of the author names (0 to 1)')
+        parser.add_argument('--title-threshold', type=float, default=0.9,
+                            help='Similarity of the book titles (0 to 1)')
+        parser.add_argument('--max-block', type=int, default=dedup.MAX_BLOCK,
+                            help='Blocks with more rows are not compared pairwise')
+        parser.add_argument('--show', type=int, default=20, help='Groups listed per model')
+        parser.add_argument('--merge', action='store_true', help='Merge every group found')
+
+    def handle(self, *args, **options):
+        authors = dedup.find_duplicate_authors(options['threshold'], options['max_block'])
+        self.report('authors', authors, lambda pks: Author.objects.in_bulk(pks), options['show'])
+        merged_authors = 0
+        if options['merge']:
+            for group in authors.groups:
+                dedup.merge_authors(group)
+            merged_authors = len(authors.groups)
+            #the books of the merged authors are compared under one author
+            authors = None
+
+        books = dedup.find_duplicate_books(options['title_threshold'], options['max_block'], authors)
+        self.report('books', books, lambda pks: Book.objects.select_related('author').in_bulk(pks),
+                    options['show'])
+        if options['merge']:
+            for group in books.groups:
+                dedup.merge_books(group)
+            self.stdout.write(self.style.SUCCESS(
+                    f'Merged {merged_authors} groups of authors and {len(books.groups)} groups of books.'))
+
+    def report(self, name, result, load, show):
+        rate = result.rows / result.seconds if result.seconds else 0
+        self.stdout.write(f'{name}: {result.rows} rows in {result.blocks} blocks, {result.comparisons} '
+                          f'pairs scored in {result.seconds:.2f} s ({rate:.0f} rows/s), '
+                          f'{len(result.groups)} groups of duplicates')
+        for group in result.groups[:show]:
+            rows = load(group)
+            self.stdout.write('  ' + ' | '.join(f'{pk}: {rows[pk]}' for pk in group if pk in rows))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from books import covers
+
+
+class Command(BaseCommand):
+    help = ('Makes the missing cover thumbnails over the whole catalog in parallel, '
+            'or attaches the covers of a directory of images named after the books\' pks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-dir', help='Images named <book pk>.<ext>, for the books without a cover')
+        parser.add_argument('--all', action='store_true', help='Make the thumbnails of every cover again')
+        parser.add_argument('--workers', type=int, help='Processes, default: BOOKS_COVER_WORKERS or one per CPU')
+
+    def handle(self, *args, **options):
+        if options['from_dir']:
+            tasks = covers.from_directory(options['from_dir'])
+        else:
+            tasks = covers.pending(options['all'])
+        done, errors = covers.backfill(tasks, options['workers'], progress=self.progress)
+        for pk, error in errors:
+            self.stderr.write(f'Book {pk}: {error}')
+        self.stdout.write(self.style.SUCCESS(f'{done - len(errors)} covers ready, {len(errors)} failed.'))
+
+    def progress(self, done, errors):
+        self.stdout.write(f'{done} covers, {len(errors)} failed')
@@ -0,0 +1,49 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import covers
+from books.importer import CatalogImporter, CatalogImportError, Checkpoint, read_records
+
+
+class Command(BaseCommand):
+    help = ('Imports books from a CSV or JSON lines file, streaming it in chunks. '
+            'An interrupted import resumes from its checkpoint when run again.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Default: from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Records written per transaction')
+        parser.add_argument('--checkpoint',
+                            help='Checkpoint file, default: <path>.checkpoint')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and import the whole file')
+
+    def handle(self, *args, **options):
+        checkpoint = Checkpoint(options['checkpoint'] or f'{options["path"]}.checkpoint')
+        if options['restart']:
+            checkpoint.clear()
+        elif checkpoint.load():
+            self.stdout.write(f'Resuming after record {checkpoint.load()}.')
+
+        #the covers are relative to the file
+        importer = CatalogImporter(chunk_size=options['chunk_size'], checkpoint=checkpoint,
+                                   progress=self.progress, cover_root=os.path.dirname(os.path.abspath(options['path'])))
+        try:
+            importer.run(read_records(options['path'], options['format']))
+        except (OSError, ValueError, CatalogImportError) as e:
+            raise CommandError(f'Import stopped: {e}. Run the command again to resume.')
+        finally:
+            #the thumbnails of the chunks written so far
+            covers.wait()
+
+        for number, error in importer.errors:
+            self.stderr.write(f'Record {number} skipped: {error}')
+        self.stdout.write(self.style.SUCCESS(
+                f'Imported {importer.imported} books, {len(importer.errors)} records skipped.'))
+
+    def progress(self, imported, elapsed):
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(f'{imported} books, {rate:.0f} rows/s')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from books import facets
+
+
+class Command(BaseCommand):
+    help = 'Recounts the facet counts of the browse page from the books'
+
+    def handle(self, *args, **options):
+        rows = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Facet counts rebuilt, {rows} rows.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from books import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full text search index of books and authors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows read and indexed at a time')
+
+    def handle(self, *args, **options):
+        books, authors = search.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {books} books and {authors} authors.'))
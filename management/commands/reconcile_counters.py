@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from books import counters
+
+
+class Command(BaseCommand):
+    help = 'Recounts the cached index page totals from the database (run it periodically, e.g. from cron)'
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile()
+        for name, (cached, actual) in sorted(drift.items()):
+            self.stdout.write(f'{name}: {cached} -> {actual}')
+        self.stdout.write(self.style.SUCCESS(f'Counters reconciled, {len(drift)} corrected.'))
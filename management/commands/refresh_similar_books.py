@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from books import similar
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the "you might also like" lists of the books changed since the last run, '
+            'or of every book with --full')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every list')
+        parser.add_argument('--top', type=int, default=similar.TOP_K, help='Books kept per list')
+
+    def handle(self, *args, **options):
+        if not similar.available():
+            raise CommandError('NumPy and SciPy are needed to compute the similar books.')
+        result = (similar.build if options['full'] else similar.refresh)(options['top'])
+        self.stdout.write(self.style.SUCCESS(
+                f"{result['books']} books, {result['changed']} changed, {result['rewritten']} lists "
+                f"written in {result['seconds']:.1f} s."))
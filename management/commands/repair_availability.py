@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = "Recomputes every book's current status, wisher and due date from its Status rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Books updated per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        books = Book.objects.order_by('pk')
+        repaired = 0
+        last = 0
+        while True:
+            #one UPDATE per range of pks, so no transaction holds the whole table
+            chunk = books.filter(pk__gt=last)
+            upper = chunk.values_list('pk', flat=True)[chunk_size - 1:chunk_size].first()
+            if upper is not None:
+                chunk = chunk.filter(pk__lte=upper)
+            with transaction.atomic():
+                repaired += chunk.refresh_availability()
+            if upper is None:
+                break
+            last = upper
+        self.stdout.write(self.style.SUCCESS(f'Availability rebuilt for {repaired} books.'))
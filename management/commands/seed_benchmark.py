@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from books import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Adds a synthetic catalog for benchmarks: users, authors, genres, books and their '
+            'copies, written with bulk inserts. Use an empty database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=1000)
+        parser.add_argument('--authors', type=int, help='Default: one per 10 books')
+        parser.add_argument('--genres', type=int, default=30)
+        parser.add_argument('--users', type=int, help='Default: one per 20 books')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the usernames')
+
+    def handle(self, *args, **options):
+        created = benchmark.seed(
+                options['books'], authors=options['authors'], genres=options['genres'],
+                users=options['users'], chunk_size=options['chunk_size'], seed=options['seed'],
+                prefix=options['prefix'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+                'Created ' + ', '.join(f'{count} {name}' for name, count in created.items()) + '.'))
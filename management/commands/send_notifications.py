@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from books.notifications import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Mails the queued notifications, one digest per recipient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Notifications sent over one connection')
+
+    def handle(self, *args, **options):
+        sent = send_pending(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} notifications.'))
@@ -0,0 +1,19 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from books.sweeper import sweep_expired_wishes
+
+
+class Command(BaseCommand):
+    help = 'Moves the wished books whose due date has passed back to available'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Statuses released per UPDATE')
+        parser.add_argument('--today', type=datetime.date.fromisoformat,
+                            help='Sweep as if today were this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        released = sweep_expired_wishes(today=options['today'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired wishes.'))
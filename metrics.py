@@ -0,0 +1,192 @@
+"""Request metrics per url name, exposed for Prometheus.
+
+MetricsMiddleware times every request and, through a database execute
+wrapper (DEBUG is not needed), counts its queries, their time and the
+duplicated ones: the same SQL run again with other parameters, the
+signature of an N+1. The numbers go into in-process histograms labelled with
+the resolved url name (books:books, books:book_detail, ...), which the
+metrics view serves in the Prometheus text format. Every process keeps its
+own: let Prometheus scrape each worker, or sum them.
+
+Requests slower than BOOKS_SLOW_REQUEST_MS are logged with their slowest and
+duplicated SQL, for a BOOKS_SLOW_REQUEST_SAMPLE share of them (all by
+default). The queries of a streaming response run after the middleware
+returns and are not counted."""
+
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import fragments
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+#queries listed in a slow request log line, of each kind
+SLOW_LOG_QUERIES = 10
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """The metrics of this process, by url name"""
+
+    HISTOGRAMS = (
+        ('books_request_duration_seconds', 'Request latency', LATENCY_BUCKETS),
+        ('books_db_queries', 'Database queries per request', QUERY_BUCKETS),
+        ('books_db_duration_seconds', 'Database time per request', LATENCY_BUCKETS),
+    )
+    COUNTERS = (
+        ('books_requests_total', 'Requests, by response status'),
+        ('books_db_duplicate_queries_total', 'Queries repeating an earlier query of the same request'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {name: {} for name, help, buckets in self.HISTOGRAMS}
+            self.counters = {name: Counter() for name, help in self.COUNTERS}
+
+    def record(self, view, status, duration, queries, db_duration, duplicates):
+        with self.lock:
+            for (name, help, buckets), value in zip(self.HISTOGRAMS, (duration, queries, db_duration)):
+                histograms = self.histograms[name]
+                if view not in histograms:
+                    histograms[view] = Histogram(buckets)
+                histograms[view].observe(value)
+            self.counters['books_requests_total'][view, str(status)] += 1
+            self.counters['books_db_duplicate_queries_total'][(view,)] += duplicates
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, help, buckets in self.HISTOGRAMS:
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} histogram']
+                for view, histogram in sorted(self.histograms[name].items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{_escape(view)}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{view="{_escape(view)}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{view="{_escape(view)}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{_escape(view)}"}} {histogram.count}')
+            for name, help in self.COUNTERS:
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} counter']
+                labels = ('view', 'status')
+                for key, value in sorted(self.counters[name].items()):
+                    pairs = ','.join(f'{label}="{_escape(part)}"' for label, part in zip(labels, key))
+                    lines.append(f'{name}{{{pairs}}} {value}')
+        name = 'books_fragment_cache_total'
+        lines += [f'# HELP {name} Page fragments served, by result (hit, miss, uncached)', f'# TYPE {name} counter']
+        for (fragment, result), value in sorted(fragments.stats().items()):
+            lines.append(f'{name}{{fragment="{_escape(fragment)}",result="{result}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry = Registry()
+
+
+class QueryLog:
+    """Database execute wrapper keeping the SQL and the time of every query"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def duration(self):
+        return sum(duration for sql, duration in self.queries)
+
+    def duplicates(self):
+        """{sql: times run} of the queries run more than once"""
+        return {sql: count for sql, count in Counter(sql for sql, duration in self.queries).items()
+                if count > 1}
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = QueryLog()
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else '<unresolved>'
+        duplicates = log.duplicates()
+        registry.record(view, response.status_code, duration, len(log.queries), log.duration,
+                        sum(duplicates.values()) - len(duplicates))
+
+        slow_ms = getattr(settings, 'BOOKS_SLOW_REQUEST_MS', None)
+        if (slow_ms is not None and duration * 1000 >= slow_ms
+                and random.random() < getattr(settings, 'BOOKS_SLOW_REQUEST_SAMPLE', 1)):
+            self.log_slow_request(request, view, duration, log, duplicates)
+        return response
+
+    def log_slow_request(self, request, view, duration, log, duplicates):
+        lines = [f'Slow request {request.method} {request.path} ({view}): {duration * 1000:.0f} ms, '
+                 f'{len(log.queries)} queries in {log.duration * 1000:.0f} ms']
+        slowest = sorted(log.queries, key=lambda query: query[1], reverse=True)[:SLOW_LOG_QUERIES]
+        lines += [f'  {duration * 1000:8.2f} ms  {sql}' for sql, duration in slowest]
+        if duplicates:
+            lines.append('  duplicated:')
+            repeated = sorted(duplicates.items(), key=lambda item: item[1], reverse=True)[:SLOW_LOG_QUERIES]
+            lines += [f'  {count:6d} x  {sql}' for sql, count in repeated]
+        logger.warning('\n'.join(lines))
+
+
+def metrics(request):
+    """The metrics of this process, for staff users and the BOOKS_METRICS_IPS (none by default)"""
+    #behind a proxy on the same host every request comes from localhost: no address is trusted unless listed
+    allowed = getattr(settings, 'BOOKS_METRICS_IPS', ())
+    user = getattr(request, 'user', None)
+    if request.META.get('REMOTE_ADDR') not in allowed and not (user and user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,74 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Author',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'ordering': ['first_name', 'last_name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Book',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('summary', models.TextField(blank=True, max_length=1000)),
+                ('pub_house', models.CharField(max_length=200)),
+                ('pub_date', models.CharField(blank=True, max_length=200)),
+                ('category', models.CharField(blank=True, choices=[('r', 'roman'), ('pv', 'povestiri'), ('e', 'eseuri'), ('pz', 'poezie'), ('nf', 'non-fiction'), ('t', 'teatru')], max_length=2)),
+                ('author', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='books.Author')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genre',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Status',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_back', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('av', 'Cu chef de ducă'), ('wished', 'Dorită'), ('gone', 'Pooof! Nu mai e!')], default='av', max_length=10)),
+                ('book', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='books.Book')),
+                ('wisher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'statuses',
+                'permissions': (('can_mark_wished', 'Set book as wished'),),
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='genre',
+            field=models.ManyToManyField(to='books.Genre'),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
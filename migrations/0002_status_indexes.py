@@ -0,0 +1,41 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class AddPartialIndex(migrations.AddIndex):
+    """AddIndex that is a no-op on backends without partial indexes (MySQL, Oracle)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.features.supports_partial_indexes:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.features.supports_partial_indexes:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='status',
+            index=models.Index(fields=['status', 'due_back'], name='books_status_due_back_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='status',
+            index=models.Index(fields=['wisher', 'status', 'due_back'], name='books_wisher_status_due_idx'),
+        ),
+        AddPartialIndex(
+            model_name='status',
+            index=models.Index(condition=models.Q(status='wished'), fields=['due_back'], name='books_wished_due_back_idx'),
+        ),
+        AddPartialIndex(
+            model_name='status',
+            index=models.Index(condition=models.Q(status='wished'), fields=['wisher', 'due_back'], name='books_wisher_wished_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+#diacritics are folded by the tokenizer: 'stiinta' matches 'Știință'
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2'"
+
+
+def create_search_tables(apps, schema_editor):
+    """The FTS5 index of books.search.SQLiteFTS5Backend, filled from the existing catalog"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+            f'CREATE VIRTUAL TABLE books_search_book USING fts5(title, summary, pub_house, author, {TOKENIZE})')
+    schema_editor.execute(
+            f'CREATE VIRTUAL TABLE books_search_author USING fts5(name, {TOKENIZE})')
+    schema_editor.execute(
+            "INSERT INTO books_search_book (rowid, title, summary, pub_house, author) "
+            "SELECT b.id, b.title, b.summary, b.pub_house, COALESCE(a.first_name || ' ' || a.last_name, '') "
+            "FROM books_book b LEFT JOIN books_author a ON a.id = b.author_id")
+    schema_editor.execute(
+            "INSERT INTO books_search_author (rowid, name) "
+            "SELECT id, first_name || ' ' || last_name FROM books_author")
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE books_search_book')
+    schema_editor.execute('DROP TABLE books_search_author')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_status_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
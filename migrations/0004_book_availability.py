@@ -0,0 +1,54 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+
+
+def fill_availability(apps, schema_editor):
+    """Same UPDATE as BookQuerySet.refresh_availability, frozen here"""
+    Book = apps.get_model('books', 'Book')
+    Status = apps.get_model('books', 'Status')
+    copies = (Status.objects.filter(book=models.OuterRef('pk'))
+              .annotate(rank=models.Case(
+                      models.When(status='av', then=models.Value(0)),
+                      models.When(status='wished', then=models.Value(1)),
+                      default=models.Value(2),
+                      output_field=models.IntegerField()))
+              .order_by('rank', 'due_back', 'pk'))
+    Book.objects.update(
+            current_status=Coalesce(models.Subquery(copies.values('status')[:1]), models.Value('')),
+            current_wisher=models.Subquery(copies.values('wisher')[:1]),
+            current_due_back=models.Subquery(copies.values('due_back')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('books', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='current_due_back',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='current_status',
+            field=models.CharField(blank=True, choices=[('av', 'Cu chef de ducă'), ('wished', 'Dorită'), ('gone', 'Pooof! Nu mai e!')], editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='current_wisher',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['current_status', 'id'], name='books_book_current_status_idx'),
+        ),
+        migrations.RunPython(fill_availability, migrations.RunPython.noop),
+    ]
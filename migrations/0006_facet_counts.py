@@ -0,0 +1,45 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_facets(apps, schema_editor):
+    """Same counts as books.facets.rebuild, frozen here"""
+    Book = apps.get_model('books', 'Book')
+    FacetCount = apps.get_model('books', 'FacetCount')
+    books = (Book.objects.order_by().values_list('category', 'owner_id', 'current_status')
+             .annotate(count=Count('id')))
+    genres = (Book.genre.through.objects.order_by()
+              .values_list('genre_id', 'book__category', 'book__owner_id', 'book__current_status')
+              .annotate(count=Count('id')))
+    rows = [FacetCount(genre=0, category=category, owner=owner or 0, status=status, count=count)
+            for category, owner, status, count in books]
+    rows += [FacetCount(genre=genre, category=category, owner=owner or 0, status=status, count=count)
+             for genre, category, owner, status, count in genres]
+    FacetCount.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genre', models.IntegerField()),
+                ('category', models.CharField(blank=True, max_length=2)),
+                ('owner', models.IntegerField()),
+                ('status', models.CharField(blank=True, max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('genre', 'category', 'owner', 'status')},
+            },
+        ),
+        migrations.RunPython(count_facets, migrations.RunPython.noop),
+    ]
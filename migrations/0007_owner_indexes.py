@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_facet_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'id'], name='books_book_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'current_status', 'current_due_back'], name='books_book_owner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['owner', 'updated_at'], name='books_book_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facetcount',
+            index=models.Index(fields=['owner', 'genre'], name='books_facet_owner_genre_idx'),
+        ),
+    ]
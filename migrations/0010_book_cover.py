@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:31
+
+import books.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_similar_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover',
+            field=models.ImageField(blank=True, max_length=200, upload_to=books.models.cover_upload_to),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_key',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+    ]
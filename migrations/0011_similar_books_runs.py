@@ -0,0 +1,24 @@
+# Generated by Django 2.2.28 on 2026-10-18 14:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_book_cover'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarBooksRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('full', models.BooleanField()),
+                ('books', models.PositiveIntegerField()),
+                ('changed', models.PositiveIntegerField()),
+                ('rewritten', models.PositiveIntegerField()),
+            ],
+        ),
+    ]
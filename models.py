@@ -1,12 +1,17 @@
 from django.db import models
 from django.urls import reverse #to generate URLS by reverse URL patterns
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 # Create your models here.
 
 class Genre(models.Model):
     """Model representing a book genre (e.g. Science Fiction, Non Fiction"""
     name = models.CharField(max_length=200)
+    #every model carries its modification time, for the conditional GETs of books.versions
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
     class Meta:
         ordering = ['name']
         
@@ -15,6 +20,43 @@ class Genre(models.Model):
         return self.name
     
     
+GIVEAWAY_STATUS = (
+        ('av','Cu chef de ducă'), 
+        ('wished', 'Dorită'), 
+        ('gone','Pooof! Nu mai e!'))
+
+
+class BookQuerySet(models.QuerySet):
+    
+    def available(self):
+        return self.filter(current_status__exact='av')
+    
+    def refresh_availability(self):
+        """Recomputes the current_* fields of these books from their Status rows, in one UPDATE"""
+        #the most available copy: any available one, else the wish that ends first
+        copies = (Status.objects.filter(book=models.OuterRef('pk'))
+                  .annotate(rank=models.Case(
+                          models.When(status='av', then=models.Value(0)),
+                          models.When(status='wished', then=models.Value(1)),
+                          default=models.Value(2),
+                          output_field=models.IntegerField()))
+                  .order_by('rank', 'due_back', 'pk'))
+        #current_status is a facet: books.facets moves the counts of the books that changed
+        from . import facets
+        with facets.track(self):
+            return self.update(
+                    current_status=Coalesce(models.Subquery(copies.values('status')[:1]), models.Value('')),
+                    current_wisher=models.Subquery(copies.values('wisher')[:1]),
+                    current_due_back=models.Subquery(copies.values('due_back')[:1]),
+                    #the book page lists the statuses: it changed with them
+                    updated_at=timezone.now())
+
+
+def cover_upload_to(book, filename):
+    from . import covers
+    return covers.original_name(book.cover, filename)
+
+
 class Book(models.Model):
     """Model representing a book"""
     title = models.CharField(max_length=200)
@@ -35,6 +77,32 @@ class Book(models.Model):
     
     category = models.CharField(max_length=2, choices=CATEGORY, blank=True)
     
+    #copied from the Status rows by BookQuerySet.refresh_availability whenever
+    #they change, so the list can filter on availability without a join
+    current_status = models.CharField(max_length=10, choices=GIVEAWAY_STATUS, blank=True, editable=False)
+    current_wisher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                       editable=False, related_name='+')
+    current_due_back = models.DateField(null=True, blank=True, editable=False)
+    #stored under the hash of its content; the pages show the thumbnails made by
+    #books.covers, once cover_key says they are ready
+    cover = models.ImageField(upload_to=cover_upload_to, max_length=200, blank=True)
+    cover_key = models.CharField(max_length=32, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = BookQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            #the available books in pk order
+            models.Index(fields=['current_status', 'id'], name='books_book_current_status_idx'),
+            #one owner's shelf, kept apart from the others': the owner's books in
+            #pk order, the dashboard counts and the version of the shelf
+            models.Index(fields=['owner', 'id'], name='books_book_owner_idx'),
+            models.Index(fields=['owner', 'current_status', 'current_due_back'],
+                         name='books_book_owner_status_idx'),
+            models.Index(fields=['owner', 'updated_at'], name='books_book_owner_updated_idx'),
+        ]
+    
     
     def display_genre(self):
        """Creates a string for the genre. This is required to display genre in Admin"""
@@ -52,11 +120,28 @@ class Book(models.Model):
     
 from datetime import date
 
+class StatusQuerySet(models.QuerySet):
+    
+    def expired(self, today=None):
+        """Wishes whose due_back has passed"""
+        return self.filter(status__exact='wished', due_back__lt=today or date.today())
+    
+    def with_overdue(self, today=None):
+        """Annotates overdue, the database side version of Status.is_overdue"""
+        return self.annotate(overdue=models.Case(
+                models.When(due_back__lt=today or date.today(), then=models.Value(True)),
+                default=models.Value(False),
+                output_field=models.BooleanField()))
+
+
 class Status(models.Model):
     """Model representing the book status"""
     book = models.ForeignKey('Book', on_delete=models.SET_NULL, null=True)
     wisher = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     due_back = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    objects = StatusQuerySet.as_manager()
     
     @property
     def is_overdue(self):
@@ -64,24 +149,34 @@ class Status(models.Model):
             return True
         return False
     
-    GIVEAWAY_STATUS = (
-            ('av','Cu chef de ducă'), 
-            ('wished', 'Dorită'), 
-            ('gone','Pooof! Nu mai e!'))
+    GIVEAWAY_STATUS = GIVEAWAY_STATUS
 
     status = models.CharField(max_length=10, default='av', choices=GIVEAWAY_STATUS)
     
     class Meta:
         permissions = (("can_mark_wished", "Set book as wished"),)
         verbose_name_plural = "statuses"
+        indexes = [
+            #status='av' totals and status='wished' ORDER BY due_back
+            models.Index(fields=['status', 'due_back'], name='books_status_due_back_idx'),
+            #one user's wishes ORDER BY due_back
+            models.Index(fields=['wisher', 'status', 'due_back'], name='books_wisher_status_due_idx'),
+            #smaller versions of the two above over the wished rows only, on the
+            #backends with partial indexes (see migration 0002)
+            models.Index(fields=['due_back'], condition=models.Q(status='wished'),
+                         name='books_wished_due_back_idx'),
+            models.Index(fields=['wisher', 'due_back'], condition=models.Q(status='wished'),
+                         name='books_wisher_wished_idx'),
+        ]
         
     def __str__(self):
-        return f'{self.id} ({self.book.title})'
+        return f'{self.id} ({self.book.title if self.book_id else "-"})'
     
     
 class Author(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['first_name', 'last_name']
@@ -92,3 +187,86 @@ class Author(models.Model):
     def __str__(self):
         return f'{self.first_name}, {self.last_name}'
     
+    
+class FacetCount(models.Model):
+    """Number of books per combination of facet values, maintained by books.facets.
+
+    The rows with genre 0 count every book once; the others count the books
+    of one genre. owner is 0 for the books without an owner."""
+    genre = models.IntegerField()
+    category = models.CharField(max_length=2, blank=True)
+    owner = models.IntegerField()
+    status = models.CharField(max_length=10, blank=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('genre', 'category', 'owner', 'status')
+        indexes = [
+            #the top genres of an owner's dashboard
+            models.Index(fields=['owner', 'genre'], name='books_facet_owner_genre_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.genre}/{self.category}/{self.owner}/{self.status}: {self.count}'
+    
+    
+class OutboxMessage(models.Model):
+    """A notification waiting to be mailed by books.notifications.
+
+    Written in the same transaction as the change it reports; the wisher and
+    the owner of the book are told about it in their next digest."""
+    EVENTS = (
+        ('wished', 'Wished'),
+        ('renewed', 'Renewed'),
+        ('expired', 'Expired'),
+    )
+
+    event = models.CharField(max_length=10, choices=EVENTS)
+    status = models.ForeignKey(Status, on_delete=models.CASCADE, related_name='+')
+    wisher = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='+')
+    due_back = models.DateField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        indexes = [
+            #the pending messages, oldest first
+            models.Index(fields=['sent_at', 'id'], name='books_outbox_pending_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.event} {self.status_id} ({self.sent_at or "pending"})'
+    
+    
+class SimilarBook(models.Model):
+    """One of the books most like book, computed offline by books.similar.
+
+    Each book's list is rewritten whole, all its rows with the same computed_at."""
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='similar_books')
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        #also the index of the book page's lookup
+        unique_together = ('book', 'rank')
+    
+    def __str__(self):
+        return f'{self.book_id} -> {self.similar_id} ({self.score:.3f})'
+    
+    
+class SimilarBooksRun(models.Model):
+    """A run of books.similar.build() or refresh(), written with its lists.
+
+    The next refresh() starts from the books changed since the latest one
+    started, whether or not it rewrote any list."""
+    started_at = models.DateTimeField(db_index=True)
+    full = models.BooleanField()
+    books = models.PositiveIntegerField()
+    changed = models.PositiveIntegerField()
+    rewritten = models.PositiveIntegerField()
+    
+    def __str__(self):
+        return f'{self.started_at:%Y-%m-%d %H:%M}: {self.changed} changed, {self.rewritten} rewritten'
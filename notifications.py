@@ -0,0 +1,154 @@
+"""Email notifications through an outbox.
+
+A wish, a renewal or an expired wish only inserts an OutboxMessage row, in
+the transaction of the change itself, so no request waits for SMTP and no
+notification is lost to a rollback. send_pending() mails them later: it
+takes the pending rows in batches, folds each batch into one digest per
+recipient (the wisher and the owner of the book) and sends all the digests
+of a batch over a single connection of the configured email backend. A
+digest that fails leaves its messages pending for the next run, the others
+are marked sent. It is run by manage.py send_notifications, or every
+BOOKS_MAIL_INTERVAL seconds by an in-process Mailer thread started from
+BooksConfig.ready()."""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+
+logger = logging.getLogger(__name__)
+
+SUBJECT = 'Runaway books: {count} noutăți'
+
+LINES = {
+    ('wished', 'owner'): '{wisher} a dorit cartea „{title}”, până la {due_back}.',
+    ('wished', 'wisher'): 'Ai dorit cartea „{title}”, o poți ridica până la {due_back}.',
+    ('renewed', 'owner'): 'Dorința lui {wisher} pentru „{title}” a fost prelungită până la {due_back}.',
+    ('renewed', 'wisher'): 'Dorința ta pentru „{title}” a fost prelungită până la {due_back}.',
+    ('expired', 'owner'): 'Dorința lui {wisher} pentru „{title}” a expirat, cartea e din nou disponibilă.',
+    ('expired', 'wisher'): 'Dorința ta pentru „{title}” a expirat pe {due_back}.',
+}
+
+
+def _max_attempts():
+    return getattr(settings, 'BOOKS_MAIL_MAX_ATTEMPTS', 5)
+
+
+def enqueue(event, status_pk, wisher, due_back=None):
+    """Queues a notification about the status; one INSERT, nothing is sent"""
+    return OutboxMessage.objects.create(event=event, status_id=status_pk, wisher=wisher, due_back=due_back)
+
+
+def enqueue_expired(wishes):
+    """Queues the wishes released by books.sweeper, with one INSERT"""
+    OutboxMessage.objects.bulk_create([
+            OutboxMessage(event='expired', status_id=wish['status'], wisher_id=wish['wisher'],
+                          due_back=wish['due_back'])
+            for wish in wishes])
+
+
+def digests(messages):
+    """Folds the messages into {email: [(message pk, line), ...]}, one entry per recipient"""
+    lines = {}
+    for message in messages:
+        book = message.status.book
+        if book is None:
+            continue
+        values = {'title': book.title, 'due_back': message.due_back or '-',
+                  'wisher': message.wisher.get_username() if message.wisher else '-'}
+        for role, user in (('owner', book.owner), ('wisher', message.wisher)):
+            if user is not None and user.email:
+                lines.setdefault(user.email, []).append(
+                        (message.pk, LINES[message.event, role].format(**values)))
+    return lines
+
+
+def _email(recipient, lines, connection):
+    body = '\n'.join(lines)
+    return mail.EmailMessage(SUBJECT.format(count=len(lines)), body, to=[recipient], connection=connection)
+
+
+def _send(messages):
+    """Mails the digests of the messages over one connection, one at a time.
+    Returns the pks of the messages in a digest that failed."""
+    smtp = mail.get_connection()
+    try:
+        smtp.open()
+    except Exception:
+        logger.exception('Sending %d notifications failed', len(messages))
+        return {message.pk for message in messages}
+    failed = set()
+    try:
+        for recipient, lines in digests(messages).items():
+            try:
+                smtp.send_messages([_email(recipient, [line for pk, line in lines], smtp)])
+            except Exception:
+                logger.exception('Sending the digest to %s failed', recipient)
+                failed.update(pk for pk, line in lines)
+    finally:
+        smtp.close()
+    return failed
+
+
+def send_pending(batch_size=500):
+    """Mails the pending messages and returns how many were sent.
+
+    The messages of the digests sent are marked sent, the others count an
+    attempt and wait for the next run. A message goes to two recipients: if
+    one digest failed and not the other, the other gets it again."""
+    #another worker skips the batch this one is sending
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    #the outbox rows only, not the books and users joined
+    of = ('self',) if connection.features.has_select_for_update_of else ()
+    sent = last = 0
+    while True:
+        with transaction.atomic():
+            #past the batch before: its failed messages are still pending
+            batch = list(OutboxMessage.objects
+                         .filter(sent_at=None, attempts__lt=_max_attempts(), pk__gt=last)
+                         .select_for_update(skip_locked=skip_locked, of=of)
+                         .select_related('status__book__owner', 'wisher')
+                         .order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last = batch[-1].pk
+            failed = _send(batch)
+            delivered = [message.pk for message in batch if message.pk not in failed]
+            if delivered:
+                OutboxMessage.objects.filter(pk__in=delivered).update(sent_at=timezone.now())
+            if failed:
+                OutboxMessage.objects.filter(pk__in=failed).update(attempts=F('attempts') + 1)
+        sent += len(delivered)
+        if len(batch) < batch_size:
+            break
+    return sent
+
+
+class Mailer(threading.Thread):
+    """Daemon thread running send_pending every interval seconds"""
+
+    def __init__(self, interval):
+        super().__init__(name='books-mailer', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                sent = send_pending()
+                if sent:
+                    logger.info('Sent %d notifications', sent)
+            except Exception:
+                logger.exception('Sending notifications failed')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,251 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class KeysetPaginator:
+    """Paginator that pages on the queryset ordering instead of OFFSET.
+
+    A page is fetched with WHERE (ordering columns) > (last row seen), so deep
+    pages cost the same as the first one and no COUNT(*) is ever run. The
+    position is carried between requests in an opaque cursor token."""
+
+    def __init__(self, object_list, per_page):
+        self.per_page = int(per_page)
+        self.ordering = self._get_ordering(object_list)
+        self.object_list = object_list
+
+    def _get_ordering(self, queryset):
+        """Returns (field, descending) pairs, always ending with the primary key"""
+        opts = queryset.model._meta
+        names = list(queryset.query.order_by or opts.ordering)
+        ordering = []
+        for name in names:
+            if not isinstance(name, str) or '__' in name or name.lstrip('-') == '?':
+                raise ImproperlyConfigured(
+                        f'Keyset pagination needs plain field orderings, got {name!r}')
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            ordering.append((field, descending))
+        if not any(field.primary_key for field, descending in ordering):
+            ordering.append((opts.pk, False))
+        return ordering
+
+    def _order_by(self, reverse):
+        #NULLs sort first going up and last going down, so that reversing the
+        #ordering walks the same rows backwards. SQLite and MySQL already sort
+        #them that way; spelling it out there would stop them using an index.
+        vendor = connections[self.object_list.db].vendor
+        explicit_nulls = vendor not in ('sqlite', 'mysql')
+        expressions = []
+        for field, descending in self.ordering:
+            nulls = explicit_nulls and field.null
+            if descending != reverse:
+                expressions.append(F(field.name).desc(nulls_last=nulls))
+            else:
+                expressions.append(F(field.name).asc(nulls_first=nulls))
+        return expressions
+
+    def _after(self, values, reverse):
+        """Builds the filter for the rows that come after the given key"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending), value in zip(self.ordering, values):
+            if descending != reverse:
+                if value is None:
+                    after = Q(pk__in=[])
+                else:
+                    after = Q(**{f'{field.name}__lt': value})
+                    if field.null:
+                        after |= Q(**{f'{field.name}__isnull': True})
+            else:
+                if value is None:
+                    after = Q(**{f'{field.name}__isnull': False})
+                else:
+                    after = Q(**{f'{field.name}__gt': value})
+            condition |= equal & after
+            if value is None:
+                equal &= Q(**{f'{field.name}__isnull': True})
+            else:
+                equal &= Q(**{field.name: value})
+        return condition
+
+    def _key(self, obj):
+        #the rows of a .values() queryset are dicts keyed by attname
+        if isinstance(obj, dict):
+            return [obj[field.attname] for field, descending in self.ordering]
+        return [getattr(obj, field.attname) for field, descending in self.ordering]
+
+    def encode_cursor(self, obj, direction, number):
+        payload = json.dumps({'v': self._key(obj), 'd': direction, 'n': number},
+                             cls=_CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values = payload['v']
+            direction = payload['d']
+            number = int(payload['n'])
+            if direction not in ('next', 'prev') or len(values) != len(self.ordering):
+                raise ValueError(direction)
+            values = [field.to_python(value) if value is not None else None
+                      for (field, descending), value in zip(self.ordering, values)]
+        except (ValueError, TypeError, KeyError, ValidationError) as e:
+            raise InvalidPage('Cursor invalid') from e
+        return values, direction, number
+
+    def page(self, cursor=None):
+        """Returns the page that follows (or precedes) the position in the cursor"""
+        if not cursor:
+            values, direction, number = None, 'next', 1
+        else:
+            values, direction, number = self.decode_cursor(cursor)
+        reverse = direction == 'prev'
+
+        queryset = self.object_list.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = values is not None, more
+        return KeysetPage(rows, number, self, has_previous, has_next)
+
+
+class KeysetPage:
+    """A page of a KeysetPaginator, with next/previous cursors instead of page numbers"""
+
+    def __init__(self, object_list, number, paginator, has_previous, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_previous = has_previous and bool(object_list)
+        self._has_next = has_next and bool(object_list)
+
+    def __repr__(self):
+        return f'<Page {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next', self.number + 1)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'prev', self.number - 1)
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that switches paginate_queryset to keyset pagination.
+
+    Off by default: set keyset_pagination = True on the view, or
+    BOOKS_KEYSET_PAGINATION = True in the settings for every view using it."""
+    keyset_pagination = None
+    cursor_kwarg = 'cursor'
+
+    def get_keyset_pagination(self):
+        if self.keyset_pagination is None:
+            return getattr(settings, 'BOOKS_KEYSET_PAGINATION', False)
+        return self.keyset_pagination
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.get_keyset_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage as e:
+            raise Http404(f'Invalid cursor: {e}')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+
+class _CursorEncoder(json.JSONEncoder):
+    def default(self, o):
+        if hasattr(o, 'isoformat'):
+            return o.isoformat()
+        return str(o)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that reads the row count of an unfiltered table from the planner statistics.
+
+    An exact COUNT(*) on a big table scans it; the statistics are close enough
+    for a page count. Filtered querysets, backends without statistics and
+    tables under BOOKS_ESTIMATED_COUNT_THRESHOLD rows get the exact count."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'BOOKS_ESTIMATED_COUNT_THRESHOLD', 10000):
+                return estimate
+        return super().count
+
+
+ESTIMATE_SQL = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+    'mysql': 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+    #filled by ANALYZE: the first number of stat is the row count
+    'sqlite': "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+}
+
+
+def estimate_count(model, using='default'):
+    """Returns the planner's estimate of the number of rows of the model's table, or None"""
+    connection = connections[using]
+    sql = ESTIMATE_SQL.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        #no statistics yet (SQLite before the first ANALYZE)
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -0,0 +1,214 @@
+"""Full text search over books and authors.
+
+Books are indexed on title, summary, pub_house and their author's name, and
+authors on their name. The index itself lives in a backend:
+
+- SQLiteFTS5Backend keeps it in two FTS5 tables (created by migration 0003)
+  with a diacritic-folding tokenizer, so 'stiinta' finds 'Știință', and
+  ranks matches with bm25.
+- DatabaseBackend has no index of its own and falls back to icontains
+  lookups; it is what other databases get until they have a backend.
+
+BOOKS_SEARCH_BACKEND selects a backend class by dotted path. The index is
+kept in sync by the receivers in books.signals and can be rebuilt with
+manage.py rebuild_search_index."""
+
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Book, Author
+
+
+BOOK_FIELDS = ('title', 'summary', 'pub_house', 'author')
+AUTHOR_FIELDS = ('name',)
+
+
+def book_document(book):
+    author = book.author
+    return {
+        'title': book.title,
+        'summary': book.summary,
+        'pub_house': book.pub_house,
+        'author': f'{author.first_name} {author.last_name}' if author else '',
+    }
+
+
+def author_document(author):
+    return {'name': f'{author.first_name} {author.last_name}'}
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query)
+
+
+class SearchBackend:
+    """Interface of a search backend. Documents are {pk: {field: text}} dicts."""
+
+    def update_books(self, documents):
+        raise NotImplementedError
+
+    def update_authors(self, documents):
+        raise NotImplementedError
+
+    def delete_books(self, pks):
+        raise NotImplementedError
+
+    def delete_authors(self, pks):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search_books(self, query, limit):
+        """Returns the pks of the best matching books, best first"""
+        raise NotImplementedError
+
+    def search_authors(self, query, limit):
+        """Returns the pks of the best matching authors, best first"""
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    book_table = 'books_search_book'
+    author_table = 'books_search_author'
+    #bm25 weights, in the order of BOOK_FIELDS: a title hit counts most
+    book_weights = (10.0, 1.0, 2.0, 5.0)
+
+    def _update(self, table, fields, documents):
+        if not documents:
+            return
+        columns = ', '.join(fields)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [[pk] for pk in documents])
+            cursor.executemany(
+                    f'INSERT INTO {table} (rowid, {columns}) VALUES ({placeholders})',
+                    [[pk] + [document[field] for field in fields] for pk, document in documents.items()])
+
+    def _delete(self, table, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [[pk] for pk in pks])
+
+    def _match(self, query):
+        #every word must match, as a prefix; quoting keeps FTS5 syntax out of user input
+        return ' '.join('"%s"*' % token for token in tokenize(query))
+
+    def _search(self, table, weights, query, limit):
+        match = self._match(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                    f'SELECT rowid FROM {table} WHERE {table} MATCH %s '
+                    f'ORDER BY bm25({table}, {", ".join(map(str, weights))}) LIMIT %s',
+                    [match, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def update_books(self, documents):
+        self._update(self.book_table, BOOK_FIELDS, documents)
+
+    def update_authors(self, documents):
+        self._update(self.author_table, AUTHOR_FIELDS, documents)
+
+    def delete_books(self, pks):
+        self._delete(self.book_table, pks)
+
+    def delete_authors(self, pks):
+        self._delete(self.author_table, pks)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.book_table}')
+            cursor.execute(f'DELETE FROM {self.author_table}')
+
+    def search_books(self, query, limit):
+        return self._search(self.book_table, self.book_weights, query, limit)
+
+    def search_authors(self, query, limit):
+        return self._search(self.author_table, (1.0,), query, limit)
+
+
+class DatabaseBackend(SearchBackend):
+    """No index: every word has to be found (icontains) in one of the fields"""
+
+    def update_books(self, documents):
+        pass
+
+    def update_authors(self, documents):
+        pass
+
+    def delete_books(self, pks):
+        pass
+
+    def delete_authors(self, pks):
+        pass
+
+    def clear(self):
+        pass
+
+    def search_books(self, query, limit):
+        books = Book.objects.all()
+        for token in tokenize(query):
+            books = books.filter(
+                    Q(title__icontains=token) | Q(summary__icontains=token)
+                    | Q(pub_house__icontains=token) | Q(author__first_name__icontains=token)
+                    | Q(author__last_name__icontains=token))
+        return list(books.order_by('title').values_list('pk', flat=True)[:limit])
+
+    def search_authors(self, query, limit):
+        authors = Author.objects.all()
+        for token in tokenize(query):
+            authors = authors.filter(Q(first_name__icontains=token) | Q(last_name__icontains=token))
+        return list(authors.values_list('pk', flat=True)[:limit])
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = getattr(settings, 'BOOKS_SEARCH_BACKEND', None)
+    if path is None:
+        path = 'books.search.SQLiteFTS5Backend' if connection.vendor == 'sqlite' else 'books.search.DatabaseBackend'
+    return import_string(path)()
+
+
+def index_books(books):
+    get_backend().update_books({book.pk: book_document(book) for book in books})
+
+
+def index_authors(authors):
+    get_backend().update_authors({author.pk: author_document(author) for author in authors})
+
+
+def rebuild(chunk_size=1000):
+    """Reindexes the whole catalog, chunk_size rows at a time. Returns (books, authors)."""
+    backend = get_backend()
+    backend.clear()
+    counts = []
+    for queryset, index in ((Book.objects.select_related('author'), index_books),
+                            (Author.objects.all(), index_authors)):
+        count = 0
+        chunk = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                index(chunk)
+                count += len(chunk)
+                chunk = []
+        index(chunk)
+        counts.append(count + len(chunk))
+    return tuple(counts)
+
+
+def search(query, limit=50):
+    """Returns (books, authors) matching the query, best match first"""
+    backend = get_backend()
+    book_pks = backend.search_books(query, limit)
+    author_pks = backend.search_authors(query, limit)
+    books = Book.objects.select_related('author').in_bulk(book_pks)
+    authors = Author.objects.in_bulk(author_pks)
+    return ([books[pk] for pk in book_pks if pk in books],
+            [authors[pk] for pk in author_pks if pk in authors])
@@ -0,0 +1,239 @@
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from . import autocomplete, counters, covers, facets, search
+from .models import Book, Author, Genre, FacetCount, Status
+
+
+#Sent once per run of books.sweeper.sweep_expired_wishes, with the released
+#wishes as a list of {'status': pk, 'book': pk, 'wisher': pk, 'due_back': date}
+wishes_expired = Signal(providing_args=['wishes'])
+
+
+#Book and Author totals
+
+@receiver(post_save, sender=Book)
+def count_saved_book(sender, instance, created, **kwargs):
+    if created:
+        counters.incr('books')
+
+
+@receiver(post_delete, sender=Book)
+def count_deleted_book(sender, instance, **kwargs):
+    counters.incr('books', -1)
+
+
+@receiver(post_save, sender=Author)
+def count_saved_author(sender, instance, created, **kwargs):
+    if created:
+        counters.incr('authors')
+
+
+@receiver(post_delete, sender=Author)
+def count_deleted_author(sender, instance, **kwargs):
+    counters.incr('authors', -1)
+
+
+#Available statuses: remember the status and book as loaded, to know what a save changed
+
+@receiver(post_init, sender=Status)
+def remember_status(sender, instance, **kwargs):
+    #read __dict__ directly so a deferred status field is not fetched
+    instance._counted_status = instance.__dict__.get('status') if instance.pk else None
+    instance._loaded_book = instance.__dict__.get('book_id') if instance.pk else None
+
+
+@receiver(post_save, sender=Status)
+def count_saved_status(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    was_available = not created and instance._counted_status == 'av'
+    is_available = instance.status == 'av'
+    counters.incr('available', int(is_available) - int(was_available))
+    instance._counted_status = instance.status
+
+
+@receiver(post_delete, sender=Status)
+def count_deleted_status(sender, instance, **kwargs):
+    if instance.status == 'av':
+        counters.incr('available', -1)
+
+
+#Book availability: Book.current_* follow the Status rows
+
+AVAILABILITY_FIELDS = {'book', 'status', 'wisher', 'due_back'}
+
+
+@receiver(post_save, sender=Status)
+def refresh_saved_status_book(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not AVAILABILITY_FIELDS & set(update_fields)):
+        return
+    #a status moved to another book changes the old one too
+    books = {instance.book_id, instance._loaded_book} - {None}
+    if books:
+        Book.objects.filter(pk__in=books).refresh_availability()
+    instance._loaded_book = instance.book_id
+
+
+@receiver(post_delete, sender=Status)
+def refresh_deleted_status_book(sender, instance, **kwargs):
+    if instance.book_id:
+        Book.objects.filter(pk=instance.book_id).refresh_availability()
+
+
+#Genres of a book: post_clear has no pk_set, remember what is about to be cleared
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def remember_cleared_genres(sender, instance, action, reverse, **kwargs):
+    if action == 'pre_clear':
+        related = instance.book_set if reverse else instance.genre
+        instance._cleared_pks = set(related.values_list('pk', flat=True))
+
+
+#Modification times: a change of genres does not save the book
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def touch_books_of_changed_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        books = [instance.pk]
+    else:
+        books = instance._cleared_pks if action == 'post_clear' else pk_set
+    if books:
+        Book.objects.filter(pk__in=books).update(updated_at=timezone.now())
+
+
+@receiver(pre_delete, sender=Author)
+def touch_books_of_deleted_author(sender, instance, **kwargs):
+    #on_delete=SET_NULL clears their author with an UPDATE that leaves updated_at as it was
+    instance.book_set.update(updated_at=timezone.now())
+
+
+#Facet counts
+
+FACET_FIELDS = {'category', 'owner', 'current_status'}
+
+
+@receiver(post_init, sender=Book)
+def remember_facets(sender, instance, **kwargs):
+    #as loaded, to know what a save changed; unknown if a facet field is deferred
+    loaded = {'category', 'owner_id', 'current_status'} <= instance.__dict__.keys()
+    instance._facets = facets.book_facets(instance) if instance.pk and loaded else None
+
+
+@receiver(post_save, sender=Book)
+def count_saved_book_facets(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not FACET_FIELDS & set(update_fields)):
+        return
+    new = facets.book_facets(instance)
+    if created:
+        facets.count_books([(new, [])])
+    elif instance._facets is not None and instance._facets != new:
+        facets.count_changes({instance.pk: instance._facets}, {instance.pk: new})
+    instance._facets = new
+
+
+@receiver(pre_delete, sender=Book)
+def remember_deleted_book_genres(sender, instance, **kwargs):
+    #the genre rows go with the book, without an m2m_changed
+    instance._genre_pks = list(instance.genre.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def uncount_deleted_book_facets(sender, instance, **kwargs):
+    facets.count_books([(facets.book_facets(instance), instance._genre_pks)], -1)
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def count_changed_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    pks = instance._cleared_pks if action == 'post_clear' else pk_set
+    sign = 1 if action == 'post_add' else -1
+    if not pks:
+        return
+    if not reverse:
+        books = {instance.pk: instance._facets} if instance._facets else facets.snapshot(
+                Book.objects.filter(pk=instance.pk))
+        facets.count_genres(pks, books, sign)
+    else:
+        facets.count_genres([instance.pk], facets.snapshot(Book.objects.filter(pk__in=pks)), sign)
+
+
+@receiver(post_delete, sender=Genre)
+def drop_deleted_genre_facets(sender, instance, **kwargs):
+    FacetCount.objects.filter(genre=instance.pk).delete()
+
+
+#Search index
+
+@receiver(post_save, sender=Book)
+def index_saved_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_books([instance])
+
+
+@receiver(post_delete, sender=Book)
+def unindex_deleted_book(sender, instance, **kwargs):
+    search.get_backend().delete_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def index_saved_author(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_authors([instance])
+        #the books carry the author's name too
+        search.index_books(instance.book_set.select_related('author'))
+
+
+@receiver(pre_delete, sender=Author)
+def remember_author_books(sender, instance, **kwargs):
+    instance._book_pks = list(instance.book_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def unindex_deleted_author(sender, instance, **kwargs):
+    search.get_backend().delete_authors([instance.pk])
+    #the books were left without an author (on_delete=SET_NULL)
+    search.index_books(Book.objects.filter(pk__in=instance._book_pks).select_related('author'))
+
+
+#Autocomplete index of this process
+
+@receiver(post_save, sender=Book)
+def suggest_saved_book(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.books.saved(instance)
+
+
+@receiver(post_delete, sender=Book)
+def unsuggest_deleted_book(sender, instance, **kwargs):
+    autocomplete.books.deleted(instance)
+
+
+@receiver(post_save, sender=Author)
+def suggest_saved_author(sender, instance, raw=False, **kwargs):
+    if not raw:
+        autocomplete.authors.saved(instance)
+
+
+@receiver(post_delete, sender=Author)
+def unsuggest_deleted_author(sender, instance, **kwargs):
+    autocomplete.authors.deleted(instance)
+
+
+#Cover thumbnails: a new cover is not shown until they are made
+
+@receiver(pre_save, sender=Book)
+def forget_replaced_cover(sender, instance, **kwargs):
+    #an upload is named by its content during the save: any other name is a new cover
+    if covers.key_of(instance.cover.name) != instance.cover_key:
+        instance.cover_key = ''
+
+
+@receiver(post_save, sender=Book)
+def make_cover_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and instance.cover and not instance.cover_key:
+        covers.schedule([(instance.pk, instance.cover.name)])
@@ -0,0 +1,283 @@
+"""'You might also like': the books most like each book, computed offline.
+
+Every book is a row of features, the blocks scaled so that the dot product
+of two rows is the weighted sum (WEIGHTS) of
+
+- the cosine of their genres,
+- having the same category,
+- having the same author,
+- the cosine of their wishers: the users who wished one of them also
+  wished the other, now (a Status row with a wisher) or in the past (a
+  'wished' OutboxMessage: the Status row forgets its wisher once the wish
+  ends, the outbox keeps it).
+
+Genres and categories are a few dense columns, multiplied with BLAS; authors
+and wishers are sparse and multiplied with scipy. The scores of a chunk of
+books against the whole catalog are two matrix products, and the TOP_K best
+of each row are stored in SimilarBook: the book page reads them with one
+indexed query.
+
+build() computes every list. refresh() starts from the books changed since
+the last run started, as recorded in SimilarBooksRun (Book.updated_at moves
+with their genres, author and copies), computes their lists and merges
+their new scores into the lists of the other books. The score of two
+unchanged books stays the same, so the lists come out as a build makes
+them, but for the ones left short by a deleted book: they fill up again at
+the next build.
+
+NumPy and SciPy are needed to compute the lists (manage.py
+refresh_similar_books), not to show them."""
+
+import itertools
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Book, Status, OutboxMessage, SimilarBook, SimilarBooksRun
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+TOP_K = 8
+WEIGHTS = {'genre': 0.4, 'category': 0.1, 'author': 0.25, 'wishes': 0.25}
+#scores held at a time, books x catalog: 32 MiB of float32
+CHUNK_CELLS = 1 << 23
+#past this share of the catalog changed, refresh() builds everything instead
+REFRESH_LIMIT = 0.25
+
+
+def available():
+    return np is not None
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+class Features:
+    """The feature rows of every book, in pk order"""
+
+    def __init__(self):
+        books = list(Book.objects.order_by('pk').values_list('pk', 'category', 'author').iterator(chunk_size=10000))
+        self.pks = np.array([pk for pk, category, author in books], dtype=np.int64)
+        n = len(self.pks)
+
+        #genres and categories: dense, a column each
+        genre_links = np.array(list(Book.genre.through.objects.values_list('book_id', 'genre_id')),
+                               dtype=np.int64).reshape(-1, 2)
+        genre_rows, genre_links = self._rows(genre_links)
+        genres, genre_cols = np.unique(genre_links[:, 1], return_inverse=True)
+        categories = sorted({category for pk, category, author in books if category})
+        self.dense = np.zeros((n, len(genres) + len(categories)), dtype=np.float32)
+        per_book = np.bincount(genre_rows, minlength=n)
+        self.dense[genre_rows, genre_cols] = np.sqrt(WEIGHTS['genre'] / per_book[genre_rows])
+        category_cols = {category: len(genres) + i for i, category in enumerate(categories)}
+        for row, (pk, category, author) in enumerate(books):
+            if category:
+                self.dense[row, category_cols[category]] = np.sqrt(WEIGHTS['category'])
+
+        #authors and wishers: sparse
+        author_rows = np.array([row for row, book in enumerate(books) if book[2] is not None], dtype=np.int64)
+        authors, author_cols = np.unique(np.array([book[2] for book in books if book[2] is not None],
+                                                  dtype=np.int64), return_inverse=True)
+        by_author = sparse.csr_matrix(
+                (np.full(len(author_rows), np.sqrt(WEIGHTS['author']), dtype=np.float32),
+                 (author_rows, author_cols)), shape=(n, len(authors)))
+        wishes = np.array(list(itertools.chain(
+                Status.objects.exclude(wisher=None).exclude(book=None).values_list('book_id', 'wisher_id'),
+                OutboxMessage.objects.filter(event='wished').exclude(wisher=None).exclude(status__book=None)
+                .values_list('status__book_id', 'wisher_id'))), dtype=np.int64).reshape(-1, 2)
+        #the open wishes are in the outbox too, and a user may wish a book again: once per user
+        wishes = np.unique(wishes, axis=0)
+        wish_rows, wishes = self._rows(wishes)
+        wishers, wisher_cols = np.unique(wishes[:, 1], return_inverse=True)
+        by_wisher = sparse.csr_matrix((np.ones(len(wish_rows), dtype=np.float32), (wish_rows, wisher_cols)),
+                                      shape=(n, len(wishers)))
+        norms = np.sqrt(np.asarray(by_wisher.multiply(by_wisher).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        by_wisher = sparse.diags(np.sqrt(WEIGHTS['wishes']) / norms).dot(by_wisher)
+        self.sparse = sparse.hstack([by_author, by_wisher], format='csr', dtype=np.float32)
+        self.sparse_t = self.sparse.T.tocsr()
+
+    def _known(self, pks):
+        """The rows of pks, an array, and which of them are known"""
+        rows = np.searchsorted(self.pks, pks)
+        known = rows < len(self.pks)
+        known[known] = self.pks[rows[known]] == pks[known]
+        return rows, known
+
+    def _rows(self, links):
+        """The rows of the books of (book pk, x) links, and the links of the books known"""
+        rows, known = self._known(links[:, 0])
+        return rows[known], links[known]
+
+    def rows(self, pks):
+        """The rows of the known books among pks, in pk order"""
+        rows, known = self._known(np.array(sorted(pks), dtype=np.int64))
+        return rows[known]
+
+    def __len__(self):
+        return len(self.pks)
+
+    def chunk_size(self):
+        return max(1, CHUNK_CELLS // max(1, len(self)))
+
+    def scores(self, rows):
+        """The scores of the books at rows against every book, len(rows) x len(self), themselves at -1"""
+        scores = self.dense[rows] @ self.dense.T
+        products = (self.sparse[rows] @ self.sparse_t).tocoo()
+        scores[products.row, products.col] += products.data
+        scores[np.arange(len(rows)), rows] = -1
+        return scores
+
+
+def _top(pks, scores, k):
+    """The pks and scores of the k best of each row of scores, best first"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((len(scores), 0), dtype=np.int64), np.empty((len(scores), 0), dtype=np.float32)
+    if k < scores.shape[1]:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        best = np.broadcast_to(np.arange(k), scores.shape).copy()
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    best_pks = pks[best]
+    order = np.lexsort((best_pks, -best_scores), axis=1)
+    return np.take_along_axis(best_pks, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def _compute(features, rows, k):
+    """{row: (pks, scores)} of the books at rows"""
+    lists = {}
+    for chunk in _chunks(rows, features.chunk_size()):
+        pks, scores = _top(features.pks, features.scores(chunk), k)
+        lists.update(zip(chunk.tolist(), zip(pks, scores)))
+    return lists
+
+
+def _write(features, lists, computed_at, replace):
+    """Stores the lists, {row: (pks, scores)}, the scores above 0 only. replace: delete the old ones first"""
+    book_pks = [int(features.pks[row]) for row in lists]
+    with transaction.atomic():
+        if replace:
+            for pks in _chunks(book_pks, 500):
+                SimilarBook.objects.filter(book__in=pks).delete()
+        rows = (SimilarBook(book_id=book, similar_id=int(pk), rank=rank, score=float(score), computed_at=computed_at)
+                for book, (pks, scores) in zip(book_pks, lists.values())
+                for rank, (pk, score) in enumerate(zip(pks, scores)) if score > 0)
+        #bulk_create makes a list of what it is given: a batch at a time
+        while True:
+            batch = list(itertools.islice(rows, 5000))
+            if not batch:
+                break
+            SimilarBook.objects.bulk_create(batch)
+
+
+def _record(started_at, full, result, start):
+    """Saves the run, in the transaction of its lists. Returns the result with the seconds it took"""
+    SimilarBooksRun.objects.create(started_at=started_at, full=full, **result)
+    return dict(result, seconds=time.perf_counter() - start)
+
+
+def build(k=TOP_K):
+    """Computes the list of every book. Returns {'books', 'changed', 'rewritten', 'seconds'}"""
+    start = time.perf_counter()
+    computed_at = timezone.now()
+    features = Features()
+    lists = _compute(features, np.arange(len(features)), k)
+    with transaction.atomic():
+        SimilarBook.objects.all().delete()
+        _write(features, lists, computed_at, replace=False)
+        return _record(computed_at, True, {'books': len(features), 'changed': len(features),
+                                           'rewritten': len(lists)}, start)
+
+
+def _stored(features, k):
+    """The stored lists as two len(features) x k arrays, pks (0: none) and scores (-inf: none)"""
+    pks = np.zeros((len(features), k), dtype=np.int64)
+    scores = np.full((len(features), k), -np.inf, dtype=np.float32)
+    rows = np.array(list(SimilarBook.objects.order_by('book', 'rank').values_list('book_id', 'similar_id', 'score')
+                         .iterator(chunk_size=10000)), dtype=np.float64).reshape(-1, 3)
+    if not len(rows):
+        return pks, scores
+    books, similar = rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64)
+    #the position of each row in its book's list, whatever gaps deleted books left in the ranks
+    first = np.searchsorted(books, books)
+    positions = np.arange(len(books)) - first
+    book_rows, known = features._known(books)
+    known &= positions < k
+    pks[book_rows[known], positions[known]] = similar[known]
+    scores[book_rows[known], positions[known]] = rows[known, 2]
+    return pks, scores
+
+
+def refresh(k=TOP_K):
+    """Recomputes the lists the books changed since the last run are in or belong in.
+    Returns {'books', 'changed', 'rewritten', 'seconds'}"""
+    start = time.perf_counter()
+    last = SimilarBooksRun.objects.order_by('-started_at').first()
+    if last is None:
+        return build(k)
+    computed_at = timezone.now()
+    changed_pks = list(Book.objects.filter(updated_at__gt=last.started_at).values_list('pk', flat=True))
+    if not changed_pks:
+        return {'books': Book.objects.count(), 'changed': 0, 'rewritten': 0, 'seconds': time.perf_counter() - start}
+    features = Features()
+    n = len(features)
+    changed = features.rows(changed_pks)
+    if n < 2 or len(changed) > REFRESH_LIMIT * n:
+        return build(k)
+    k = min(k, n - 1)
+
+    #the changed books' own lists, and the k best of them for every book
+    lists = {}
+    candidate_rows = np.zeros((0, n), dtype=np.int32)
+    candidate_scores = np.zeros((0, n), dtype=np.float32)
+    for chunk in _chunks(changed, features.chunk_size()):
+        scores = features.scores(chunk)
+        lists.update(zip(chunk.tolist(), zip(*_top(features.pks, scores, k))))
+        #the scores are symmetric: the columns score every book against the changed ones
+        candidate_rows = np.vstack([candidate_rows, np.repeat(chunk[:, None].astype(np.int32), n, axis=1)])
+        candidate_scores = np.vstack([candidate_scores, scores])
+        if len(candidate_scores) > k:
+            best = np.argpartition(-candidate_scores, k - 1, axis=0)[:k]
+            candidate_rows = np.take_along_axis(candidate_rows, best, axis=0)
+            candidate_scores = np.take_along_axis(candidate_scores, best, axis=0)
+
+    #the other books: their stored list less the changed books, merged with the changed books
+    old_pks, old_scores = _stored(features, k)
+    dropped = np.isin(old_pks, features.pks[changed])
+    pks, scores = _merge(old_pks, np.where(dropped, -np.inf, old_scores).astype(np.float32),
+                         features.pks[candidate_rows.T], candidate_scores.T, k)
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[changed] = True
+    #a book missing from a full list scores at most its last one: past a dropped book, the
+    #merged list must reach that far, or the book is computed again
+    full = (old_scores > 0).sum(axis=1) == k
+    reached = (scores >= old_scores[:, -1:]).sum(axis=1) == k
+    again = np.flatnonzero(full & dropped.any(axis=1) & ~reached & ~is_changed)
+    lists.update(_compute(features, again, k))
+
+    kept = ~is_changed
+    kept[again] = False
+    differs = (np.where(scores > 0, pks, 0) != np.where(old_scores > 0, old_pks, 0)).any(axis=1)
+    for row in np.flatnonzero(kept & differs).tolist():
+        lists[row] = (pks[row], scores[row])
+    #the next run starts from here even if no list changed
+    with transaction.atomic():
+        _write(features, lists, computed_at, replace=True)
+        return _record(computed_at, False, {'books': n, 'changed': len(changed), 'rewritten': len(lists)}, start)
+
+
+def _merge(pks, scores, other_pks, other_scores, k):
+    """The k best of each row of two lists, by score then pk"""
+    all_pks = np.concatenate([pks, other_pks], axis=1)
+    all_scores = np.concatenate([scores, other_scores], axis=1)
+    order = np.lexsort((all_pks, -all_scores), axis=1)[:, :k]
+    return np.take_along_axis(all_pks, order, axis=1), np.take_along_axis(all_scores, order, axis=1)
@@ -0,0 +1,76 @@
+"""Releases the wishes whose due_back has passed.
+
+sweep_expired_wishes() moves expired 'wished' statuses back to 'av' with one
+UPDATE per batch, refreshes the current_* fields of their books with another
+and queues their notifications (books.notifications) in the same
+transaction, and sends a single books.signals.wishes_expired per run. It is run by
+manage.py sweep_wishes, or every BOOKS_SWEEP_INTERVAL seconds by an
+in-process Sweeper thread started from BooksConfig.ready()."""
+
+import datetime
+import logging
+import threading
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import counters, notifications
+from .models import Book, Status
+from .signals import wishes_expired
+
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_wishes(today=None, batch_size=1000):
+    """Releases every expired wish and returns how many were released"""
+    today = today or datetime.date.today()
+    #skip the rows someone else is renewing right now, the next run gets them
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    released = []
+    while True:
+        with transaction.atomic():
+            batch = list(Status.objects.expired(today)
+                         .select_for_update(skip_locked=skip_locked)
+                         .order_by('pk')
+                         .values('pk', 'book_id', 'wisher_id', 'due_back')[:batch_size])
+            if not batch:
+                break
+            updated = (Status.objects.expired(today)
+                       .filter(pk__in=[wish['pk'] for wish in batch])
+                       .update(status='av', wisher=None, due_back=None, updated_at=timezone.now()))
+            Book.objects.filter(pk__in={wish['book_id'] for wish in batch}).refresh_availability()
+            counters.incr('available', updated)
+            wishes = [{'status': wish['pk'], 'book': wish['book_id'], 'wisher': wish['wisher_id'],
+                       'due_back': wish['due_back']} for wish in batch]
+            notifications.enqueue_expired(wishes)
+        released.extend(wishes)
+        if len(batch) < batch_size:
+            break
+
+    if released:
+        wishes_expired.send(sender=Status, wishes=released)
+    return len(released)
+
+
+class Sweeper(threading.Thread):
+    """Daemon thread running sweep_expired_wishes every interval seconds"""
+
+    def __init__(self, interval):
+        super().__init__(name='books-sweeper', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                released = sweep_expired_wishes()
+                if released:
+                    logger.info('Released %d expired wishes', released)
+            except Exception:
+                logger.exception('Sweeping expired wishes failed')
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
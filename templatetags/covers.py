@@ -0,0 +1,19 @@
+from django import template
+from django.utils.html import format_html
+
+from books import covers
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def cover(book, size):
+    """{% cover book 'list' %}: the WebP and JPEG thumbnails of the book's cover, nothing until they are made"""
+    if not book.cover_key:
+        return ''
+    width, height = covers.SIZES[size]
+    return format_html('<picture><source srcset="{}" type="image/webp">'
+                       '<img src="{}" width="{}" height="{}" alt="{}" loading="lazy"></picture>',
+                       covers.thumbnail_url(book.cover_key, size, 'webp'),
+                       covers.thumbnail_url(book.cover_key, size, 'jpg'), width, height, book.title)
@@ -0,0 +1,41 @@
+from django import template
+
+from books import fragments, versions
+
+
+register = template.Library()
+
+#the query parameters the cached pages read: the page number and the keyset cursor;
+#any other one would only add a copy of the same fragment
+PAGE_PARAMS = ('page', 'cursor')
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary = vary
+
+    def render(self, context):
+        request = getattr(context, 'request', None)
+        version = versions.state(request) if request is not None else None
+        #the path carries the owner and the filter of the list, the parameters its page
+        vary = [request.path] + [request.GET.get(param, '') for param in PAGE_PARAMS] if request is not None else ['']
+        vary += [value.resolve(context) for value in self.vary]
+        return fragments.get_or_render(self.name.resolve(context), version, vary,
+                                       lambda: self.nodelist.render(context))
+
+
+@register.tag
+def cached_fragment(parser, token):
+    """{% cached_fragment 'name' [vary_on ...] %} ... {% endcached_fragment %}
+
+    Caches the enclosed part of a page under books.versions: it must not show
+    anything that depends on the user."""
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a fragment name")
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]),
+                              [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,100 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books.models import Book, Author, Genre, Status
+from books.pagination import EstimatedCountPaginator, estimate_count
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+                username='librarian', email='librarian@example.com', password='bn56dpt^4d')
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(4)]
+        for book_id in range(30):
+            author = Author.objects.create(first_name=f'John {book_id}', last_name='Smith')
+            book = Book.objects.create(title=f'Book {book_id}', author=author, owner=cls.admin,
+                                       pub_house='Polirom')
+            book.genre.set(genres)
+            Status.objects.create(book=book, status='av')
+            Status.objects.create(book=book, status='wished', wisher=cls.admin,
+                                  due_back=datetime.date.today())
+
+    def setUp(self):
+        self.client.login(username='librarian', password='bn56dpt^4d')
+
+    def assertChangelistQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_book_changelist(self):
+        #session, user, statistics (in a savepoint), count of the small table,
+        #page, genres of the page
+        self.assertChangelistQueries(9, reverse('admin:books_book_changelist'))
+
+    def test_status_changelist(self):
+        #session, user, statistics (in a savepoint), count of the small table, page
+        self.assertChangelistQueries(8, reverse('admin:books_status_changelist'))
+
+    def test_book_change_form_uses_autocomplete(self):
+        User.objects.create_user(username='stranger')
+        book = Book.objects.first()
+        response = self.client.get(reverse('admin:books_book_change', args=[book.pk]))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'stranger')
+
+    def run_action(self, action, statuses):
+        return self.client.post(reverse('admin:books_status_changelist'), {
+                'action': action,
+                '_selected_action': [status.pk for status in statuses]})
+
+    def test_mark_gone_is_one_update(self):
+        statuses = list(Status.objects.order_by('pk')[:10])
+        with CaptureQueriesContext(connection) as captured:
+            self.run_action('mark_gone', statuses)
+        updates = [query for query in captured if query['sql'].startswith('UPDATE "books_status"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Status.objects.filter(status='gone').count(), 10)
+        self.assertFalse(Status.objects.filter(status='gone').exclude(wisher=None).exists())
+
+    def test_mark_available(self):
+        self.run_action('mark_available', Status.objects.filter(status='wished')[:5])
+        self.assertEqual(Status.objects.filter(status='av').count(), 35)
+
+    def test_renew_only_touches_wishes(self):
+        self.run_action('renew', Status.objects.all())
+        due_back = datetime.date.today() + datetime.timedelta(days=10)
+        self.assertEqual(Status.objects.filter(due_back=due_back).count(), 30)
+        self.assertFalse(Status.objects.filter(status='av').exclude(due_back=None).exists())
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(50)])
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @override_settings(BOOKS_ESTIMATED_COUNT_THRESHOLD=10)
+    def test_unfiltered_count_is_estimated(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('the statistics are read differently on each backend')
+        self.analyze()
+        Genre.objects.bulk_create([Genre(name=f'Genre {i}') for i in range(50, 60)])
+        self.assertEqual(estimate_count(Genre), 50)
+        with self.assertNumQueries(3):
+            self.assertEqual(EstimatedCountPaginator(Genre.objects.all(), 20).count, 50)
+        #filtered: exact
+        self.assertEqual(EstimatedCountPaginator(Genre.objects.filter(name__startswith='Genre 5'), 20).count, 11)
+
+    def test_small_tables_are_counted(self):
+        self.analyze()
+        self.assertEqual(EstimatedCountPaginator(Genre.objects.all(), 20).count, 50)
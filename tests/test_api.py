@@ -0,0 +1,80 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from books.models import Book, Author, Genre, Status
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='stgr4ao/56')
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(3)]
+        for book_id in range(25):
+            author = Author.objects.create(first_name=f'John {book_id}', last_name='Smith')
+            book = Book.objects.create(title=f'Book {book_id}', author=author, owner=cls.owner,
+                                       pub_house='Polirom')
+            book.genre.set(genres[:book_id % 4])
+            Status.objects.create(book=book, status='wished', wisher=cls.owner,
+                                  due_back=datetime.date(2030, 1, book_id + 1))
+        cls.books = list(Book.objects.order_by('pk'))
+
+    def get(self, resource, **params):
+        return self.client.get(reverse('books:api', args=[resource]), params)
+
+    def test_pages_with_a_cursor(self):
+        seen = []
+        response = self.get('books', limit=10, fields='id')
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            seen.extend(book['id'] for book in data['results'])
+            if not data['next']:
+                break
+            self.assertIn('fields=id', data['next'])
+            response = self.client.get(data['next'])
+        self.assertEqual(seen, [book.pk for book in self.books])
+        self.assertIsNotNone(data['previous'])
+
+    def test_page_queries(self):
+        #the page, then the genres of the whole page
+        with self.assertNumQueries(2):
+            response = self.get('books', limit=20)
+        book = response.json()['results'][3]
+        self.assertEqual(book, {
+            'id': self.books[3].pk, 'title': 'Book 3', 'summary': '', 'pub_house': 'Polirom',
+            'pub_date': '', 'category': '', 'author': self.books[3].author_id, 'owner': 'owner',
+            'status': 'wished', 'wisher': 'owner', 'due_back': '2030-01-04',
+            'genres': ['Genre 0', 'Genre 1', 'Genre 2']})
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(1):
+            response = self.get('books', fields='title,owner', limit=1)
+        self.assertEqual(response.json()['results'], [{'title': 'Book 0', 'owner': 'owner'}])
+
+    def test_batch_ids(self):
+        ids = [self.books[5].pk, self.books[2].pk, 999999, self.books[5].pk]
+        with self.assertNumQueries(1):
+            response = self.get('books', ids=','.join(map(str, ids)), fields='id,title')
+        self.assertEqual(response.json()['results'], [
+            {'id': self.books[5].pk, 'title': 'Book 5'}, {'id': self.books[2].pk, 'title': 'Book 2'}])
+
+    def test_other_resources(self):
+        status = Status.objects.order_by('pk').first()
+        response = self.get('statuses', ids=str(status.pk))
+        self.assertEqual(response.json()['results'], [{
+            'id': status.pk, 'book': status.book_id, 'status': 'wished', 'wisher': 'owner',
+            'due_back': '2030-01-01'}])
+        self.assertEqual(len(self.get('authors', limit=100).json()['results']), 25)
+        self.assertEqual(self.get('genres', fields='name').json()['results'],
+                         [{'name': 'Genre 0'}, {'name': 'Genre 1'}, {'name': 'Genre 2'}])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.get('books', fields='title,password').status_code, 400)
+        self.assertEqual(self.get('books', ids='1,x').status_code, 400)
+        self.assertEqual(self.get('books', ids=','.join(['1'] * 201)).status_code, 400)
+        self.assertEqual(self.get('books', cursor='garbage').status_code, 400)
+        self.assertEqual(self.get('users').status_code, 404)
+        self.assertEqual(self.client.post(reverse('books:api', args=['books'])).status_code, 405)
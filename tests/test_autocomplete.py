@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from books import autocomplete
+from books.models import Book, Author
+
+
+class PrefixIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = autocomplete.PrefixIndex([
+                (1, 'Știință și tehnică'), (2, 'Luceafărul'), (3, 'Poezii'),
+                (4, 'Poezii alese de Mihai Eminescu'), (5, 'Țara de dincolo de negură')])
+
+    def titles(self, query, limit=10):
+        return [title for pk, title in self.index.suggest(query, limit)]
+
+    def test_fold(self):
+        self.assertEqual(autocomplete.fold('  Ştiinţă  ȘI Țară '), 'stiinta si tara')
+
+    def test_prefixes_of_any_word(self):
+        self.assertEqual(self.titles('stiin'), ['Știință și tehnică'])
+        self.assertEqual(self.titles('ȚARA'), ['Țara de dincolo de negură'])
+        self.assertEqual(self.titles('emin'), ['Poezii alese de Mihai Eminescu'])
+        self.assertEqual(self.titles('poezii al'), ['Poezii alese de Mihai Eminescu'])
+        #'de' twice in one title: suggested once, in the order of 'de dincolo', 'de mihai'
+        self.assertEqual(self.titles('de'), ['Țara de dincolo de negură', 'Poezii alese de Mihai Eminescu'])
+        self.assertEqual(self.titles('poezii'), ['Poezii', 'Poezii alese de Mihai Eminescu'])
+        self.assertEqual(self.titles('p', limit=1), ['Poezii'])
+        self.assertEqual(self.titles('x'), [])
+        self.assertEqual(self.titles('  '), [])
+
+    def test_changes(self):
+        self.index.update(2, 'Luceafărul și alte poezii')
+        self.index.update(6, 'Poveștile unchiașului sfătos')
+        self.index.delete(3)
+        self.assertEqual(self.titles('luce'), ['Luceafărul și alte poezii'])
+        self.assertEqual(self.titles('poezii'), ['Luceafărul și alte poezii', 'Poezii alese de Mihai Eminescu'])
+        self.assertEqual(self.titles('poves'), ['Poveștile unchiașului sfătos'])
+        self.index.update(6, 'Amintiri din copilărie')
+        self.index.delete(2)
+        self.assertEqual(self.titles('poves'), [])
+        self.assertEqual(self.titles('luce'), [])
+        self.assertEqual(self.titles('amin'), ['Amintiri din copilărie'])
+
+    def test_unchanged_label_is_not_a_change(self):
+        self.index.update(1, 'Știință și tehnică')
+        self.assertEqual((self.index.changed, self.index.tombstones), ({}, set()))
+
+    def test_compaction(self):
+        with mock.patch.object(autocomplete, 'DELTA_LIMIT', 2):
+            self.index.delete(1)
+            self.index.update(6, 'Amintiri din copilărie')
+            self.index.update(7, 'Moara cu noroc')
+            self.index.update(8, 'Moromeții')
+        self.assertEqual((self.index.changed, self.index.tombstones), ({}, set()))
+        self.assertEqual(list(self.index.segment.pks), [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(self.titles('mo'), ['Moara cu noroc', 'Moromeții'])
+        self.assertEqual(self.titles('stiin'), [])
+
+
+class ModelIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        cls.book = Book.objects.create(title='Poezii', author=cls.author, pub_house='Humanitas')
+
+    def setUp(self):
+        autocomplete.books.reset()
+        autocomplete.authors.reset()
+
+    def suggest(self, query):
+        response = self.client.get(reverse('books:autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_endpoint(self):
+        self.assertEqual(self.suggest('emin'), {'books': [], 'authors': [{'id': self.author.pk,
+                                                                        'name': 'Mihai Eminescu'}]})
+        self.assertEqual(self.suggest('poe')['books'], [{'id': self.book.pk, 'title': 'Poezii'}])
+        self.assertEqual(self.suggest(''), {'books': [], 'authors': []})
+        #built: no queries until the next sync
+        with self.assertNumQueries(0):
+            self.suggest('po')
+
+    def test_signals(self):
+        self.suggest('x')
+        book = Book.objects.create(title='Luceafărul', author=self.author, pub_house='Polirom')
+        self.assertEqual(self.suggest('lucea')['books'], [{'id': book.pk, 'title': 'Luceafărul'}])
+        self.author.last_name = 'Eminovici'
+        self.author.save()
+        self.assertEqual(self.suggest('eminovici')['authors'][0]['id'], self.author.pk)
+        book.delete()
+        self.assertEqual(self.suggest('lucea')['books'], [])
+
+    @override_settings(BOOKS_AUTOCOMPLETE_SYNC=0)
+    def test_sync_pulls_writes_without_signals(self):
+        self.suggest('x')
+        Book.objects.filter(pk=self.book.pk).update(title='Poesii', updated_at=timezone.now())
+        Book.objects.bulk_create([Book(title='Doina', pub_house='Polirom')])
+        self.assertEqual([book['title'] for book in self.suggest('poesii')['books']], ['Poesii'])
+        self.assertEqual([book['title'] for book in self.suggest('doi')['books']], ['Doina'])
@@ -0,0 +1,81 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from books import wishes
+from books.models import Book, Status
+from books.sweeper import sweep_expired_wishes
+
+
+class AvailabilityTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wisher = User.objects.create_user(username='wisher', password='stgr4ao/56')
+        cls.book = Book.objects.create(title='Good By!', pub_house='Polirom')
+
+    def assertCurrent(self, status, wisher=None, due_back=None, book=None):
+        book = Book.objects.get(pk=(book or self.book).pk)
+        self.assertEqual((book.current_status, book.current_wisher, book.current_due_back),
+                         (status, wisher, due_back))
+
+    def test_follows_saved_and_deleted_statuses(self):
+        self.assertCurrent('')
+        due_back = datetime.date.today() + datetime.timedelta(days=3)
+        wished = Status.objects.create(book=self.book, status='wished', wisher=self.wisher, due_back=due_back)
+        self.assertCurrent('wished', self.wisher, due_back)
+        copy = Status.objects.create(book=self.book, status='av')
+        #any available copy makes the book available
+        self.assertCurrent('av')
+        copy.status = 'gone'
+        copy.save()
+        self.assertCurrent('wished', self.wisher, due_back)
+        wished.delete()
+        self.assertCurrent('gone')
+
+    def test_status_moved_to_another_book(self):
+        other = Book.objects.create(title='Hello!', pub_house='Polirom')
+        status = Status.objects.create(book=self.book, status='av')
+        status.book = other
+        status.save()
+        self.assertCurrent('')
+        self.assertCurrent('av', book=other)
+
+    def test_claim_release_and_sweep(self):
+        status = Status.objects.create(book=self.book, status='av')
+        today = datetime.date.today()
+        wishes.claim(status.pk, self.wisher, today)
+        self.assertCurrent('wished', self.wisher, today + datetime.timedelta(days=wishes.WISH_DAYS))
+        wishes.release(status.pk, self.wisher)
+        self.assertCurrent('av')
+
+        wishes.claim(status.pk, self.wisher, today - datetime.timedelta(days=30))
+        self.assertCurrent('wished', self.wisher, today - datetime.timedelta(days=20))
+        sweep_expired_wishes(today)
+        self.assertCurrent('av')
+
+    def test_admin_action(self):
+        User.objects.create_superuser(username='librarian', email='librarian@example.com', password='bn56dpt^4d')
+        status = Status.objects.create(book=self.book, status='av')
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        self.client.post(reverse('admin:books_status_changelist'),
+                         {'action': 'mark_gone', '_selected_action': [status.pk]})
+        self.assertCurrent('gone')
+
+    def test_repair_command(self):
+        books = [Book.objects.create(title=f'Book {i}', pub_house='Polirom') for i in range(7)]
+        #bulk_create sends no signals: every book is stale
+        Status.objects.bulk_create([Status(book=book, status='av') for book in books])
+        Book.objects.update(current_status='gone')
+        call_command('repair_availability', chunk_size=3, stdout=open('/dev/null', 'w'))
+        self.assertEqual(Book.objects.available().count(), 7)
+        self.assertCurrent('')
+
+    def test_available_list(self):
+        Status.objects.create(book=self.book, status='wished', wisher=self.wisher)
+        available = Book.objects.create(title='Hello!', pub_house='Polirom')
+        Status.objects.create(book=available, status='av')
+        response = self.client.get(reverse('books:available_books'))
+        self.assertEqual(list(response.context['book_list']), [available])
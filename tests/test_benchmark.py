@@ -0,0 +1,71 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from books import benchmark, counters, covers
+from books.models import Book, Status
+from books.urls import urlpatterns
+
+
+class SeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = benchmark.seed(60, genres=5, chunk_size=25)
+
+    def test_counts(self):
+        self.assertEqual((self.created['books'], self.created['authors'], self.created['users']), (60, 6, 3))
+        self.assertEqual(Book.objects.count(), 60)
+        self.assertEqual(Status.objects.count(), self.created['statuses'])
+        self.assertFalse(Book.objects.filter(genre=None).exists())
+        self.assertEqual(counters.get_counts()['books'], 60)
+
+    def test_availability_matches_the_statuses(self):
+        fields = ('pk', 'current_status', 'current_wisher', 'current_due_back')
+        seeded = list(Book.objects.order_by('pk').values_list(*fields))
+        Book.objects.all().refresh_availability()
+        self.assertEqual(seeded, list(Book.objects.order_by('pk').values_list(*fields)))
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(30, chunk_size=10)
+        cls.librarian = User.objects.create_superuser(
+                username='librarian', email='librarian@example.com', password='bn56dpt^4d')
+        #a cover for books:cover
+        data = io.BytesIO()
+        Image.new('RGB', (300, 450)).save(data, 'JPEG')
+        book = Book.objects.order_by('pk')[15]
+        book.cover = SimpleUploadedFile('cover.jpg', data.getvalue())
+        book.save()
+        covers.backfill(covers.pending(), workers=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_every_named_url(self):
+        results = benchmark.run(user=self.librarian, repeat=2)
+        self.assertEqual(set(results['routes']), {pattern.name for pattern in urlpatterns if pattern.name})
+        for name, result in results['routes'].items():
+            self.assertEqual(result['status'], 200, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+        metrics = list(benchmark.compare(results, results))
+        self.assertIn(('books', 'queries', results['routes']['books']['queries'],
+                       results['routes']['books']['queries']), metrics)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([benchmark.percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(benchmark.percentile([7], 99), 7)
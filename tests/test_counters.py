@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from books import counters
+from books.models import Book, Author, Status
+
+
+#TransactionTestCase: the counters are adjusted on commit
+class CountersTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(first_name='John', last_name='Smith')
+        self.book = Book.objects.create(title='Good By!', author=self.author, pub_house='Polirom')
+        self.status = Status.objects.create(book=self.book, status='av')
+        self.assertEqual(counters.get_counts(), {'books': 1, 'authors': 1, 'available': 1})
+
+    def test_index_does_no_count_queries_once_cached(self):
+        self.client.get(reverse('books:index'))
+        with self.assertNumQueries(0):
+            counters.get_counts()
+
+    def test_create_and_delete(self):
+        author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        Book.objects.create(title='Poezii', author=author, pub_house='Humanitas')
+        self.assertEqual(counters.get_counts(), {'books': 2, 'authors': 2, 'available': 1})
+
+        self.book.delete()
+        #the status of a deleted book stays behind (on_delete=SET_NULL)
+        self.assertEqual(counters.get_counts(), {'books': 1, 'authors': 2, 'available': 1})
+
+    def test_status_changes(self):
+        self.status.status = 'wished'
+        self.status.save()
+        self.assertEqual(counters.get_counts()['available'], 0)
+
+        #saving again without a change does not count twice
+        self.status.save()
+        status = Status.objects.get(pk=self.status.pk)
+        status.status = 'av'
+        status.save()
+        status.save()
+        self.assertEqual(counters.get_counts()['available'], 1)
+
+    def test_bulk_operations_adjust_explicitly(self):
+        Status.objects.bulk_create([Status(book=self.book, status='av') for i in range(3)])
+        counters.incr('available', 3)
+        self.assertEqual(counters.get_counts()['available'], 4)
+
+    def test_reconcile_fixes_drift(self):
+        Status.objects.filter(pk=self.status.pk).update(status='gone')
+        self.assertEqual(counters.get_counts()['available'], 1)
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(counters.get_counts()['available'], 0)
+        self.assertEqual(counters.reconcile(), {})
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from books import covers
+from books.models import Book
+
+
+def image(size=(600, 900), format='JPEG', color='navy'):
+    data = io.BytesIO()
+    Image.new('RGB', size, color).save(data, format)
+    return data.getvalue()
+
+
+#TransactionTestCase: the thumbnails are made when the transaction commits
+@override_settings(BOOKS_COVER_WORKERS=0)
+class CoverTest(TransactionTestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, book, data, name='cover.jpg'):
+        book.cover = SimpleUploadedFile(name, data)
+        book.save()
+        book.refresh_from_db()
+        return book
+
+    def thumbnails(self, key):
+        return sorted(os.listdir(os.path.join(self.media, 'covers', key)))
+
+    def test_upload(self):
+        book = self.upload(Book.objects.create(title='Ion', pub_house='Polirom'), image())
+        key = covers.key_of(book.cover.name)
+        self.assertEqual(book.cover.name, f'covers/{key}/original.jpg')
+        self.assertEqual(book.cover_key, key)
+        self.assertEqual(self.thumbnails(key), ['detail-240x360.jpg', 'detail-240x360.webp', 'list-80x120.jpg',
+                                                'list-80x120.webp', 'original.jpg'])
+        with default_storage.open(f'covers/{key}/list-80x120.webp') as f:
+            self.assertEqual(Image.open(f).size, (80, 120))
+
+        #the list links the thumbnails, never the original
+        content = self.client.get(reverse('books:books')).content.decode()
+        self.assertIn(covers.thumbnail_url(key, 'list', 'webp'), content)
+        self.assertIn('width="80" height="120"', content)
+        self.assertNotIn('original', content)
+
+        response = self.client.get(covers.thumbnail_url(key, 'detail', 'jpg'))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size, (240, 360))
+        self.assertEqual(self.client.get(reverse('books:cover', args=[key, 'original.jpg'])).status_code, 404)
+
+    def test_new_cover_new_names(self):
+        book = self.upload(Book.objects.create(title='Ion', pub_house='Polirom'), image())
+        first = book.cover_key
+        book.title = 'Ion, ediția a II-a'
+        book.save()
+        self.assertEqual(Book.objects.get(pk=book.pk).cover_key, first)
+
+        book = self.upload(book, image(color='red', format='PNG'), 'cover.png')
+        self.assertNotEqual(book.cover_key, first)
+        self.assertTrue(book.cover.name.endswith('/original.png'))
+        #the old files stay: they may be another book's
+        self.assertIn('list-80x120.jpg', self.thumbnails(first))
+
+    def test_broken_image(self):
+        with self.assertLogs('books.covers', 'WARNING'):
+            book = self.upload(Book.objects.create(title='Ion', pub_house='Polirom'), b'not an image')
+        self.assertEqual(book.cover_key, '')
+        self.assertEqual(list(covers.pending()), [(book.pk, book.cover.name, None)])
+
+    def test_backfill(self):
+        books = [Book.objects.create(title=f'Carte {i}', pub_house='Polirom') for i in range(4)]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for book, color in zip(books[:3], ('red', 'green', 'blue')):
+            with open(os.path.join(directory, f'{book.pk}.jpg'), 'wb') as f:
+                f.write(image(color=color))
+        with open(os.path.join(directory, 'notes.txt'), 'w') as f:
+            f.write('-')
+
+        out = StringIO()
+        call_command('generate_covers', from_dir=directory, workers=2, stdout=out)
+        self.assertIn('3 covers ready, 0 failed.', out.getvalue())
+        ready = {book.pk: book for book in Book.objects.exclude(cover_key='')}
+        self.assertEqual(sorted(ready), [book.pk for book in books[:3]])
+        for book in ready.values():
+            self.assertEqual(covers.key_of(book.cover.name), book.cover_key)
+            self.assertIn('detail-240x360.webp', self.thumbnails(book.cover_key))
+
+        #the missing ones only, unless all of them are asked for
+        Book.objects.filter(pk=books[0].pk).update(cover_key='')
+        self.assertEqual(covers.backfill(covers.pending(), workers=0), (1, []))
+        self.assertEqual(covers.backfill(covers.pending(everything=True), workers=2), (3, []))
+
+    def test_import(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'ion.jpg'), 'wb') as f:
+            f.write(image())
+        path = os.path.join(directory, 'books.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'title': 'Ion', 'cover': 'ion.jpg'}) + '\n')
+            f.write(json.dumps({'title': 'Răscoala', 'cover': 'missing.jpg'}) + '\n')
+            f.write(json.dumps({'title': 'Pădurea spânzuraților'}) + '\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_books', path, stdout=out, stderr=err)
+        self.assertIn('Record 2 skipped: cover:', err.getvalue())
+        book = Book.objects.get(title='Ion')
+        self.assertEqual(book.cover_key, covers.key_of(book.cover.name))
+        self.assertNotEqual(book.cover_key, '')
+        self.assertEqual(Book.objects.get(title='Pădurea spânzuraților').cover, '')
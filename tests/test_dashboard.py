@@ -0,0 +1,84 @@
+import datetime
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from books import dashboard, wishes
+from books.models import Book, Genre, Status
+
+
+class DashboardTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='stgr4ao/56')
+        cls.other = User.objects.create_user(username='other', password='bn56dpt^4d')
+        cls.wisher = User.objects.create_user(username='wisher', password='ty78uio!3a')
+        poetry = Genre.objects.create(name='Poezie')
+        prose = Genre.objects.create(name='Proză')
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        for book_id, (status, genres) in enumerate([('av', [poetry]), ('av', [poetry, prose]),
+                                                    ('wished', [poetry]), ('gone', [prose])]):
+            book = Book.objects.create(title=f'Book {book_id}', pub_house='Polirom', owner=cls.owner)
+            book.genre.set(genres)
+            Status.objects.create(book=book, status=status,
+                                  wisher=cls.wisher if status == 'wished' else None,
+                                  due_back=yesterday if status == 'wished' else None)
+        cls.others_book = Book.objects.create(title='Other', pub_house='Polirom', owner=cls.other)
+        cls.others_status = Status.objects.create(book=cls.others_book, status='av')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats(self):
+        stats = dashboard.stats(self.owner)
+        self.assertEqual((stats['books'], stats['available'], stats['wished'], stats['gone'], stats['overdue']),
+                         (4, 2, 1, 1, 1))
+        self.assertEqual(stats['top_genres'], [('Poezie', 3), ('Proză', 2)])
+        self.assertEqual(dashboard.stats(self.other)['books'], 1)
+
+    def test_overdue_copies(self):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        #one book: an available copy and two overdue wished ones
+        book = Book.objects.get(title='Book 0')
+        for copy in range(2):
+            Status.objects.create(book=book, status='wished', wisher=self.wisher, due_back=yesterday)
+        Book.objects.filter(pk=book.pk).refresh_availability()
+        stats = dashboard.stats(self.owner)
+        self.assertEqual((stats['available'], stats['wished'], stats['overdue']), (2, 1, 3))
+
+    def test_cached_until_the_shelf_changes(self):
+        dashboard.stats(self.owner)
+        with self.assertNumQueries(1):
+            dashboard.stats(self.owner)
+
+        #another owner's shelf changes: this one is still cached
+        wishes.claim(self.others_status.pk, self.wisher)
+        with self.assertNumQueries(1):
+            self.assertEqual(dashboard.stats(self.owner)['available'], 2)
+        self.assertEqual(dashboard.stats(self.other)['wished'], 1)
+
+        status = Status.objects.get(book__owner=self.owner, status='av', book__title='Book 0')
+        wishes.claim(status.pk, self.wisher)
+        stats = dashboard.stats(self.owner)
+        self.assertEqual((stats['available'], stats['wished'], stats['overdue']), (1, 2, 1))
+
+    def test_dashboard_permissions(self):
+        url = reverse('books:owner_dashboard', args=['owner'])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username='other', password='bn56dpt^4d')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.other.user_permissions.add(Permission.objects.get(codename='can_mark_wished'))
+        self.assertContains(self.client.get(url), 'Poezie')
+
+        self.client.login(username='owner', password='stgr4ao/56')
+        self.assertContains(self.client.get(url), 'Dorite cu termenul depășit')
+
+    def test_owner_book_list(self):
+        response = self.client.get(reverse('books:owner_books', args=['owner']))
+        self.assertEqual(len(response.context['book_list']), 4)
+        self.assertNotContains(response, 'Other')
+        self.assertEqual(self.client.get(reverse('books:owner_books', args=['nobody'])).status_code, 404)
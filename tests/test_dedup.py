@@ -0,0 +1,106 @@
+from django.contrib.auth.models import Permission, User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from books import counters, dedup, facets
+from books.models import Book, Author, Genre, FacetCount, Status
+
+
+class SimilarityTest(SimpleTestCase):
+    def similarity(self, a, b):
+        return dedup.name_similarity(dedup.name_tokens(a), dedup.name_tokens(b))
+
+    def test_names(self):
+        self.assertEqual(dedup.name_tokens('Eminescu,', 'Mihai'), dedup.name_tokens('mihai', 'EMINESCU'))
+        self.assertEqual(self.similarity('Ştefan Bănulescu', 'Stefan Banulescu'), 1.0)
+        self.assertGreaterEqual(self.similarity('M. Eminescu', 'Mihai Eminescu'), dedup.THRESHOLD)
+        self.assertGreaterEqual(self.similarity('Mihail Eminescu', 'Mihai Eminescu'), dedup.THRESHOLD)
+        self.assertLess(self.similarity('Marin Preda', 'Maria Preda'), dedup.THRESHOLD)
+        self.assertLess(self.similarity('Preda', 'Marin Preda'), dedup.THRESHOLD)
+        self.assertLess(self.similarity('Ion Creangă', 'Ion Barbu'), dedup.THRESHOLD)
+
+
+class DedupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner')
+        cls.other_owner = User.objects.create_user(username='other')
+        names = [('Mihai', 'Eminescu'), ('Eminescu', 'Mihai'), ('M.', 'Eminescu'), ('mihai', 'EMINESCU'),
+                 ('Marin', 'Preda'), ('Maria', 'Preda'), ('Ion', 'Creangă')]
+        cls.authors = [Author.objects.create(first_name=first, last_name=last) for first, last in names]
+        cls.poetry = Genre.objects.create(name='Poezie')
+        cls.prose = Genre.objects.create(name='Proză')
+
+    def book(self, title, author, genres=(), owner=None, pub_house='Polirom', copies=('av',)):
+        book = Book.objects.create(title=title, author=self.authors[author], pub_house=pub_house,
+                                   owner=owner or self.owner)
+        book.genre.set(genres)
+        for status in copies:
+            Status.objects.create(book=book, status=status)
+        return book
+
+    def test_find_authors(self):
+        result = dedup.find_duplicate_authors()
+        self.assertEqual(result.groups, [[author.pk for author in self.authors[:4]]])
+        self.assertEqual(result.rows, 7)
+
+    def test_find_books(self):
+        poems = self.book('Poezii', 0)
+        same = self.book('Poezii ', 1, pub_house='POLIROM')
+        typo = self.book('Poezi', 3)
+        self.book('Poezii', 0, owner=self.other_owner)
+        self.book('Poezii', 0, pub_house='Humanitas')
+        self.book('Poezii', 4)
+        #without the author groups, only the books of one author row are compared
+        self.assertEqual(dedup.find_duplicate_books().groups, [])
+        authors = dedup.find_duplicate_authors()
+        self.assertEqual(dedup.find_duplicate_books(authors=authors).groups, [[poems.pk, same.pk, typo.pk]])
+
+    def test_merge_authors(self):
+        counters.get_counts()
+        books = [self.book(f'Book {i}', i) for i in range(4)]
+        self.book('Book 4', 1)
+        survivor = dedup.merge_authors([author.pk for author in self.authors[:4]])
+        self.assertEqual(survivor, self.authors[1].pk)
+        self.assertEqual(Author.objects.count(), 4)
+        self.assertEqual(Book.objects.filter(author=survivor).count(), 5)
+        self.assertEqual(Book.objects.filter(pk__in=[book.pk for book in books]).count(), 4)
+
+        response = self.client.get(reverse('books:author_detail', args=[survivor]))
+        self.assertContains(response, 'Book 3')
+
+    def test_merge_books(self):
+        first = self.book('Poezii', 0, genres=[self.poetry])
+        second = self.book('Poezii', 0, genres=[self.poetry, self.prose], copies=['gone', 'av'])
+        third = self.book('Poezii', 0, copies=['gone'])
+        survivor = dedup.merge_books([first.pk, second.pk, third.pk])
+        self.assertEqual(survivor, second.pk)
+        self.assertEqual(list(Book.objects.values_list('pk', flat=True)), [second.pk])
+        self.assertEqual(Status.objects.filter(book=second).count(), 4)
+        self.assertEqual(set(second.genre.all()), {self.poetry, self.prose})
+        self.assertEqual(Book.objects.get().current_status, 'av')
+
+        maintained = {(row.genre, row.category, row.owner, row.status): row.count
+                      for row in FacetCount.objects.exclude(count=0)}
+        facets.rebuild()
+        self.assertEqual(maintained, {(row.genre, row.category, row.owner, row.status): row.count
+                                      for row in FacetCount.objects.exclude(count=0)})
+
+    def test_admin_action(self):
+        User.objects.create_superuser(username='librarian', email='librarian@example.com', password='bn56dpt^4d')
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        response = self.client.post(reverse('admin:books_author_changelist'), {
+                'action': 'merge_selected',
+                '_selected_action': [self.authors[0].pk, self.authors[2].pk]}, follow=True)
+        self.assertContains(response, '2 merged into')
+        self.assertEqual(Author.objects.count(), 6)
+
+    def test_admin_action_needs_delete(self):
+        editor = User.objects.create_user(username='editor', password='bn56dpt^4d', is_staff=True)
+        editor.user_permissions.set(Permission.objects.filter(codename__in=('view_author', 'change_author')))
+        self.client.login(username='editor', password='bn56dpt^4d')
+        url = reverse('admin:books_author_changelist')
+        self.assertNotContains(self.client.get(url), 'merge_selected')
+        self.client.post(url, {'action': 'merge_selected',
+                               '_selected_action': [self.authors[0].pk, self.authors[2].pk]})
+        self.assertEqual(Author.objects.count(), 7)
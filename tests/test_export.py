@@ -0,0 +1,76 @@
+import csv
+import datetime
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User, Permission
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from books.models import Book, Author, Genre, Status
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='katte', password='stgr4ao/56')
+        cls.owner.user_permissions.add(Permission.objects.get(codename='view_book'))
+        wisher = User.objects.create_user(username='reader', password='bn56dpt^4d')
+        author = Author.objects.create(first_name='Liviu', last_name='Rebreanu')
+        genres = [Genre.objects.create(name='Roman'), Genre.objects.create(name='Clasic')]
+        for book_id in range(30):
+            book = Book.objects.create(title=f'Ion {book_id}', author=author, owner=cls.owner,
+                                       pub_house='Polirom', category='r')
+            book.genre.set(genres)
+            if book_id % 2:
+                Status.objects.create(book=book, status='wished', wisher=wisher,
+                                      due_back=datetime.date(2026, 11, 1))
+            else:
+                Status.objects.create(book=book, status='av')
+        Book.objects.create(title='Fără autor', pub_house='Minerva')
+
+    def test_command_csv(self):
+        out = StringIO()
+        #one query for the books and their current status, then one for genres per chunk
+        with self.assertNumQueries(1 + 4):
+            call_command('export_books', chunk_size=8, stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(rows[1], {
+                'id': str(Book.objects.get(title='Ion 1').pk), 'title': 'Ion 1',
+                'author_first_name': 'Liviu', 'author_last_name': 'Rebreanu',
+                'summary': '', 'pub_house': 'Polirom', 'pub_date': '', 'category': 'r',
+                'genres': 'Clasic;Roman', 'owner': 'katte', 'status': 'wished',
+                'wisher': 'reader', 'due_back': '2026-11-01'})
+        self.assertEqual(rows[0]['status'], 'av')
+        self.assertEqual(rows[30]['author_last_name'], '')
+        self.assertEqual(rows[30]['genres'], '')
+
+    def test_any_available_copy_wins(self):
+        book = Book.objects.get(title='Ion 0')
+        Status.objects.create(book=book, status='gone')
+        out = StringIO()
+        call_command('export_books', stdout=out)
+        row = next(row for row in csv.DictReader(StringIO(out.getvalue())) if row['title'] == 'Ion 0')
+        #as the list and the API show it, not the latest copy
+        self.assertEqual((row['status'], row['wisher'], row['due_back']), ('av', '', ''))
+
+    def test_view_streams_jsonl(self):
+        self.client.login(username='katte', password='stgr4ao/56')
+        response = self.client.get(reverse('books:export', args=['jsonl']))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 31)
+        self.assertEqual(rows[0]['genres'], ['Clasic', 'Roman'])
+
+    def test_view_needs_permission(self):
+        self.client.login(username='reader', password='bn56dpt^4d')
+        response = self.client.get(reverse('books:export', args=['csv']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_format(self):
+        self.client.login(username='katte', password='stgr4ao/56')
+        response = self.client.get(reverse('books:export', args=['xml']))
+        self.assertEqual(response.status_code, 404)
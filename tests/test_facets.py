@@ -0,0 +1,131 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from books import facets, wishes
+from books.importer import CatalogImporter
+from books.models import Book, Author, Genre, FacetCount, Status
+from books.sweeper import sweep_expired_wishes
+
+
+class FacetCountTest(TestCase):
+    """The counts kept up to date on every write match a recount from scratch"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='stgr4ao/56')
+        cls.poetry = Genre.objects.create(name='Poezie')
+        cls.prose = Genre.objects.create(name='Proză')
+
+    def counts(self):
+        return {(row.genre, row.category, row.owner, row.status): row.count
+                for row in FacetCount.objects.exclude(count=0)}
+
+    def assertConsistent(self):
+        maintained = self.counts()
+        facets.rebuild()
+        self.assertEqual(maintained, self.counts())
+
+    def create_book(self, title, **kwargs):
+        book = Book.objects.create(title=title, pub_house='Polirom', **kwargs)
+        book.genre.set([self.poetry])
+        return book
+
+    def test_book_writes(self):
+        book = self.create_book('Poezii', category='pz', owner=self.owner)
+        other = self.create_book('Nuvele', category='pv')
+        self.assertConsistent()
+
+        book.category = 'r'
+        book.save()
+        other.genre.add(self.prose)
+        self.prose.book_set.add(book)
+        self.assertConsistent()
+
+        book.genre.remove(self.poetry)
+        self.poetry.book_set.clear()
+        self.assertConsistent()
+
+        other.genre.clear()
+        book.delete()
+        self.assertConsistent()
+
+        self.prose.delete()
+        self.owner.delete()
+        self.assertConsistent()
+
+    def test_availability_writes(self):
+        book = self.create_book('Poezii', category='pz')
+        status = Status.objects.create(book=book, status='av')
+        self.assertConsistent()
+        wishes.claim(status.pk, self.owner, datetime.date.today() - datetime.timedelta(days=20))
+        self.assertConsistent()
+        sweep_expired_wishes()
+        self.assertConsistent()
+        status.delete()
+        self.assertConsistent()
+
+    def test_import(self):
+        CatalogImporter().run([
+            {'title': 'Poezii', 'author_first_name': 'Mihai', 'author_last_name': 'Eminescu',
+             'pub_house': 'Humanitas', 'category': 'pz', 'genres': 'Poezie;Romantism', 'owner': 'owner'},
+            {'title': 'Nuvele', 'pub_house': 'Humanitas', 'status': 'gone'},
+        ])
+        self.assertConsistent()
+
+
+class BrowseTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', password='stgr4ao/56')
+        cls.poetry = Genre.objects.create(name='Poezie')
+        author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        for book_id in range(30):
+            book = Book.objects.create(title=f'Book {book_id}', author=author, pub_house='Polirom',
+                                       category=('pz', 'r')[book_id % 2],
+                                       owner=cls.owner if book_id % 3 == 0 else None)
+            if book_id < 10:
+                book.genre.set([cls.poetry])
+            Status.objects.create(book=book, status=('av', 'gone')[book_id % 5 == 0])
+
+    def browse(self, **filters):
+        response = self.client.get(reverse('books:browse'), filters)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def facet(self, response, title):
+        return {value['label']: value['count'] for name, values in response.context['facet_list']
+                if name == title for value in values}
+
+    def test_counts(self):
+        response = self.browse()
+        self.assertEqual(response.context['total'], 30)
+        self.assertEqual(self.facet(response, 'Categorie'), {'poezie': 15, 'roman': 15})
+        self.assertEqual(self.facet(response, 'Posesor'), {'owner': 10, '-': 20})
+        self.assertEqual(self.facet(response, 'Gen'), {'Poezie': 10})
+        self.assertEqual(self.facet(response, 'Status'), {'Cu chef de ducă': 24, 'Pooof! Nu mai e!': 6})
+
+    def test_combined_filters(self):
+        response = self.browse(genre=self.poetry.pk, category='pz', status='av')
+        books = [book for book in Book.objects.filter(genre=self.poetry, category='pz', current_status='av')]
+        self.assertEqual(response.context['total'], len(books))
+        self.assertEqual(list(response.context['book_list']), books)
+        #a facet leaves its own filter out
+        self.assertEqual(self.facet(response, 'Categorie'), {'poezie': 4, 'roman': 4})
+
+    def test_owner_filter(self):
+        response = self.browse(owner=0, category='r')
+        self.assertEqual(response.context['total'],
+                         Book.objects.filter(owner=None, category='r').count())
+        self.assertTrue(all(book.owner_id is None for book in response.context['book_list']))
+
+    def test_unknown_values_are_ignored(self):
+        self.assertEqual(self.browse(category='xx', genre='abc').context['total'], 30)
+
+    def test_constant_queries(self):
+        #four facets, genre and owner names, then the page: no COUNT(*) of the books
+        with self.assertNumQueries(7):
+            response = self.browse(genre=self.poetry.pk, page=1)
+        self.assertEqual(len(response.context['book_list']), 10)
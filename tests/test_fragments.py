@@ -0,0 +1,131 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from books import fragments, wishes
+from books.lrucache import LRUCache
+from books.models import Book, Author, Genre, Status
+
+
+class FragmentCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', password='stgr4ao/56')
+        cls.author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        cls.genre = Genre.objects.create(name='Poezie')
+        cls.book = Book.objects.create(title='Poezii', author=cls.author, pub_house='Humanitas')
+        cls.book.genre.set([cls.genre])
+        cls.status = Status.objects.create(book=cls.book, status='av')
+        cls.other = Book.objects.create(title='Luceafărul', pub_house='Polirom')
+        cls.other.genre.set([Genre.objects.create(name='Epică')])
+
+    def setUp(self):
+        cache.clear()
+        fragments.reset_stats()
+
+    def get(self, url_name, *args):
+        response = self.client.get(reverse(url_name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def assertStats(self, name, hits, misses):
+        stats = fragments.stats()
+        self.assertEqual((stats.get((name, 'hit'), 0), stats.get((name, 'miss'), 0)), (hits, misses))
+
+    def test_hit_is_shared_by_every_user(self):
+        anonymous = self.get('books:book_detail', self.book.pk)
+        self.client.login(username='reader', password='stgr4ao/56')
+        logged_in = self.get('books:book_detail', self.book.pk)
+        self.assertStats('book_detail', 1, 1)
+        #the user dependent parts are not in the fragment
+        self.assertIn('Ai uitat să te autentifici', anonymous)
+        self.assertNotIn('Ai uitat să te autentifici', logged_in)
+        self.assertIn('O vrei?', logged_in)
+        self.assertIn('Poezie', logged_in)
+
+    def test_writes_bump_only_the_pages_they_change(self):
+        self.get('books:book_detail', self.book.pk)
+
+        #another book's genres: this book page is still cached
+        time.sleep(0.001)
+        self.other.genre.clear()
+        self.get('books:book_detail', self.book.pk)
+        self.assertStats('book_detail', 1, 1)
+
+        #a status of the book
+        wishes.claim(self.status.pk, self.user)
+        self.get('books:book_detail', self.book.pk)
+        self.assertStats('book_detail', 1, 2)
+
+        #the genre name shown on the page
+        Genre.objects.filter(pk=self.genre.pk).update(name='Lirică', updated_at=timezone.now())
+        self.assertIn('Lirică', self.get('books:book_detail', self.book.pk))
+        self.assertStats('book_detail', 1, 3)
+
+    def test_list_pages(self):
+        self.get('books:books')
+        self.get('books:books')
+        self.get('books:available_books')
+        self.assertStats('book_list', 1, 2)
+
+        self.get('books:authors')
+        Author.objects.create(first_name='Ion', last_name='Creangă')
+        self.assertIn('Creangă', self.get('books:authors'))
+        self.assertStats('author_list', 0, 2)
+
+        self.get('books:author_detail', self.author.pk)
+        self.get('books:author_detail', self.author.pk)
+        self.book.title = 'Poezii alese'
+        self.book.save()
+        self.assertIn('Poezii alese', self.get('books:author_detail', self.author.pk))
+        self.assertStats('author_detail', 1, 2)
+
+    def test_other_parameters_share_the_fragment(self):
+        for query in ('', '?utm_source=x', '?utm_source=y&ref=z'):
+            self.client.get(reverse('books:books') + query)
+        self.client.get(reverse('books:books') + '?page=1')
+        self.assertStats('book_list', 2, 2)
+
+    def test_uncached_without_a_version(self):
+        html = fragments.get_or_render('test', None, [], lambda: 'fresh')
+        self.assertEqual(html, 'fresh')
+        self.assertEqual(fragments.stats(), {('test', 'uncached'): 1})
+
+
+class LRUCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = LRUCache('', {'OPTIONS': {'MAX_BYTES': 300}})
+
+    def test_evicts_the_least_recently_used(self):
+        for key in 'abc':
+            self.cache.set(key, 'x' * 80)
+        self.cache.get('a')
+        self.cache.set('d', 'x' * 80)
+        self.assertLessEqual(self.cache.bytes, 300)
+        self.assertEqual([key for key in 'abcd' if self.cache.has_key(key)], ['a', 'c', 'd'])
+
+    def test_replacing_a_value_frees_its_bytes(self):
+        self.cache.set('a', 'x' * 200)
+        self.cache.set('a', 'x' * 10)
+        self.cache.set('b', 'x' * 200)
+        self.assertEqual(self.cache.get('a'), 'x' * 10)
+        self.cache.delete('a')
+        self.cache.delete('b')
+        self.assertEqual(self.cache.bytes, 0)
+
+    def test_too_big_is_not_cached(self):
+        self.cache.set('a', 'x' * 1000)
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expiry_and_add(self):
+        self.cache.set('a', 1, timeout=0.01)
+        self.assertFalse(self.cache.add('a', 2))
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2))
+        self.assertEqual(self.cache.get_or_set('b', 3), 3)
+        self.assertEqual(self.cache.incr('b'), 4)
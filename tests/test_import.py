@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from books.importer import CatalogImporter, Checkpoint
+from books.models import Book, Author, Genre, Status
+
+
+#TransactionTestCase: the checkpoint is written when a chunk commits
+class ImportBooksTest(TransactionTestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='katte', password='stgr4ao/56')
+        self.author = Author.objects.create(first_name='Liviu', last_name='Rebreanu')
+        self.genre = Genre.objects.create(name='Roman')
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write('books.csv', (
+                'title,author_first_name,author_last_name,pub_house,category,genres,owner,status\n'
+                'Ion,Liviu,Rebreanu,Polirom,r,Roman;Clasic,katte,av\n'
+                'Răscoala,Liviu,Rebreanu,Minerva,roman,Roman,katte,gone\n'
+                'Poezii,Mihai,Eminescu,Humanitas,pz,,,\n'
+                ',Mihai,Eminescu,Humanitas,pz,,,\n'
+                'Enigma Otiliei,George,Călinescu,Litera,r,Roman,nobody,av\n'))
+        out, err = StringIO(), StringIO()
+        call_command('import_books', path, chunk_size=2, stdout=out, stderr=err)
+
+        self.assertIn('Imported 3 books, 2 records skipped.', out.getvalue())
+        self.assertIn('Record 4 skipped: title is required', err.getvalue())
+        self.assertIn("Record 5 skipped: unknown owner 'nobody'", err.getvalue())
+
+        ion = Book.objects.get(title='Ion')
+        self.assertEqual(ion.author, self.author)
+        self.assertEqual(ion.owner, self.owner)
+        self.assertEqual(sorted(genre.name for genre in ion.genre.all()), ['Clasic', 'Roman'])
+        self.assertEqual(Book.objects.get(title='Răscoala').category, 'r')
+        self.assertEqual(Author.objects.filter(last_name='Rebreanu').count(), 1)
+        self.assertEqual(Genre.objects.filter(name='Roman').count(), 1)
+        self.assertEqual(dict(Status.objects.values_list('book__title', 'status')),
+                         {'Ion': 'av', 'Răscoala': 'gone', 'Poezii': 'av'})
+        #no checkpoint left behind after a complete import
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_invalid_records(self):
+        records = [['Ion', 'Rebreanu'],
+                   {'title': 'x' * 201},
+                   {'title': 'Ion', 'author_first_name': 'L' * 101, 'author_last_name': 'Rebreanu'},
+                   {'title': 'Ion', 'genres': ['Roman', 'g' * 201]},
+                   {'title': 'Ion', 'pub_house': 'Polirom'}]
+        path = self.write('books.jsonl', ''.join(json.dumps(record) + '\n' for record in records))
+        out, err = StringIO(), StringIO()
+        call_command('import_books', path, stdout=out, stderr=err)
+
+        self.assertIn('Imported 1 books, 4 records skipped.', out.getvalue())
+        self.assertIn('Record 1 skipped: not a record: list', err.getvalue())
+        self.assertIn('Record 2 skipped: title longer than 200 characters', err.getvalue())
+        self.assertIn('Record 3 skipped: author_first_name longer than 100 characters', err.getvalue())
+        self.assertIn('Record 4 skipped: genres longer than 200 characters', err.getvalue())
+        self.assertEqual(list(Book.objects.values_list('title', 'pub_house')), [('Ion', 'Polirom')])
+
+    def test_resume_after_interruption(self):
+        records = [{'title': f'Book {i}', 'author_first_name': 'Mihai', 'author_last_name': 'Eminescu',
+                    'genres': ['Poezie']} for i in range(10)]
+        path = self.write('books.jsonl', ''.join(json.dumps(record) + '\n' for record in records))
+        checkpoint = Checkpoint(path + '.checkpoint')
+
+        def interrupted():
+            for number, record in enumerate(records, 1):
+                if number == 8:
+                    raise KeyboardInterrupt
+                yield record
+
+        with self.assertRaises(KeyboardInterrupt):
+            CatalogImporter(chunk_size=3, checkpoint=checkpoint).run(interrupted())
+        self.assertEqual(checkpoint.load(), 6)
+        self.assertEqual(Book.objects.count(), 6)
+
+        out = StringIO()
+        call_command('import_books', path, chunk_size=3, stdout=out)
+        self.assertIn('Resuming after record 6.', out.getvalue())
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)),
+                         sorted(record['title'] for record in records))
+        self.assertEqual(Author.objects.filter(last_name='Eminescu').count(), 1)
+        self.assertEqual(Book.genre.through.objects.count(), 10)
@@ -0,0 +1,52 @@
+import datetime
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, RequestFactory
+
+from books.models import Book, Status
+from books.views import BookListView, WishedBooksByUserListView, WishedBooksAllUsersListView
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class StatusIndexTest(TestCase):
+    """Checks that the Status lookups are answered from an index, without a sort"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wisher = User.objects.create_user(username='wisher', password='stgr4ao/56')
+        today = datetime.date.today()
+        for status_id in range(300):
+            book = Book.objects.create(title=f'Book {status_id}', pub_house='Polirom')
+            status = ('av', 'wished', 'gone')[status_id % 3]
+            Status.objects.create(book=book, status=status,
+                                  wisher=cls.wisher if status == 'wished' else None,
+                                  due_back=today + datetime.timedelta(days=status_id % 10))
+        #give the planner real statistics
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def view_queryset(self, view_class, **initkwargs):
+        request = RequestFactory().get('/')
+        request.user = self.wisher
+        view = view_class(**initkwargs)
+        view.setup(request)
+        return view.get_queryset()
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertRegex(plan, r'USING (COVERING )?INDEX books_\w+_idx', plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_available_count(self):
+        self.assertUsesIndex(Status.objects.filter(status__exact='av').values('pk'))
+
+    def test_wished_by_user(self):
+        self.assertUsesIndex(self.view_queryset(WishedBooksByUserListView))
+
+    def test_wished_all_users(self):
+        self.assertUsesIndex(self.view_queryset(WishedBooksAllUsersListView))
+
+    def test_available_books(self):
+        self.assertUsesIndex(self.view_queryset(BookListView, available_only=True))
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books import metrics
+from books.models import Book, Author, Genre
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'books.metrics.MetricsMiddleware'})
+@override_settings(BOOKS_METRICS_IPS=('127.0.0.1',))
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        cls.book = Book.objects.create(title='Poezii', author=author, pub_house='Humanitas')
+        cls.book.genre.set([Genre.objects.create(name='Poezie')])
+
+    def setUp(self):
+        metrics.registry.reset()
+
+    def scrape(self):
+        response = self.client.get(reverse('books:metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.client.get(reverse('books:book_detail', args=[self.book.pk]))
+        self.client.get(reverse('books:book_detail', args=[self.book.pk + 1]))
+        self.client.get('/nowhere/')
+        text = self.scrape()
+        self.assertIn('books_request_duration_seconds_count{view="books:book_detail"} 2', text)
+        self.assertIn('books_request_duration_seconds_bucket{view="books:book_detail",le="+Inf"} 2', text)
+        self.assertIn('books_requests_total{view="books:book_detail",status="200"} 1', text)
+        self.assertIn('books_requests_total{view="books:book_detail",status="404"} 1', text)
+        self.assertIn('books_requests_total{view="<unresolved>",status="404"} 1', text)
+        self.assertIn('# TYPE books_db_queries histogram', text)
+
+    def test_query_counts(self):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('books:authors'))
+        histogram = metrics.registry.histograms['books_db_queries']['books:authors']
+        self.assertEqual((histogram.count, histogram.sum), (1, len(captured)))
+        self.assertGreater(metrics.registry.histograms['books_db_duration_seconds']['books:authors'].sum, 0)
+
+    def test_duplicate_queries(self):
+        log = metrics.QueryLog()
+        log.queries = [('SELECT a WHERE id = %s', 0.1)] * 3 + [('SELECT b', 0.2)]
+        self.assertEqual(log.duplicates(), {'SELECT a WHERE id = %s': 3})
+        metrics.registry.record('books:books', 200, 0.5, 4, log.duration, 2)
+        self.assertIn('books_db_duplicate_queries_total{view="books:books"} 2', metrics.registry.render())
+
+    @override_settings(BOOKS_SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('books.metrics', 'WARNING') as logs:
+            self.client.get(reverse('books:book_detail', args=[self.book.pk]))
+        self.assertIn('(books:book_detail)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(BOOKS_SLOW_REQUEST_MS=0, BOOKS_SLOW_REQUEST_SAMPLE=0)
+    def test_slow_request_sampling(self):
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('books.metrics', 'WARNING'):
+                self.client.get(reverse('books:authors'))
+
+    def test_endpoint_access(self):
+        url = reverse('books:metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 403)
+        with self.settings(BOOKS_METRICS_IPS=()):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        User.objects.create_user(username='staff', password='bn56dpt^4d', is_staff=True)
+        self.client.login(username='staff', password='bn56dpt^4d')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.1').status_code, 200)
@@ -0,0 +1,119 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from books import notifications, wishes
+from books.models import Book, OutboxMessage, Status
+from books.sweeper import sweep_expired_wishes
+
+
+class CountingBackend(EmailBackend):
+    """locmem backend counting the connections opened"""
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class FailingBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError
+
+
+class RefusingBackend(EmailBackend):
+    """locmem backend refusing owner@example.com"""
+    def send_messages(self, messages):
+        if any('owner@example.com' in message.to for message in messages):
+            raise ConnectionRefusedError
+        return super().send_messages(messages)
+
+
+class NotificationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner', email='owner@example.com')
+        cls.wisher = User.objects.create_user(username='wisher', email='wisher@example.com')
+        cls.librarian = User.objects.create_superuser(
+                username='librarian', email='', password='bn56dpt^4d')
+        cls.statuses = []
+        for book_id in range(3):
+            book = Book.objects.create(title=f'Book {book_id}', pub_house='Polirom', owner=cls.owner)
+            cls.statuses.append(Status.objects.create(book=book, status='av'))
+
+    def test_request_path_only_queues(self):
+        self.assertTrue(wishes.claim(self.statuses[0].pk, self.wisher))
+        self.assertEqual(len(mail.outbox), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.event, message.wisher, message.sent_at), ('wished', self.wisher, None))
+
+    @override_settings(EMAIL_BACKEND='books.tests.test_notifications.CountingBackend')
+    def test_one_digest_per_recipient_over_one_connection(self):
+        for status in self.statuses:
+            wishes.claim(status.pk, self.wisher)
+        CountingBackend.opened = 0
+        with self.assertNumQueries(4):
+            self.assertEqual(notifications.send_pending(), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['owner@example.com', 'wisher@example.com'])
+        for message in mail.outbox:
+            self.assertEqual(len(message.body.splitlines()), 3)
+        self.assertFalse(OutboxMessage.objects.filter(sent_at=None).exists())
+
+        self.assertEqual(notifications.send_pending(), 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_batches(self):
+        for status in self.statuses:
+            wishes.claim(status.pk, self.wisher)
+        self.assertEqual(notifications.send_pending(batch_size=2), 3)
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_expired_wishes(self):
+        today = datetime.date.today()
+        wishes.claim(self.statuses[0].pk, self.wisher, today=today - datetime.timedelta(days=20))
+        sweep_expired_wishes(today)
+        self.assertEqual(list(OutboxMessage.objects.order_by('pk').values_list('event', flat=True)),
+                         ['wished', 'expired'])
+        notifications.send_pending()
+        self.assertIn('a expirat', mail.outbox[0].body)
+
+    def test_renewal(self):
+        wishes.claim(self.statuses[0].pk, self.wisher)
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+        self.client.post(reverse('books:renew_book_librarian', args=[self.statuses[0].pk]),
+                         {'due_back': due_back})
+        message = OutboxMessage.objects.get(event='renewed')
+        self.assertEqual((message.wisher, message.due_back), (self.wisher, due_back))
+        self.assertEqual(len(mail.outbox), 0)
+
+    @override_settings(EMAIL_BACKEND='books.tests.test_notifications.FailingBackend',
+                       BOOKS_MAIL_MAX_ATTEMPTS=2)
+    def test_failed_sends_are_retried_a_few_times(self):
+        wishes.claim(self.statuses[0].pk, self.wisher)
+        with self.assertLogs('books.notifications', 'ERROR'):
+            for attempt in range(3):
+                self.assertEqual(notifications.send_pending(), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.attempts, message.sent_at), (2, None))
+
+    @override_settings(EMAIL_BACKEND='books.tests.test_notifications.RefusingBackend')
+    def test_failed_digest_leaves_the_others_sent(self):
+        other = User.objects.create_user(username='other', email='other@example.com')
+        Book.objects.filter(pk=self.statuses[2].book_id).update(owner=other)
+        for status in self.statuses:
+            wishes.claim(status.pk, self.wisher)
+        #the first two batches fail for their owner, the third one is still sent
+        with self.assertLogs('books.notifications', 'ERROR'):
+            self.assertEqual(notifications.send_pending(batch_size=1), 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['other@example.com'] + ['wisher@example.com'] * 3)
+        self.assertEqual(list(OutboxMessage.objects.order_by('pk').values_list('attempts', 'sent_at')[:2]),
+                         [(1, None), (1, None)])
+        self.assertEqual(OutboxMessage.objects.filter(sent_at=None).count(), 2)
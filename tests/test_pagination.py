@@ -0,0 +1,89 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from books import counters
+from books.models import Book, Author, Status
+from books.pagination import KeysetPaginator
+
+
+@override_settings(BOOKS_KEYSET_PAGINATION=True)
+class KeysetPaginationViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        #45 authors, with duplicated first names to exercise the tie-breakers
+        for author_id in range(45):
+            Author.objects.create(
+                    first_name=f'Christian {author_id % 7}',
+                    last_name=f'surname {author_id}')
+
+    def walk(self, url_name, list_name):
+        seen = []
+        response = self.client.get(reverse(url_name))
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(response.context[list_name])
+            cursor = response.context['page_obj'].next_cursor
+            if not cursor:
+                return seen, response
+            response = self.client.get(reverse(url_name), {'cursor': cursor})
+
+    def test_walk_forward_matches_ordering(self):
+        seen, response = self.walk('books:authors', 'author_list')
+        self.assertEqual(seen, list(Author.objects.order_by('first_name', 'last_name', 'pk')))
+        self.assertEqual(response.context['page_obj'].number, 3)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_walk_back(self):
+        first = self.client.get(reverse('books:authors'))
+        second = self.client.get(reverse('books:authors'),
+                                 {'cursor': first.context['page_obj'].next_cursor})
+        back = self.client.get(reverse('books:authors'),
+                               {'cursor': second.context['page_obj'].previous_cursor})
+        self.assertEqual(list(back.context['author_list']), list(first.context['author_list']))
+        self.assertFalse(back.context['page_obj'].has_previous())
+        self.assertTrue(back.context['page_obj'].has_next())
+
+    def test_no_count_query(self):
+        counters.get_counts()
+        #the version token (books.versions), then the page
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('books:authors'))
+        self.assertTrue(response.context['is_paginated'])
+        self.assertContains(response, 'Page 1.')
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('books:authors'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginatorNullTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        wisher = User.objects.create_user(username='wisher', password='stgr4ao/56')
+        book = Book.objects.create(title='Good By!', pub_house='Polirom')
+        today = datetime.date.today()
+        for status_id in range(9):
+            due_back = None if status_id % 3 == 0 else today + datetime.timedelta(days=status_id % 4)
+            Status.objects.create(book=book, wisher=wisher, due_back=due_back, status='wished')
+
+    def test_nullable_ordering_is_walked_once(self):
+        paginator = KeysetPaginator(Status.objects.order_by('due_back'), 2)
+        seen = []
+        page = paginator.page()
+        seen.extend(page)
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(sorted(status.pk for status in seen),
+                         list(Status.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(len(seen), 9)
+
+        #and back again, page by page
+        back = []
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            back[:0] = list(page)
+        self.assertEqual(back, seen[:len(back)])
@@ -0,0 +1,157 @@
+import datetime
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from books import autocomplete, counters
+from books.models import Book, Author, Genre, Status
+
+
+class QueryCountTest(TestCase):
+    """Pins the number of queries for every url in books/urls.py.
+
+    The catalog is bigger than one page, so a lazy foreign key in a template
+    shows up here as a number that grows with the page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wisher = User.objects.create_user(username='wisher', password='stgr4ao/56')
+        cls.librarian = User.objects.create_superuser(
+                username='librarian', email='librarian@example.com', password='bn56dpt^4d')
+
+        genres = [Genre.objects.create(name=f'Genre {i}') for i in range(3)]
+        due_back = datetime.date.today() + datetime.timedelta(days=5)
+
+        for book_id in range(25):
+            author = Author.objects.create(first_name=f'John {book_id}', last_name='Smith')
+            book = Book.objects.create(
+                    title=f'Book {book_id}',
+                    summary='Abracadabra',
+                    pub_house='Polirom',
+                    author=author,
+                    owner=cls.librarian)
+            book.genre.set(genres)
+            Status.objects.create(book=book, wisher=cls.wisher, due_back=due_back, status='wished')
+            Status.objects.create(book=book, status='av')
+
+        cls.book = Book.objects.first()
+        cls.author = cls.book.author
+        cls.status = Status.objects.filter(book=cls.book, status='wished').first()
+
+    def setUp(self):
+        #the list pages read the totals from the cache for their version token
+        counters.get_counts()
+
+    def assertQueries(self, num, url_name, **kwargs):
+        with self.assertNumQueries(num):
+            response = self.client.get(reverse(url_name, kwargs=kwargs or None))
+        self.assertEqual(response.status_code, 200)
+
+    def test_index(self):
+        #the totals come from the cache once it is warm, visits are not in the session
+        cache.clear()
+        self.client.get(reverse('books:index'))
+        self.assertQueries(0, 'books:index')
+
+    def test_book_list(self):
+        #two max(updated_at) for the version token, then count and page
+        self.assertQueries(4, 'books:books')
+
+    def test_available_book_list(self):
+        self.assertQueries(4, 'books:available_books')
+
+    def test_browse(self):
+        #four facet counts, genre and owner names, then the page
+        self.assertQueries(7, 'books:browse')
+
+    def test_owner_books(self):
+        #the owner, then as books:books
+        self.assertQueries(5, 'books:owner_books', username='librarian')
+
+    def test_owner_dashboard(self):
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        #session, user, owner, shelf version, then the statistics, overdue wishes, top genres and their names
+        self.assertQueries(8, 'books:owner_dashboard', username='librarian')
+        #cached until the shelf changes: only the version is read
+        self.assertQueries(4, 'books:owner_dashboard', username='librarian')
+
+    def test_book_detail(self):
+        self.assertQueries(5, 'books:book_detail', pk=self.book.pk)
+
+    def test_search(self):
+        #two lookups in the index, then the matching books in bulk
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('books:search'), {'q': 'book smith'})
+        self.assertEqual(len(response.context['book_list']), 25)
+
+    def test_autocomplete(self):
+        #served from the in-process index once it is built
+        autocomplete.books.reset()
+        self.client.get(reverse('books:autocomplete'), {'q': 'bo'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('books:autocomplete'), {'q': 'book 1'})
+        self.assertEqual(len(response.json()['books']), 10)
+
+    def test_export(self):
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        #session, user, then books and genres in one chunk
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('books:export', args=['csv']))
+            content = b''.join(response.streaming_content)
+        self.assertEqual(len(content.splitlines()), 26)
+
+    def test_api(self):
+        #the books, then the genres of the page
+        self.assertQueries(2, 'books:api', resource='books')
+
+    @override_settings(BOOKS_METRICS_IPS=('127.0.0.1',))
+    def test_metrics(self):
+        self.assertQueries(0, 'books:metrics')
+
+    def test_cover(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            key = '0123456789abcdef' * 2
+            default_storage.save(f'covers/{key}/list-80x120.webp', ContentFile(b'RIFF'))
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('books:cover', args=[key, 'list-80x120.webp']))
+            response.close()
+        self.assertEqual(response.status_code, 200)
+
+    def test_author_list(self):
+        self.assertQueries(3, 'books:authors')
+
+    def test_author_detail(self):
+        self.assertQueries(3, 'books:author_detail', pk=self.author.pk)
+
+    def test_wished_by_user(self):
+        self.client.login(username='wisher', password='stgr4ao/56')
+        self.assertQueries(4, 'books:my_wished')
+
+    def test_wished_all_users(self):
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        self.assertQueries(4, 'books:myview')
+
+    def test_renew_book_librarian(self):
+        self.client.login(username='librarian', password='bn56dpt^4d')
+        self.assertQueries(5, 'books:renew_book_librarian', pk=self.status.pk)
+
+    def test_status(self):
+        self.client.login(username='wisher', password='stgr4ao/56')
+        self.assertQueries(3, 'books:status', pk=self.status.pk)
+
+    def test_author_create(self):
+        self.assertQueries(0, 'books:author_create')
+
+    def test_author_update(self):
+        self.assertQueries(1, 'books:author_update', pk=self.author.pk)
+
+    def test_author_delete(self):
+        self.assertQueries(1, 'books:author_delete', pk=self.author.pk)
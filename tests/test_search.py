@@ -0,0 +1,72 @@
+import unittest
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from books import search
+from books.models import Book, Author
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'the FTS5 index only exists on SQLite')
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rebreanu = Author.objects.create(first_name='Liviu', last_name='Rebreanu')
+        cls.blecher = Author.objects.create(first_name='Max', last_name='Blecher')
+        cls.padurea = Book.objects.create(
+                title='Pădurea spânzuraţilor', author=cls.rebreanu, pub_house='Minerva',
+                summary='Apostol Bologa, ofițer în armata austro-ungară.')
+        cls.ion = Book.objects.create(
+                title='Ion', author=cls.rebreanu, pub_house='Polirom',
+                summary='Satul ardelenesc și pădurea de la marginea lui.')
+        cls.intamplari = Book.objects.create(
+                title='Întâmplări în irealitatea imediată', author=cls.blecher, pub_house='Humanitas')
+
+    def test_diacritic_insensitive(self):
+        books, authors = search.search('spanzuratilor')
+        self.assertEqual(books, [self.padurea])
+        books, authors = search.search('intamplari')
+        self.assertEqual(books, [self.intamplari])
+
+    def test_title_ranks_above_summary(self):
+        books, authors = search.search('padurea')
+        self.assertEqual(books, [self.padurea, self.ion])
+
+    def test_author_name_and_prefix(self):
+        books, authors = search.search('rebr')
+        self.assertEqual(authors, [self.rebreanu])
+        self.assertEqual(set(books), {self.padurea, self.ion})
+
+    def test_user_input_is_not_fts_syntax(self):
+        self.assertEqual(search.search('"ion* ('), ([self.ion], []))
+
+    def test_index_follows_writes(self):
+        blecher = Author.objects.get(pk=self.blecher.pk)
+        blecher.last_name = 'Blecher-Weinberg'
+        blecher.save()
+        self.assertEqual(search.search('weinberg'), ([self.intamplari], [blecher]))
+
+        Book.objects.get(pk=self.ion.pk).delete()
+        self.assertEqual(search.search('ion'), ([], []))
+
+        Author.objects.get(pk=self.rebreanu.pk).delete()
+        self.assertEqual(search.search('rebreanu'), ([], []))
+        self.assertEqual(search.search('padurea'), ([self.padurea], []))
+
+    def test_rebuild(self):
+        search.get_backend().clear()
+        self.assertEqual(search.search('ion'), ([], []))
+        out = StringIO()
+        call_command('rebuild_search_index', chunk_size=2, stdout=out)
+        self.assertIn('Indexed 3 books and 2 authors.', out.getvalue())
+        self.assertEqual(search.search('ion'), ([self.ion], []))
+
+    def test_view(self):
+        response = self.client.get(reverse('books:search'), {'q': 'blecher'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'books/search.html')
+        self.assertEqual(response.context['book_list'], [self.intamplari])
+        self.assertContains(response, 'Max Blecher')
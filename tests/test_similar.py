@@ -0,0 +1,130 @@
+import random
+import unittest
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from books import similar, wishes
+from books.models import Book, Author, Genre, Status, SimilarBook, SimilarBooksRun
+
+
+@unittest.skipUnless(similar.available(), 'NumPy and SciPy are not installed')
+class SimilarBooksTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.poetry = Genre.objects.create(name='Poezie')
+        cls.prose = Genre.objects.create(name='Proză')
+        cls.drama = Genre.objects.create(name='Teatru')
+        cls.eminescu = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        cls.preda = Author.objects.create(first_name='Marin', last_name='Preda')
+
+    def book(self, title, author=None, genres=(), category='', wishers=()):
+        book = Book.objects.create(title=title, author=author, pub_house='Polirom', category=category)
+        book.genre.set(genres)
+        for wisher in wishers:
+            Status.objects.create(book=book, status='wished', wisher=wisher)
+        return book
+
+    def lists(self):
+        """{book: [(similar, score)]} as stored"""
+        lists = {}
+        for row in SimilarBook.objects.order_by('book', 'rank'):
+            lists.setdefault(row.book_id, []).append((row.similar_id, round(row.score, 5)))
+        return lists
+
+    def test_build(self):
+        poems = self.book('Poezii', self.eminescu, [self.poetry], 'pz')
+        same_author = self.book('Luceafărul', self.eminescu, [self.poetry], 'pz')
+        same_genre = self.book('Flori de mucigai', None, [self.poetry], 'pz')
+        self.book('Moromeții', self.preda, [self.prose], 'r')
+        result = similar.build()
+        self.assertEqual(result['books'], 4)
+        lists = self.lists()
+        #same author, genre and category, then same genre and category; nothing in common is left out
+        self.assertEqual(lists[poems.pk], [(same_author.pk, 0.75), (same_genre.pk, 0.5)])
+        self.assertEqual([pk for pk, score in lists[same_genre.pk]], [poems.pk, same_author.pk])
+
+    def test_wishes(self):
+        other = User.objects.create_user(username='other')
+        play = self.book('O scrisoare pierdută', None, [self.drama], 't', [self.reader])
+        novel = self.book('Moromeții', self.preda, [self.prose], 'r', [self.reader, other])
+        self.book('Poezii', self.eminescu, [self.poetry], 'pz', [other])
+        similar.build()
+        #the users who wished the play also wished the novel: the cosine of their wishers is 1/sqrt(2)
+        self.assertEqual(self.lists()[play.pk], [(novel.pk, round(0.25 / 2 ** 0.5, 5))])
+
+    def test_past_wishes(self):
+        first = self.book('Ion', None, [self.prose], 'r')
+        second = self.book('Baltagul', None, [self.drama], 't')
+        copies = [Status.objects.create(book=book, status='av') for book in (first, second)]
+        for copy in copies:
+            wishes.claim(copy.pk, self.reader)
+            wishes.release(copy.pk, self.reader)
+        similar.build()
+        #released, the copies forget the wisher; the outbox remembers
+        self.assertEqual(self.lists()[first.pk], [(second.pk, 0.25)])
+
+    def test_refresh_matches_build(self):
+        rnd = random.Random(1)
+        genres = [self.poetry, self.prose, self.drama] + [Genre.objects.create(name=f'Gen {i}') for i in range(5)]
+        authors = [self.eminescu, self.preda, None]
+        users = [User.objects.create_user(username=f'user{i}') for i in range(6)]
+
+        def add(i):
+            return self.book(f'Carte {i}', rnd.choice(authors), rnd.sample(genres, rnd.randint(1, 3)),
+                             rnd.choice(['', 'r', 'pz']), rnd.sample(users, rnd.randint(0, 2)))
+
+        books = [add(i) for i in range(40)]
+        similar.build(k=3)
+        self.assertEqual(similar.refresh(k=3)['changed'], 0)
+
+        books[0].genre.set([genres[-1]])
+        Status.objects.create(book=books[1], status='wished', wisher=users[0])
+        books[2].author = self.preda
+        books[2].save()
+        add(40)
+        result = similar.refresh(k=3)
+        self.assertEqual(result['changed'], 4)
+        refreshed = self.lists()
+        similar.build(k=3)
+        built = self.lists()
+        #the same scores, the books on a tie may differ
+        self.assertEqual({book: [score for pk, score in rows] for book, rows in refreshed.items()},
+                         {book: [score for pk, score in rows] for book, rows in built.items()})
+
+    def test_refresh_without_lists(self):
+        for i in range(4):
+            self.book(f'Poezii {i}', self.eminescu, [self.poetry], 'pz')
+        loner = self.book('Moromeții', self.preda, [self.prose], 'r')
+        similar.build()
+        loner.title = 'Moromeții, vol. 1'
+        loner.save()
+        #nothing in common with the others: no list to write, the run is recorded all the same
+        self.assertEqual(similar.refresh()['changed'], 1)
+        self.assertFalse(SimilarBook.objects.filter(book=loner).exists())
+        self.assertEqual(similar.refresh()['changed'], 0)
+        self.assertEqual(SimilarBooksRun.objects.count(), 2)
+
+    def test_book_page(self):
+        poems = self.book('Poezii', self.eminescu, [self.poetry], 'pz')
+        first = self.book('Flori de mucigai', None, [self.poetry], 'pz')
+        self.book('Luceafărul', self.eminescu, [self.poetry], 'pz')
+        url = reverse('books:book_detail', kwargs={'pk': poems.pk})
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Ți-ar mai putea plăcea')
+        etag = response['ETag']
+
+        similar.build()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ți-ar mai putea plăcea')
+        self.assertContains(response, 'Luceafărul')
+
+        #deleting the older of the two similar books leaves every timestamp as it was
+        etag = response['ETag']
+        first.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Flori de mucigai')
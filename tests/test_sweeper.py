@@ -0,0 +1,78 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from books.models import Book, OutboxMessage, Status
+from books.signals import wishes_expired
+from books.sweeper import sweep_expired_wishes
+
+
+class SweeperTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.wisher = User.objects.create_user(username='wisher', password='stgr4ao/56')
+        cls.today = datetime.date.today()
+        cls.book = Book.objects.create(title='Good By!', pub_house='Polirom')
+        for days in range(-5, 5):
+            Status.objects.create(book=cls.book, wisher=cls.wisher, status='wished',
+                                  due_back=cls.today + datetime.timedelta(days=days))
+        #not wished: never released, however old
+        Status.objects.create(book=cls.book, status='gone',
+                              due_back=cls.today - datetime.timedelta(days=30))
+
+    def setUp(self):
+        self.events = []
+        handler = lambda sender, wishes, **kwargs: self.events.append(wishes)
+        wishes_expired.connect(handler)
+        self.addCleanup(wishes_expired.disconnect, handler)
+
+    def test_releases_expired_wishes_in_batches(self):
+        #three batches of at most two: one update each
+        with CaptureQueriesContext(connection) as captured:
+            released = sweep_expired_wishes(batch_size=2)
+        updates = [query for query in captured if query['sql'].startswith('UPDATE "books_status"')]
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(released, 5)
+        self.assertEqual(Status.objects.filter(status='av').count(), 5)
+        self.assertFalse(Status.objects.filter(status='av').exclude(wisher=None).exists())
+        self.assertEqual(Status.objects.expired().count(), 0)
+        self.assertEqual(Status.objects.filter(status='wished').count(), 5)
+        self.assertEqual(Status.objects.filter(status='gone').count(), 1)
+
+        #one event for the whole run
+        self.assertEqual(len(self.events), 1)
+        self.assertEqual(len(self.events[0]), 5)
+        self.assertEqual({wish['wisher'] for wish in self.events[0]}, {self.wisher.pk})
+
+    def test_notifications_are_queued_with_each_batch(self):
+        #a crash once the batches are committed, before the event is sent
+        with mock.patch.object(wishes_expired, 'send', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                sweep_expired_wishes(batch_size=2)
+        self.assertEqual(OutboxMessage.objects.filter(event='expired', wisher=self.wisher).count(), 5)
+
+    def test_nothing_to_release(self):
+        sweep_expired_wishes()
+        self.events.clear()
+        self.assertEqual(sweep_expired_wishes(), 0)
+        self.assertEqual(self.events, [])
+
+    def test_command(self):
+        out = StringIO()
+        later = (self.today + datetime.timedelta(days=3)).isoformat()
+        call_command('sweep_wishes', today=datetime.date.fromisoformat(later), stdout=out)
+        self.assertIn('Released 8 expired wishes.', out.getvalue())
+
+    def test_overdue_annotation_in_list(self):
+        self.client.login(username='wisher', password='stgr4ao/56')
+        response = self.client.get(reverse('books:my_wished'))
+        overdue = [status.overdue for status in response.context['status_list']]
+        self.assertEqual(overdue, [status.is_overdue for status in response.context['status_list']])
+        self.assertEqual(overdue.count(True), 5)
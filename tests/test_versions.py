@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from books import counters, wishes
+from books.models import Book, Author, Genre, Status
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='reader', password='stgr4ao/56')
+        cls.genre = Genre.objects.create(name='Poezie')
+        cls.author = Author.objects.create(first_name='Mihai', last_name='Eminescu')
+        cls.book = Book.objects.create(title='Poezii', author=cls.author, pub_house='Humanitas')
+        cls.book.genre.set([cls.genre])
+        cls.status = Status.objects.create(book=cls.book, status='av')
+
+    def setUp(self):
+        counters.get_counts()
+
+    def urls(self):
+        return [reverse('books:books'), reverse('books:book_detail', args=[self.book.pk]),
+                reverse('books:authors'), reverse('books:author_detail', args=[self.author.pk])]
+
+    def etags(self):
+        return {url: self.client.get(url)['ETag'] for url in self.urls()}
+
+    def test_not_modified(self):
+        for url, etag in self.etags().items():
+            #a deleted row moves no timestamp: no Last-Modified to answer If-Modified-Since with
+            self.assertFalse(self.client.get(url).has_header('Last-Modified'), url)
+            #answered from the version token alone
+            with self.assertNumQueries(1 if 'author' in url or 'book/' in url else 2):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Mon, 01 Jan 2024 00:00:00 GMT')
+            self.assertEqual(response.status_code, 200, url)
+
+    def assertChanged(self, before, *urls):
+        after = self.etags()
+        for url in self.urls():
+            if url in urls:
+                self.assertNotEqual(before[url], after[url], url)
+            else:
+                self.assertEqual(before[url], after[url], url)
+
+    def test_claim_changes_the_book(self):
+        before = self.etags()
+        wishes.claim(self.status.pk, User.objects.get(username='reader'))
+        self.assertChanged(before, reverse('books:books'), reverse('books:book_detail', args=[self.book.pk]),
+                           reverse('books:author_detail', args=[self.author.pk]))
+
+    def test_genres_change_the_book(self):
+        before = self.etags()
+        book = Book.objects.get(pk=self.book.pk)
+        book.genre.add(Genre.objects.create(name='Roman'))
+        self.assertChanged(before, reverse('books:books'), reverse('books:book_detail', args=[self.book.pk]),
+                           reverse('books:author_detail', args=[self.author.pk]))
+        before = self.etags()
+        genre = Genre.objects.get(name='Roman')
+        genre.name = 'Romane'
+        genre.save()
+        self.assertChanged(before, reverse('books:book_detail', args=[self.book.pk]))
+
+    def test_author_change(self):
+        before = self.etags()
+        Author.objects.get(pk=self.author.pk).save()
+        self.assertChanged(before, *self.urls())
+
+    def test_depends_on_the_user(self):
+        before = self.etags()
+        self.client.login(username='reader', password='stgr4ao/56')
+        self.assertChanged(before, *self.urls())
+
+    def test_deleted_book(self):
+        other = Book.objects.create(title='Proza', author=self.author, pub_house='Humanitas')
+        before = self.etags()
+        other.delete()
+        #no timestamp moves, the number of books of the author does
+        self.assertNotEqual(before[reverse('books:author_detail', args=[self.author.pk])],
+                            self.etags()[reverse('books:author_detail', args=[self.author.pk])])
+
+    def test_deleted_author(self):
+        author = Author.objects.create(first_name='Ion', last_name='Creangă')
+        Book.objects.create(title='Amintiri din copilărie', author=author, pub_house='Humanitas')
+        #neither the newest author nor the newest book is the one deleted
+        Author.objects.get(pk=self.author.pk).save()
+        Book.objects.get(pk=self.book.pk).save()
+        url = reverse('books:books')
+        etag = self.client.get(url)['ETag']
+        #the book loses its author without its updated_at moving
+        author.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Creangă')
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from books.visits import VisitCounter, VISITOR_COOKIE, visit_counter
+
+
+class VisitCounterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_increments_are_buffered_until_flush(self):
+        counter = VisitCounter(flush_interval=3600, max_pending=100)
+        for expected in range(5):
+            self.assertEqual(counter.hit('reader'), expected)
+        self.assertIsNone(cache.get('books:visits:reader'))
+
+        counter.flush()
+        self.assertEqual(cache.get('books:visits:reader'), 5)
+        self.assertEqual(counter.hit('reader'), 5)
+
+    def test_flushes_when_buffer_is_full(self):
+        counter = VisitCounter(flush_interval=3600, max_pending=3)
+        for visitor in ('a', 'b', 'c'):
+            counter.hit(visitor)
+        self.assertEqual(cache.get_many(['books:visits:a', 'books:visits:c']),
+                         {'books:visits:a': 1, 'books:visits:c': 1})
+
+    def test_flushes_from_several_counters_add_up(self):
+        first, second = VisitCounter(flush_interval=3600), VisitCounter(flush_interval=3600)
+        first.hit('reader')
+        second.hit('reader')
+        second.hit('reader')
+        first.flush()
+        second.flush()
+        self.assertEqual(cache.get('books:visits:reader'), 3)
+
+
+@override_settings(BOOKS_VISITS_FLUSH_INTERVAL=3600)
+class IndexVisitsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        visit_counter.flush()
+
+    def test_counts_visits_without_a_session(self):
+        response = self.client.get(reverse('books:index'))
+        self.assertEqual(response.context['num_visits'], 0)
+        self.assertIn(VISITOR_COOKIE, response.cookies)
+        self.assertNotIn('sessionid', response.cookies)
+
+        for expected in range(1, 4):
+            response = self.client.get(reverse('books:index'))
+            self.assertEqual(response.context['num_visits'], expected)
+            self.assertNotIn('sessionid', response.cookies)
+
+    def test_forged_cookie_is_a_new_visitor(self):
+        self.client.cookies[VISITOR_COOKIE] = 'reader'
+        response = self.client.get(reverse('books:index'))
+        self.assertEqual(response.context['num_visits'], 0)
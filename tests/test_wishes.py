@@ -0,0 +1,113 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from books import wishes
+from books.models import Book, Author, Status
+
+
+class WishTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user(username='first', password='stgr4ao/56')
+        cls.second = User.objects.create_user(username='second', password='bn56dpt^4d')
+        author = Author.objects.create(first_name='John', last_name='Smith')
+        cls.book = Book.objects.create(title='Good By!', author=author, pub_house='Polirom')
+        cls.status = Status.objects.create(book=cls.book, status='av')
+
+    def test_second_claim_fails(self):
+        self.assertTrue(wishes.claim(self.status.pk, self.first))
+        self.assertFalse(wishes.claim(self.status.pk, self.second))
+        status = Status.objects.get(pk=self.status.pk)
+        self.assertEqual((status.status, status.wisher), ('wished', self.first))
+
+    def test_only_the_wisher_releases(self):
+        wishes.claim(self.status.pk, self.first)
+        self.assertFalse(wishes.release(self.status.pk, self.second))
+        self.assertTrue(wishes.release(self.status.pk, self.first))
+        self.assertEqual(Status.objects.get(pk=self.status.pk).status, 'av')
+
+    def test_claim_book_takes_the_next_copy(self):
+        copy = Status.objects.create(book=self.book, status='av')
+        self.assertEqual(wishes.claim_book(self.book.pk, self.first), self.status.pk)
+        self.assertEqual(wishes.claim_book(self.book.pk, self.second), copy.pk)
+        self.assertIsNone(wishes.claim_book(self.book.pk, self.second))
+
+    def test_wish_book_view(self):
+        self.client.login(username='first', password='stgr4ao/56')
+        response = self.client.post(reverse('books:status', args=[self.status.pk]), {'status': 'wished'})
+        self.assertRedirects(response, reverse('books:my_wished'))
+
+        self.client.login(username='second', password='bn56dpt^4d')
+        response = self.client.post(reverse('books:status', args=[self.status.pk]), {'status': 'wished'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Cartea a fost deja dorită de altcineva.')
+        self.assertEqual(Status.objects.get(pk=self.status.pk).wisher, self.first)
+
+    def test_wish_from_book_page(self):
+        self.client.login(username='first', password='stgr4ao/56')
+        response = self.client.post(reverse('books:book_detail', args=[self.book.pk]), {'status': 'wished'})
+        self.assertRedirects(response, reverse('books:book_detail', args=[self.book.pk]))
+        self.assertEqual(Status.objects.get(pk=self.status.pk).wisher, self.first)
+
+        response = self.client.post(reverse('books:book_detail', args=[self.book.pk]), {'status': 'wished'})
+        self.assertContains(response, 'Nu mai e nici un exemplar disponibil.')
+
+    def test_anonymous_post_goes_to_login(self):
+        response = self.client.post(reverse('books:status', args=[self.status.pk]), {'status': 'wished'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response.url)
+        self.assertEqual(Status.objects.get(pk=self.status.pk).status, 'av')
+
+
+class ConcurrentClaimTest(TransactionTestCase):
+    """Hundreds of users claim the same copy at the same moment: exactly one wins"""
+    claims = 300
+
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(self.claims)])
+        self.users = list(User.objects.order_by('pk'))
+        book = Book.objects.create(title='Good By!', pub_house='Polirom')
+        self.status = Status.objects.create(book=book, status='av')
+
+    #a claim tries this many times while the database is locked, this long apart
+    tries = 500
+    pause = 0.01
+
+    def test_exactly_one_winner(self):
+        start = threading.Barrier(self.claims, timeout=30)
+        results = []
+
+        def claim(user):
+            try:
+                start.wait()
+                #the in-memory test database locks whole tables and fails at
+                #once instead of waiting: try again, as a busy timeout would
+                for attempt in range(self.tries):
+                    try:
+                        results.append((user, wishes.claim(self.status.pk, user)))
+                        break
+                    except OperationalError as e:
+                        if 'locked' not in str(e):
+                            raise
+                        time.sleep(self.pause)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=[user]) for user in self.users]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 60
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        self.assertFalse(any(thread.is_alive() for thread in threads), 'claims still running after 60s')
+
+        winners = [user for user, won in results if won]
+        self.assertEqual(len(results), self.claims)
+        self.assertEqual(len(winners), 1)
+        status = Status.objects.get(pk=self.status.pk)
+        self.assertEqual((status.status, status.wisher), ('wished', winners[0]))
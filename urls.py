@@ -1,16 +1,26 @@
 from django.urls import path
 from django.conf import settings
 
-from .import views
+from .import api, covers, metrics, views
 
 app_name = 'books'
 
 urlpatterns =[
         path('', views.index, name='index'),
         path('books/', views.BookListView.as_view(), name='books'),
+        path('books/available/', views.BookListView.as_view(available_only=True), name='available_books'),
+        path('browse/', views.BookBrowseView.as_view(), name='browse'),
+        path('owner/<str:username>/', views.OwnerBookListView.as_view(), name='owner_books'),
+        path('owner/<str:username>/dashboard/', views.owner_dashboard, name='owner_dashboard'),
         path('book/<int:pk>/', views.BookDetail.as_view(), name='book_detail'),
         path('authors/', views.AuthorListView.as_view(), name='authors'),
-        path('author/<int:pk>/', views.AuthorDetailView.as_view(), name='author_detail'),]
+        path('author/<int:pk>/', views.AuthorDetailView.as_view(), name='author_detail'),
+        path('search/', views.search_catalog, name='search'),
+        path('autocomplete/', views.autocomplete_catalog, name='autocomplete'),
+        path('export/catalog.<str:format>', views.export_catalog, name='export'),
+        path('api/<slug:resource>/', api.resource_list, name='api'),
+        path('metrics/', metrics.metrics, name='metrics'),
+        path('covers/<str:key>/<str:name>', covers.serve, name='cover'),]
 
 
 urlpatterns += [
@@ -0,0 +1,74 @@
+"""Validators for the conditional GETs of the catalog pages.
+
+Each page gets a version token built from the updated_at of what it shows,
+read with one or two small indexed queries and no rendering. conditional()
+turns it into an ETag, so a repeat visit answers 304 before the view runs
+its own queries. The pages greet the user by name, so the ETag includes who
+is asking; state() is the version without the user, for books.fragments.
+There is no Last-Modified: a deleted row or another user changes the page
+without moving any timestamp."""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from . import counters
+from .models import Book, Author
+
+
+def _version(request, name, *parts):
+    """The ETag of the page name showing data as of parts"""
+    #the same for every user: books.fragments keys the cached parts of the page on it
+    request._books_state = ':'.join(map(str, (name,) + parts))
+    key = f'{request._books_state}:{request.user.pk}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def state(request):
+    """The version of the data on the page, once the conditional GET has read it, else None"""
+    return getattr(request, '_books_state', None)
+
+
+def book_list(request, *args, **kwargs):
+    #a deleted book changes no timestamp, but it changes the total; the books of a
+    #deleted author are touched (books.signals)
+    books = Book.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+    authors = Author.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+    return _version(request, 'book_list', books, authors, counters.get_counts()['books'])
+
+
+def book_detail(request, pk):
+    #the statuses touch the book (BookQuerySet.refresh_availability), the genres and the
+    #similar books are read here; a deleted similar book changes no timestamp, only the count
+    row = (Book.objects.filter(pk=pk)
+           .annotate(genres_updated_at=Max('genre__updated_at'), genres=Count('genre', distinct=True),
+                     similar_at=Max('similar_books__computed_at'),
+                     similar=Count('similar_books', distinct=True),
+                     similar_updated_at=Max('similar_books__similar__updated_at'))
+           .values_list('updated_at', 'author__updated_at', 'genres_updated_at', 'genres',
+                        'similar_at', 'similar', 'similar_updated_at')
+           .first())
+    if row is None:
+        return None
+    return _version(request, 'book_detail', pk, *row)
+
+
+def author_list(request, *args, **kwargs):
+    authors = Author.objects.aggregate(updated_at=Max('updated_at'))['updated_at']
+    return _version(request, 'author_list', authors, counters.get_counts()['authors'])
+
+
+def author_detail(request, pk):
+    row = (Author.objects.filter(pk=pk)
+           .annotate(books_updated_at=Max('book__updated_at'), books=Count('book'))
+           .values_list('updated_at', 'books_updated_at', 'books')
+           .first())
+    if row is None:
+        return None
+    return _version(request, 'author_detail', pk, *row)
+
+
+def conditional(version):
+    """django.views.decorators.http.condition() with the ETag of version"""
+    return condition(etag_func=version)
@@ -1,30 +1,40 @@
 import datetime
 
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect, HttpResponseForbidden
+from django.http import HttpResponseRedirect, HttpResponseForbidden, StreamingHttpResponse, Http404, JsonResponse
 from django.urls import reverse
 from django.views import generic, View
 from django.forms import formset_factory
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.http import urlencode
 
-from .models import Book, Author, Genre, Status
+from .models import Book, Author, Genre, Status, SimilarBook
+from . import autocomplete, counters, dashboard, exporter, facets, notifications, search, versions, visits, wishes
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib.auth.decorators import permission_required
+from django.utils.decorators import method_decorator
 
 from django.views.generic import DetailView
 from django.views.generic import FormView
 from django.views.generic.detail import SingleObjectMixin
 
 from books.forms import RenewBookModelForm, WishBookModelForm
+from books.pagination import KeysetPaginationMixin
 # Create your views here.
 
 def index(request):
     
-    num_books = Book.objects.all().count()
-    num_authors = Author.objects.all().count()
-    num_available_books = Status.objects.filter(status__exact = 'av').count()
-    num_visits = request.session.get('num_visits', 0)
-    request.session['num_visits'] = num_visits+1
+    #the totals come from the cache, kept up to date by books.signals
+    counts = counters.get_counts()
+    num_books = counts['books']
+    num_authors = counts['authors']
+    num_available_books = counts['available']
+    #visits are counted in a buffer keyed by a visitor cookie, not in the session
+    num_visits, new_visitor = visits.count_visit(request)
     
     context = {
             'num_books': num_books,
@@ -32,14 +42,93 @@ def index(request):
             'num_available_books': num_available_books,
             'num_visits': num_visits}
     
-    return render(request, 'books/index.html', context=context)
+    response = render(request, 'books/index.html', context=context)
+    if new_visitor:
+        visits.set_visitor_cookie(response, new_visitor)
+    return response
 
 
-class BookListView(generic.ListView):
+#the catalog pages answer 304 from their version token, before any of their own queries
+@method_decorator(versions.conditional(versions.book_list), name='get')
+class BookListView(KeysetPaginationMixin, generic.ListView):
     model = Book
     template_name = 'books/book_list.html'
     paginate_by = 20
-    
+    #only the books with an available copy, read from Book.current_status
+    available_only = False
+
+    def get_queryset(self):
+        #the template prints book.author on every row
+        queryset = Book.objects.select_related('author').order_by('pk')
+        if self.available_only:
+            queryset = queryset.available()
+        return queryset
+
+
+class OwnerBookListView(BookListView):
+    """One owner's shelf, read from the (owner, id) index"""
+
+    def get(self, request, *args, **kwargs):
+        self.owner = get_object_or_404(User, username=kwargs['username'])
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(owner=self.owner)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['owner'] = self.owner
+        return context
+
+
+#owners see their own dashboard, librarians everyone's
+@login_required
+def owner_dashboard(request, username):
+    owner = get_object_or_404(User, username=username)
+    if owner != request.user and not request.user.has_perm('books.can_mark_wished'):
+        return HttpResponseForbidden()
+    return render(request, 'books/owner_dashboard.html',
+                  context={'owner': owner, 'stats': dashboard.stats(owner)})
+
+
+class BookBrowseView(KeysetPaginationMixin, generic.ListView):
+    """The catalog filtered by any combination of facets, with the counts of books.facets"""
+    model = Book
+    template_name = 'books/browse.html'
+    paginate_by = 20
+    facet_names = (('genre', 'Gen'), ('category', 'Categorie'), ('owner', 'Posesor'), ('status', 'Status'))
+
+    def get(self, request, *args, **kwargs):
+        self.filters = facets.parse_filters(request.GET)
+        self.facet_counts, self.total = facets.counts(self.filters)
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        return facets.filter_books(Book.objects.select_related('author'), self.filters).order_by('pk')
+
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        #the facet counts know the total already: no COUNT(*) of the books
+        paginator.count = self.total
+        return paginator
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        facet_list = []
+        for facet, title in self.facet_names:
+            values = []
+            for value, label, count in self.facet_counts[facet]:
+                selected = self.filters.get(facet) == value
+                #a link to the selected value removes it from the filters
+                filters = {name: current for name, current in self.filters.items() if name != facet}
+                if not selected:
+                    filters[facet] = value
+                values.append({'label': label, 'count': count, 'selected': selected,
+                               'query': urlencode(filters)})
+            facet_list.append((title, values))
+        context.update(facet_list=facet_list, total=self.total, filter_query=urlencode(self.filters))
+        return context
+
 """
 class BookDetailView(generic.DetailView):
     model = Book
@@ -49,6 +138,11 @@ class BookDetailView(generic.DetailView):
 class BookDisplay(DetailView):
     model = Book
     template_name = 'books/book_detail.html'
+    #everything the template walks, in four queries whatever the number of genres, statuses
+    #and similar books (precomputed by books.similar)
+    queryset = Book.objects.select_related('author', 'owner').prefetch_related(
+            'genre', Prefetch('status_set', queryset=Status.objects.select_related('wisher')),
+            Prefetch('similar_books', queryset=SimilarBook.objects.select_related('similar').order_by('rank')))
     
     def get_context_data(self, **kwargs):
         context = super(BookDisplay, self).get_context_data(**kwargs)
@@ -56,59 +150,106 @@ class BookDisplay(DetailView):
         return context
 
 class WishBook(SingleObjectMixin, FormView):
-    form_class = WishBookModelForm()
-    model = Status
+    """Wishes any available copy of the book, from the form on the book page"""
+    form_class = WishBookModelForm
+    model = Book
+    queryset = BookDisplay.queryset
+    template_name = 'books/book_detail.html'
     
     def post(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
-            return HttpResponseForbidden()
+            return redirect_to_login(request.get_full_path())
         self.object = self.get_object()
-        self.object['wisher'] = request.user
-        self.object['due_back'] = datetime.today()+datetime.datetime(days=10)
-        self.object.save()
         return super(WishBook, self).post(request, *args, **kwargs)
+    
+    def form_valid(self, form):
+        if form.cleaned_data['status'] == 'wished':
+            if wishes.claim_book(self.object.pk, self.request.user) is None:
+                form.add_error(None, 'Nu mai e nici un exemplar disponibil.')
+                return self.form_invalid(form)
+        return super(WishBook, self).form_valid(form)
         
     def get_success_url(self):
         return reverse('books:book_detail', kwargs={'pk':self.object.pk})
    
 class BookDetail(View):
+    #built once, not on every request
+    display_view = staticmethod(BookDisplay.as_view())
+    wish_view = staticmethod(WishBook.as_view())
+
+    @method_decorator(versions.conditional(versions.book_detail))
     def get(self, request, *args, **kwargs):
-        view = BookDisplay.as_view()
-        return view(request, *args, **kwargs)
+        return self.display_view(request, *args, **kwargs)
         
     def post(self, request, *args, **kwargs):
-        view = WishBook.as_view()
-        return view(request, *args, **kwargs)
+        return self.wish_view(request, *args, **kwargs)
+
+def search_catalog(request):
+    query = request.GET.get('q', '').strip()
+    books, authors = search.search(query) if query else ([], [])
+    return render(request, 'books/search.html',
+                  context={'query': query, 'book_list': books, 'author_list': authors})
+
+
+#suggestions for the search box, from the in-process index: no query per keystroke
+def autocomplete_catalog(request):
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 20))
+    except ValueError:
+        limit = 10
+    books = autocomplete.books.suggest(query, limit) if query else []
+    authors = autocomplete.authors.suggest(query, limit) if query else []
+    return JsonResponse({'books': [{'id': pk, 'title': title} for pk, title in books],
+                         'authors': [{'id': pk, 'name': name} for pk, name in authors]})
 
-class AuthorListView(generic.ListView):
+
+#the whole catalog, streamed: memory stays flat whatever its size
+@permission_required('books.view_book', raise_exception=True)
+def export_catalog(request, format):
+    if format not in exporter.FORMATS:
+        raise Http404(f'Unknown export format {format}')
+    export, content_type = exporter.FORMATS[format]
+    response = StreamingHttpResponse(export(exporter.export_rows()), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="catalog.{format}"'
+    return response
+
+
+@method_decorator(versions.conditional(versions.author_list), name='get')
+class AuthorListView(KeysetPaginationMixin, generic.ListView):
     model= Author
     template_name = 'books/author_list.html'
     paginate_by = 20
  
     
+@method_decorator(versions.conditional(versions.author_detail), name='get')
 class AuthorDetailView(generic.DetailView):
     model = Author
     template_name = 'books/author_detail.html'
+    queryset = Author.objects.prefetch_related('book_set')
 
     
-class WishedBooksByUserListView(LoginRequiredMixin, generic.ListView):
+class WishedBooksByUserListView(LoginRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Status
     template_name = 'books/status_list_whished_user.html'
     paginate_by = 20
     
     
     def get_queryset(self):
-        return Status.objects.filter(wisher=self.request.user).filter(status__exact='wished').order_by('due_back')
+        return (Status.objects.filter(wisher=self.request.user).filter(status__exact='wished')
+                .select_related('book').with_overdue().order_by('due_back'))
     
 
-class WishedBooksAllUsersListView(PermissionRequiredMixin, generic.ListView):
+class WishedBooksAllUsersListView(PermissionRequiredMixin, KeysetPaginationMixin, generic.ListView):
     model = Status
     permission_required = 'can_mark_wished'
     template_name = 'books/status_list_whished_all_users.html'
     paginate_by = 20
     
     def get_queryset(self):
-        return Status.objects.filter(status__exact='wished').order_by('due_back')
+        #the template renders status.book and status.wisher on every row
+        return (Status.objects.filter(status__exact='wished')
+                .select_related('book', 'wisher').with_overdue().order_by('due_back'))
 
 #Librariens can renew the wishing status
 @permission_required('can_mark_wished')
@@ -120,7 +261,10 @@ def renew_book_librarian(request, pk):
         
         if form.is_valid():
             status.due_back = form.cleaned_data['due_back']
-            status.save() 
+            with transaction.atomic():
+                status.save()
+                if status.status == 'wished':
+                    notifications.enqueue('renewed', status.pk, status.wisher, status.due_back)
             return HttpResponseRedirect(reverse('books:myview'))
         
     else:
@@ -133,21 +277,28 @@ def renew_book_librarian(request, pk):
 
 #authenticated users can select the book they want to get
 def wish_book(request, pk):
-    status = get_object_or_404(Status, pk=pk)
+    status = get_object_or_404(Status.objects.select_related('book'), pk=pk)
     
     # If this is a POST request then process the Form data
     if request.method == 'POST':
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
         # Create a form instance and populate it with data from the request (binding):
         form = WishBookModelForm(request.POST)
         
         # Check if the form is valid:
         if form.is_valid():
-            status.status = form.cleaned_data['status']
-            status.due_back = datetime.date.today() + datetime.timedelta(days=10)
-            status.wisher = request.user
-            status.save()    
-            # redirect to a new URL:        
-            return HttpResponseRedirect(reverse('books:my_wished'))
+            # compare and set: only one of several users wishing the book at once wins
+            if form.cleaned_data['status'] == 'wished':
+                done = wishes.claim(status.pk, request.user)
+                error = 'Cartea a fost deja dorită de altcineva.'
+            else:
+                done = wishes.release(status.pk, request.user)
+                error = 'Doar cel care a dorit cartea o poate elibera.'
+            if done:
+                # redirect to a new URL:        
+                return HttpResponseRedirect(reverse('books:my_wished'))
+            form.add_error(None, error)
     # If this is a GET (or any other method) create the default form
     else:
         form = WishBookModelForm()
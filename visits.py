@@ -0,0 +1,93 @@
+"""Per-visitor page visit counts, buffered in memory.
+
+Visitors are told apart by a signed cookie instead of the session, so counting
+a visit never writes to the session store. Increments are kept in a
+process-local buffer and added to the cache in one batch every
+BOOKS_VISITS_FLUSH_INTERVAL seconds, or once BOOKS_VISITS_MAX_PENDING
+visitors are waiting."""
+
+import atexit
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+VISITOR_COOKIE = 'books_visitor'
+VISITOR_COOKIE_AGE = 365 * 24 * 60 * 60
+
+
+class VisitCounter:
+    """Counts visits per visitor, flushing the increments to the cache in batches"""
+
+    def __init__(self, flush_interval=None, max_pending=None):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _key(self, visitor):
+        return f'books:visits:{visitor}'
+
+    def _get_flush_interval(self):
+        if self.flush_interval is None:
+            return getattr(settings, 'BOOKS_VISITS_FLUSH_INTERVAL', 10)
+        return self.flush_interval
+
+    def _get_max_pending(self):
+        if self.max_pending is None:
+            return getattr(settings, 'BOOKS_VISITS_MAX_PENDING', 1000)
+        return self.max_pending
+
+    def hit(self, visitor):
+        """Records a visit and returns how many visits the visitor made before it"""
+        with self._lock:
+            pending = self._pending[visitor]
+            self._pending[visitor] += 1
+            due = (len(self._pending) >= self._get_max_pending()
+                   or time.monotonic() - self._last_flush >= self._get_flush_interval())
+        previous = (cache.get(self._key(visitor)) or 0) + pending
+        if due:
+            self.flush()
+        return previous
+
+    def flush(self):
+        """Adds the buffered increments to the cache"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        timeout = getattr(settings, 'BOOKS_VISITS_TIMEOUT', VISITOR_COOKIE_AGE)
+        for visitor, count in pending.items():
+            key = self._key(visitor)
+            #incr is atomic, so other processes flushing the same visitor do not lose counts
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, timeout):
+                    cache.incr(key, count)
+
+
+visit_counter = VisitCounter()
+atexit.register(visit_counter.flush)
+
+
+def count_visit(request):
+    """Returns (number of earlier visits, new visitor id or None) for the request.
+
+    A first visit is not buffered, it only hands out the cookie: clients that
+    never send it back (most crawlers) cost nothing."""
+    visitor = request.get_signed_cookie(VISITOR_COOKIE, default=None)
+    if visitor is None:
+        return 0, uuid.uuid4().hex
+    return visit_counter.hit(visitor) + 1, None
+
+
+def set_visitor_cookie(response, visitor):
+    response.set_signed_cookie(VISITOR_COOKIE, visitor, max_age=VISITOR_COOKIE_AGE,
+                               httponly=True, samesite='Lax')
@@ -0,0 +1,57 @@
+"""Claiming and releasing book copies.
+
+A claim is a single conditional UPDATE ... WHERE status = 'av' (compare and
+set): when two users wish the same copy at once, exactly one UPDATE matches
+the row and the other one changes nothing and reports failure. No row stays
+locked across the request. The book's current_* fields are refreshed in the
+same transaction, and so is the notification queued in books.notifications."""
+
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, notifications
+from .models import Book, Status
+
+
+WISH_DAYS = 10
+
+
+def claim(status_pk, wisher, today=None):
+    """Marks the copy as wished by wisher if it is still available. Returns True on success."""
+    due_back = (today or datetime.date.today()) + datetime.timedelta(days=WISH_DAYS)
+    with transaction.atomic():
+        claimed = (Status.objects.filter(pk=status_pk, status__exact='av')
+                   .update(status='wished', wisher=wisher, due_back=due_back, updated_at=timezone.now()))
+        if claimed:
+            Book.objects.filter(status=status_pk).refresh_availability()
+            counters.incr('available', -1)
+            notifications.enqueue('wished', status_pk, wisher, due_back)
+    return bool(claimed)
+
+
+def claim_book(book_pk, wisher, today=None, attempts=5):
+    """Claims any available copy of the book. Returns the claimed status pk, or None.
+
+    Another user may take the chosen copy between the lookup and the update;
+    then the next available copy is tried, a few times at most."""
+    for attempt in range(attempts):
+        status_pk = (Status.objects.filter(book_id=book_pk, status__exact='av')
+                     .order_by('pk').values_list('pk', flat=True).first())
+        if status_pk is None:
+            return None
+        if claim(status_pk, wisher, today):
+            return status_pk
+    return None
+
+
+def release(status_pk, wisher):
+    """Makes the copy available again, if wisher is the one who wished it. Returns True on success."""
+    with transaction.atomic():
+        released = (Status.objects.filter(pk=status_pk, status__exact='wished', wisher=wisher)
+                    .update(status='av', wisher=None, due_back=None, updated_at=timezone.now()))
+        if released:
+            Book.objects.filter(status=status_pk).refresh_availability()
+            counters.incr('available')
+    return bool(released)